@@ -0,0 +1,79 @@
+from django.contrib import admin
+from django.http import FileResponse, Http404
+from django.urls import path, reverse
+from django.utils.html import format_html
+
+from api.models import RequestProfile
+from api.profiling import get_profile_dir
+
+
+@admin.register(RequestProfile)
+class RequestProfileAdmin(admin.ModelAdmin):
+    """Админка профилей запросов (только просмотр и удаление)."""
+
+    list_display = (
+        "created_at",
+        "method",
+        "path",
+        "status_code",
+        "duration_ms",
+        "sql_count",
+        "sql_ms",
+        "serializer_ms",
+        "user",
+        "files",
+    )
+    list_display_links = ("created_at",)
+    list_filter = ("method", "mode", "status_code")
+    search_fields = ("path", "user__email")
+    readonly_fields = [field.name for field in RequestProfile._meta.fields]
+    readonly_fields += ["files"]
+    list_select_related = ("user",)
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def get_urls(self):
+        return [
+            path(
+                "<int:pk>/download/<str:kind>/",
+                self.admin_site.admin_view(self.download),
+                name="api_requestprofile_download",
+            ),
+        ] + super().get_urls()
+
+    @admin.display(description="Файлы")
+    def files(self, obj):
+        links = [("collapsed", "стеки")]
+        if obj.cprofile_file:
+            links.append(("cprofile", "cProfile"))
+        return format_html(
+            " ".join(
+                f'<a href="{{{index}}}">{label}</a>'
+                for index, (_, label) in enumerate(links)
+            ),
+            *(
+                reverse("admin:api_requestprofile_download", args=[obj.pk, k])
+                for k, _ in links
+            ),
+        )
+
+    def download(self, request, pk, kind):
+        if not self.has_view_permission(request):
+            raise Http404
+        profile = self.get_object(request, pk)
+        name = {
+            "collapsed": profile and profile.collapsed_file,
+            "cprofile": profile and profile.cprofile_file,
+        }.get(kind)
+        if not name:
+            raise Http404
+        file_path = get_profile_dir() / name
+        if not file_path.is_file():
+            raise Http404
+        return FileResponse(
+            file_path.open("rb"), as_attachment=True, filename=name
+        )
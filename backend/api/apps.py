@@ -4,3 +4,25 @@ from django.apps import AppConfig
 class ApiConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
     name = "api"
+
+    def ready(self):
+        from api import authentication, metrics, profiling
+        from api.recipes import (
+            documents,
+            ranking,
+            short_links,
+            sync,
+            timeline,
+        )
+        from foodgram import invalidation, query_cache
+
+        invalidation.connect_model_signals()
+        query_cache.connect_model_signals()
+        documents.connect_signals()
+        sync.connect_signals()
+        short_links.connect_signals()
+        authentication.connect_signals()
+        timeline.connect_signals()
+        ranking.connect_signals()
+        profiling.connect_signals()
+        metrics.connect_signals()
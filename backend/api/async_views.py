@@ -0,0 +1,69 @@
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.utils.decorators import classonlymethod
+
+
+def is_enabled():
+    return getattr(settings, "ASYNC_VIEWS_ENABLED", False)
+
+
+class AsyncActionsMixin:
+    """
+    Асинхронные версии действий вьюсета для запуска под ASGI.
+
+    При ASYNC_VIEWS_ENABLED as_view() адресов с действиями из
+    async_actions возвращает асинхронное представление: действие
+    обрабатывает корутина a<действие> (alist, aretrieve), остальные
+    методы того же адреса — обычный dispatch в потоке. Синхронные части
+    DRF (аутентификация, права, ETag) выполняются через sync_to_async,
+    выборки — асинхронным ORM.
+    """
+
+    async_actions = ()
+
+    @classonlymethod
+    def as_view(cls, actions=None, **initkwargs):
+        view = super().as_view(actions, **initkwargs)
+        if not is_enabled() or not set(actions.values()) & set(
+            cls.async_actions
+        ):
+            return view
+        if "get" in actions:
+            actions.setdefault("head", actions["get"])
+        sync_view = sync_to_async(view)
+
+        async def async_view(request, *args, **kwargs):
+            if actions.get(request.method.lower()) not in cls.async_actions:
+                return await sync_view(request, *args, **kwargs)
+            self = cls(**initkwargs)
+            self.action_map = actions
+            for method, action in actions.items():
+                setattr(self, method, getattr(self, action))
+            self.request = request
+            self.args = args
+            self.kwargs = kwargs
+            return await self.adispatch(request, *args, **kwargs)
+
+        # Атрибуты, по которым маршрут находят метрики и бюджеты запросов.
+        for name in ("__name__", "cls", "initkwargs", "actions"):
+            setattr(async_view, name, getattr(view, name))
+        async_view.csrf_exempt = True
+        return async_view
+
+    async def adispatch(self, request, *args, **kwargs):
+        """dispatch() DRF с асинхронным обработчиком действия."""
+        self.args = args
+        self.kwargs = kwargs
+        request = self.initialize_request(request, *args, **kwargs)
+        self.request = request
+        self.headers = self.default_response_headers
+        try:
+            await sync_to_async(self.initial)(request, *args, **kwargs)
+            handler = getattr(self, f"a{self.action}")
+            response = await handler(request, *args, **kwargs)
+        except Exception as exc:
+            response = await sync_to_async(self.handle_exception)(exc)
+        self.response = self.finalize_response(
+            request, response, *args, **kwargs
+        )
+        return self.response
@@ -0,0 +1,173 @@
+import functools
+import hashlib
+from datetime import timedelta
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import caches
+from django.db import DEFAULT_DB_ALIAS, connections, router, transaction
+from django.db.models.signals import post_delete, post_save
+from django.utils import timezone
+from django.utils.translation import gettext_lazy as _
+from rest_framework.authentication import TokenAuthentication
+from rest_framework.authtoken.models import Token
+from rest_framework.exceptions import AuthenticationFailed
+
+from foodgram import invalidation, query_cache
+
+User = get_user_model()
+
+TOKEN_PREFIX = "auth:token:"
+USER_PREFIX = "auth:user:"
+# Поля пользователя в кеше; остальные загружаются при первом обращении.
+SNAPSHOT_FIELDS = ("id", "is_staff", "is_superuser", "is_active")
+
+
+def get_cache():
+    return caches[settings.AUTH_TOKEN_CACHE_ALIAS]
+
+
+def token_cache_key(key):
+    # В общем кеше хранится не сам токен, а его хеш.
+    return TOKEN_PREFIX + hashlib.sha256(key.encode()).hexdigest()
+
+
+def user_cache_key(user_id):
+    return f"{USER_PREFIX}{user_id}"
+
+
+def expired_before():
+    """Момент, раньше которого выданные токены истекли, или None."""
+    if not settings.AUTH_TOKEN_TTL_DAYS:
+        return None
+    return timezone.now() - timedelta(days=settings.AUTH_TOKEN_TTL_DAYS)
+
+
+def is_expired(created):
+    border = expired_before()
+    return border is not None and created < border
+
+
+def _refresh_deferred(user, using=None, fields=None, **kwargs):
+    """Первое обращение к полю вне снимка загружает все остальные поля."""
+    deferred = user.get_deferred_fields()
+    if fields is not None and deferred.issuperset(fields):
+        fields = deferred
+    type(user).refresh_from_db(user, using=using, fields=fields, **kwargs)
+
+
+def snapshot_user(snapshot, using=DEFAULT_DB_ALIAS):
+    """Пользователь из снимка; остальные поля загружаются из using."""
+    # from_db() ждёт значения в порядке полей модели, а не field_names.
+    names = [
+        field.attname
+        for field in User._meta.concrete_fields
+        if field.attname in SNAPSHOT_FIELDS
+    ]
+    user = User.from_db(using, names, [snapshot[name] for name in names])
+    user.refresh_from_db = functools.partial(_refresh_deferred, user)
+    return user
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+    """
+    TokenAuthentication без запроса к базе на каждый запрос.
+
+    Токен (id пользователя и время выдачи) и снимок пользователя
+    (SNAPSHOT_FIELDS) хранятся в кеше AUTH_TOKEN_CACHE_ALIAS
+    AUTH_TOKEN_CACHE_TIMEOUT секунд и сбрасываются при удалении токена
+    (выход), сохранении, удалении и изменении пользователя через
+    update()/bulk_update() (смена пароля, блокировка). При
+    AUTH_TOKEN_TTL_DAYS токены старше этого срока отклоняются.
+    """
+
+    def authenticate_credentials(self, key):
+        cache = get_cache()
+        token_key = token_cache_key(key)
+        token = cache.get(token_key)
+        snapshot = None
+        if token is not None:
+            snapshot = cache.get(user_cache_key(token["user_id"]))
+        if snapshot is None:
+            token, snapshot = self._load(key)
+            cache.set_many(
+                {
+                    token_key: token,
+                    user_cache_key(snapshot["id"]): snapshot,
+                },
+                settings.AUTH_TOKEN_CACHE_TIMEOUT,
+            )
+        if is_expired(token["created"]):
+            raise AuthenticationFailed("Срок действия токена истёк.")
+        if not snapshot["is_active"]:
+            raise AuthenticationFailed(_("User inactive or deleted."))
+        user = snapshot_user(snapshot, using=router.db_for_read(User))
+        return user, Token(key=key, user=user, created=token["created"])
+
+    def _load(self, key):
+        try:
+            row = (
+                Token.objects.filter(key=key)
+                .values(
+                    "created",
+                    *(f"user__{name}" for name in SNAPSHOT_FIELDS),
+                )
+                .get()
+            )
+        except Token.DoesNotExist:
+            raise AuthenticationFailed(_("Invalid token."))
+        snapshot = {name: row[f"user__{name}"] for name in SNAPSHOT_FIELDS}
+        return {"user_id": snapshot["id"], "created": row["created"]}, snapshot
+
+
+def invalidate(keys, using="default"):
+    """
+    Сбрасывает записи сразу и ещё раз после фиксации транзакции.
+
+    Повтор не даёт запросу, прочитавшему старые данные до COMMIT,
+    оставить их в кеше; другим узлам ключи уходят по шине инвалидации.
+    """
+    keys = list(keys)
+    get_cache().delete_many(keys)
+    if connections[using].in_atomic_block:
+        transaction.on_commit(
+            lambda: get_cache().delete_many(keys), using=using
+        )
+    invalidation.publish(keys, using=using)
+
+
+@invalidation.subscribe
+def _on_invalidation(tags, message_origin):
+    if invalidation.is_local_host(message_origin):
+        return
+    keys = [
+        tag for tag in tags if tag.startswith((TOKEN_PREFIX, USER_PREFIX))
+    ]
+    if keys:
+        get_cache().delete_many(keys)
+
+
+def _user_changed(sender, instance, using="default", **kwargs):
+    invalidate([user_cache_key(instance.pk)], using=using)
+
+
+def _users_updated(sender, pks, using="default", **kwargs):
+    invalidate([user_cache_key(pk) for pk in pks], using=using)
+
+
+def _token_deleted(sender, instance, using="default", **kwargs):
+    invalidate([token_cache_key(instance.key)], using=using)
+
+
+def connect_signals():
+    post_save.connect(_user_changed, sender=User)
+    post_delete.connect(_user_changed, sender=User)
+    query_cache.rows_updated.connect(_users_updated, sender=User)
+    post_delete.connect(_token_deleted, sender=Token)
+
+
+def delete_expired_token(user):
+    """Удаляет истёкший токен пользователя, чтобы вход выдал новый."""
+    border = expired_before()
+    if border is not None:
+        Token.objects.filter(user=user, created__lt=border).delete()
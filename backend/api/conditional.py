@@ -0,0 +1,129 @@
+import calendar
+import hashlib
+
+from django.db.models import Count, Max, Subquery, Value
+from django.utils.cache import get_conditional_response, patch_vary_headers
+from django.utils.http import http_date
+
+# Ответ зависит от пользователя: общие кеши различают его по токену.
+VARY_HEADERS = ("Authorization",)
+
+
+class NotModified(Exception):
+    """Прерывает обработку запроса готовым ответом 304/412."""
+
+    def __init__(self, response):
+        super().__init__(response.status_code)
+        self.response = response
+
+
+def make_etag(*parts):
+    """Сильный ETag по значениям, от которых зависит ответ."""
+    digest = hashlib.md5(repr(parts).encode(), usedforsecurity=False)
+    return f'"{digest.hexdigest()}"'
+
+
+def viewer_state(user, *models):
+    """
+    Отпечаток связей пользователя (избранное, корзина, подписки):
+    выражения для aggregate() рядом с отпечатком выборки — число строк и
+    наибольший id каждой модели с полем user.
+
+    Добавление увеличивает наибольший id, удаление уменьшает число строк,
+    поэтому любое изменение набора меняет отпечаток.
+    """
+    state = {}
+    if user is None:
+        return state
+    for model in models:
+        rows = model.objects.filter(user=user).order_by().values("user")
+        name = model._meta.model_name
+        for suffix, function in (("count", Count), ("last", Max)):
+            # Подзапрос не зависит от строки выборки и считается один раз.
+            state[f"{name}_{suffix}"] = Max(
+                Subquery(rows.annotate(value=function("id")).values("value"))
+            )
+    return state
+
+
+def table_state(name, queryset, *fields):
+    """
+    Отпечаток таблицы без версии строки в выборке (справочники, связи
+    рецептов с тегами и ингредиентами): выражения для aggregate() —
+    число строк queryset и наибольшие значения fields.
+    """
+    rows = queryset.order_by().values(group=Value(1))
+    state = {}
+    for suffix, function in (("count", Count("pk")),) + tuple(
+        (field, Max(field)) for field in fields
+    ):
+        # Как и в viewer_state, подзапрос считается один раз.
+        state[f"{name}_{suffix}"] = Max(
+            Subquery(rows.annotate(value=function).values("value"))
+        )
+    return state
+
+
+class ConditionalGetMixin:
+    """
+    ETag и Last-Modified для действий conditional_actions.
+
+    get_validators() вьюсета дешёвым запросом вычисляет (etag,
+    last_modified) до get_queryset и сериализации; совпавший
+    If-None-Match / If-Modified-Since сразу получает 304.
+    """
+
+    conditional_actions = ("list", "retrieve")
+
+    def get_validators(self):
+        """(etag, last_modified) текущего запроса или None."""
+        return None
+
+    def get_viewer(self):
+        user = self.request.user
+        return user if user.is_authenticated else None
+
+    def initial(self, request, *args, **kwargs):
+        super().initial(request, *args, **kwargs)
+        self._validators = None
+        if (
+            request.method not in ("GET", "HEAD")
+            or self.action not in self.conditional_actions
+        ):
+            return
+        self._validators = self.get_validators()
+        if self._validators is None:
+            return
+        etag, last_modified = self._validators
+        response = get_conditional_response(
+            request,
+            etag=etag,
+            last_modified=_timestamp(last_modified),
+        )
+        if response is not None:
+            raise NotModified(response)
+
+    def handle_exception(self, exc):
+        if isinstance(exc, NotModified):
+            return exc.response
+        return super().handle_exception(exc)
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        response = super().finalize_response(
+            request, response, *args, **kwargs
+        )
+        validators = getattr(self, "_validators", None)
+        if validators is None or response.status_code not in (200, 304):
+            return response
+        etag, last_modified = validators
+        response["ETag"] = etag
+        if last_modified is not None:
+            response["Last-Modified"] = http_date(_timestamp(last_modified))
+        patch_vary_headers(response, VARY_HEADERS)
+        return response
+
+
+def _timestamp(moment):
+    if moment is None:
+        return None
+    return calendar.timegm(moment.utctimetuple())
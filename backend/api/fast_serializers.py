@@ -0,0 +1,338 @@
+import functools
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db.models import F
+from rest_framework import serializers
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+
+from api.sparse_fields import SparseFieldsMixin
+
+# Имя колонки с id родителя в запросах вложенных списков.
+PARENT_COLUMN = "fast_parent"
+
+# Поля с простым преобразованием значения колонки.
+SCALAR_FIELDS = (
+    (serializers.BooleanField, "bool"),
+    (serializers.IntegerField, "int"),
+    (serializers.CharField, "str"),
+)
+
+
+def is_enabled():
+    return getattr(settings, "FAST_SERIALIZERS", False)
+
+
+class RowProxy:
+    """Строка values() с доступом к колонкам как к атрибутам."""
+
+    __slots__ = ("_row", "_prefix")
+
+    def __init__(self, row, prefix=""):
+        self._row = row
+        self._prefix = prefix
+
+    def __getattr__(self, name):
+        try:
+            return self._row[self._prefix + name]
+        except KeyError:
+            raise AttributeError(name) from None
+
+
+def _file_url(storage, name, request):
+    if not name:
+        return None
+    url = storage.url(name)
+    if request is not None:
+        return request.build_absolute_uri(url)
+    return url
+
+
+def _overrides(instance, base, name="to_representation"):
+    return getattr(type(instance), name) is not getattr(base, name)
+
+
+def _model_field(model, attrs):
+    """Поле модели по пути source или None для аннотаций."""
+    field = None
+    for attr in attrs:
+        if model is None:
+            return None
+        try:
+            field = model._meta.get_field(attr)
+        except Exception:
+            return None
+        model = field.related_model
+    return field
+
+
+class CompiledSerializer:
+    """
+    Сериализатор ModelSerializer, собранный в функцию над строками
+    values().
+
+    При сборке поля сериализатора разворачиваются в выражение-словарь
+    с теми же ключами в том же порядке: вложенный сериализатор одного
+    объекта читается из колонок с префиксом (author__email), вложенные
+    списки — отдельным запросом values() на страницу, поля-методы
+    вызываются у сериализатора с контекстом запроса на RowProxy.
+    Неподдерживаемые поля вызывают TypeError при сборке.
+    """
+
+    def __init__(self, serializer_class, fields=None):
+        self.serializer_class = serializer_class
+        self.kwargs = {} if fields is None else {"fields": fields}
+        self.model = serializer_class.Meta.model
+        self.pk = self.model._meta.pk.name
+        self.columns = [self.pk]
+        self.nested = []
+        self.methods = []
+        self.fields = []
+        self.namespace = {
+            "_file_url": _file_url,
+            "RowProxy": RowProxy,
+            "fields": self.fields,
+        }
+        template = serializer_class(**self.kwargs)
+        expression = self._serializer(template, self.model, "", ())
+        source = (
+            "def render(row, nested, methods, request):\n"
+            f"    return {expression}\n"
+        )
+        filename = f"<fast {serializer_class.__name__}>"
+        exec(compile(source, filename, "exec"), self.namespace)
+        self.source = source
+        self._render = self.namespace["render"]
+
+    def _name(self, prefix, value):
+        name = f"_{prefix}{len(self.namespace)}"
+        self.namespace[name] = value
+        return name
+
+    def _serializer(self, serializer, model, prefix, path):
+        if _overrides(serializer, serializers.Serializer):
+            raise TypeError(
+                f"{type(serializer).__name__} переопределяет "
+                "to_representation."
+            )
+        items = []
+        for field in serializer._readable_fields:
+            expression = self._field(field, model, prefix, path)
+            items.append(f"{field.field_name!r}: {expression}")
+        return "{" + ", ".join(items) + "}"
+
+    def _column(self, column):
+        if column not in self.columns:
+            self.columns.append(column)
+        return f"row[{column!r}]"
+
+    def _field(self, field, model, prefix, path):
+        if isinstance(field, serializers.SerializerMethodField):
+            index = len(self.methods)
+            self.methods.append(path + (field.method_name,))
+            return f"methods[{index}](RowProxy(row, {prefix!r}))"
+
+        if field.source == "*":
+            raise TypeError(f"Поле {field.field_name}: source='*'.")
+
+        if isinstance(field, serializers.ListSerializer):
+            return self._many(field, model, prefix)
+
+        column = prefix + "__".join(field.source_attrs)
+
+        if isinstance(field, serializers.Serializer):
+            nested_model = field.Meta.model
+            pk = self._column(f"{column}__{nested_model._meta.pk.name}")
+            expression = self._serializer(
+                field, nested_model, f"{column}__", path + (field.field_name,)
+            )
+            return f"({expression} if {pk} is not None else None)"
+
+        if isinstance(field, serializers.RelatedField) or isinstance(
+            field, serializers.ManyRelatedField
+        ):
+            raise TypeError(f"Поле {field.field_name}: связи не поддержаны.")
+
+        value = self._column(column)
+        if isinstance(field, serializers.FileField) and not _overrides(
+            field, serializers.FileField
+        ):
+            use_url = getattr(
+                field, "use_url", api_settings.UPLOADED_FILES_USE_URL
+            )
+            if not use_url:
+                return f"({value} or None)"
+            model_field = _model_field(model, field.source_attrs)
+            storage = self._name("storage", model_field.storage)
+            return f"_file_url({storage}, {value}, request)"
+
+        for field_class, function in SCALAR_FIELDS:
+            if isinstance(field, field_class) and not _overrides(
+                field, field_class
+            ):
+                return (
+                    f"({function}(v) if (v := {value}) is not None "
+                    "else None)"
+                )
+
+        index = len(self.fields)
+        self.fields.append(field)
+        return (
+            f"(fields[{index}].to_representation(v) "
+            f"if (v := {value}) is not None else None)"
+        )
+
+    def _many(self, field, model, prefix):
+        relation = model._meta.get_field(field.source_attrs[-1])
+        child = compile_serializer(type(field.child))
+        column = f"{prefix}{model._meta.pk.name}"
+        pk = self._column(column)
+        index = len(self.nested)
+        self.nested.append((column, child, relation.remote_field.name))
+        return f"nested[{index}].get({pk}, [])"
+
+    def values(self, queryset):
+        """
+        Queryset строк с колонками, нужными для render, и аннотациями
+        queryset (их читают поля-методы через RowProxy).
+        """
+        annotations = [
+            name
+            for name in queryset.query.annotations
+            if name not in self.columns
+        ]
+        return queryset.prefetch_related(None).values(
+            *self.columns, *annotations
+        )
+
+    def render(self, rows, request=None):
+        """Представления строк values(), как у serializer(..., many=True)."""
+        rows = list(rows)
+        nested = []
+        for queryset, child in self._nested_querysets(rows):
+            child_rows = list(queryset)
+            nested.append(
+                self._group(child_rows, child.render(child_rows, request))
+            )
+        return self._output(rows, nested, request)
+
+    async def arender(self, rows, request=None):
+        """render() с выборкой вложенных списков асинхронным ORM."""
+        if hasattr(rows, "__aiter__"):
+            rows = [row async for row in rows]
+        else:
+            rows = list(rows)
+        nested = []
+        for queryset, child in self._nested_querysets(rows):
+            child_rows = [row async for row in queryset]
+            nested.append(
+                self._group(
+                    child_rows, await child.arender(child_rows, request)
+                )
+            )
+        if not self.methods:
+            return self._output(rows, nested, request)
+        # Поля-методы могут обращаться к базе.
+        return await sync_to_async(self._output)(rows, nested, request)
+
+    def _output(self, rows, nested, request):
+        context = {"request": request}
+        root = self.serializer_class(context=context, **self.kwargs)
+        methods = []
+        for path in self.methods:
+            owner = root
+            for name in path[:-1]:
+                owner = owner.fields[name]
+                owner = getattr(owner, "child", owner)
+            methods.append(getattr(owner, path[-1]))
+        return [
+            self._render(row, nested, methods, request) for row in rows
+        ]
+
+    def _nested_querysets(self, rows):
+        """Запросы вложенных списков страницы: [(queryset, child)]."""
+        result = []
+        for column, child, lookup in self.nested:
+            parent_ids = {row[column] for row in rows}
+            queryset = child.model._default_manager.filter(
+                **{f"{lookup}__in": parent_ids}
+            )
+            if not parent_ids:
+                queryset = queryset.none()
+            elif not queryset.ordered:
+                queryset = queryset.order_by("pk")
+            result.append((
+                queryset.values(
+                    *child.columns, **{PARENT_COLUMN: F(lookup)}
+                ),
+                child,
+            ))
+        return result
+
+    def _group(self, rows, representations):
+        """Вложенный список: {id родителя: [представления]}."""
+        grouped = {}
+        for row, data in zip(rows, representations):
+            grouped.setdefault(row[PARENT_COLUMN], []).append(data)
+        return grouped
+
+
+@functools.lru_cache(maxsize=256)
+def compile_serializer(serializer_class, fields=None):
+    """
+    Собранный сериализатор; сборка выполняется один раз на класс и
+    набор полей (fields — как у SparseFieldsSerializerMixin).
+    """
+    return CompiledSerializer(serializer_class, fields)
+
+
+class FastListMixin:
+    """
+    list вьюсета через собранный сериализатор, если включён
+    FAST_SERIALIZERS.
+
+    Страница выбирается из queryset.values(), без создания объектов
+    моделей и без prefetch_related. Учитывает выбор полей
+    SparseFieldsMixin.
+    """
+
+    def get_compiled_serializer(self):
+        """Собранный сериализатор действия или None, если путь выключен."""
+        if not is_enabled():
+            return None
+        fields = None
+        if isinstance(self, SparseFieldsMixin):
+            fields = self.get_requested_fields()
+        return compile_serializer(self.get_serializer_class(), fields)
+
+    def list(self, request, *args, **kwargs):
+        compiled = self.get_compiled_serializer()
+        if compiled is None:
+            return super().list(request, *args, **kwargs)
+        queryset = compiled.values(self.filter_queryset(self.get_queryset()))
+        page = self.paginate_queryset(queryset)
+        if page is None:
+            return Response(compiled.render(queryset, request))
+        return self.get_paginated_response(compiled.render(page, request))
+
+    async def alist(self, request, *args, **kwargs):
+        """list для AsyncActionsMixin: выборка асинхронным ORM."""
+        compiled = self.get_compiled_serializer()
+        if compiled is None:
+            return await sync_to_async(self.list)(request, *args, **kwargs)
+        # Фильтры проверяют значения запросами к базе (теги).
+        queryset = await sync_to_async(self.filter_queryset)(
+            self.get_queryset()
+        )
+        queryset = compiled.values(queryset)
+        page = None
+        if self.paginator is not None:
+            page = await self.paginator.apaginate_queryset(
+                queryset, request, view=self
+            )
+        if page is None:
+            return Response(await compiled.arender(queryset, request))
+        return self.get_paginated_response(
+            await compiled.arender(page, request)
+        )
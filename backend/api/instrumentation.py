@@ -0,0 +1,81 @@
+import time
+from contextlib import ExitStack, asynccontextmanager, contextmanager
+
+from asgiref.sync import sync_to_async
+from django.db import connections
+
+
+class QueryRecorder:
+    """
+    Обёртка выполнения SQL (connection.execute_wrapper).
+
+    Считает запросы и их суммарное время; подписчики из listeners
+    получают каждый запрос: listener(sql, params, many, duration).
+    """
+
+    def __init__(self, listeners=()):
+        self.count = 0
+        self.duration = 0.0
+        self.listeners = list(listeners)
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            duration = time.perf_counter() - started
+            self.count += 1
+            self.duration += duration
+            for listener in self.listeners:
+                listener(sql, params, many, duration)
+
+
+@contextmanager
+def record_queries(recorder=None):
+    """Подключает recorder ко всем базам данных текущего потока."""
+    recorder = recorder if recorder is not None else QueryRecorder()
+    with ExitStack() as stack:
+        for alias in connections:
+            stack.enter_context(
+                connections[alias].execute_wrapper(recorder)
+            )
+        yield recorder
+
+
+@asynccontextmanager
+async def arecord_queries(recorder=None):
+    """
+    record_queries для асинхронного кода.
+
+    Соединения Django привязаны к потоку, поэтому recorder подключается
+    в потоке sync_to_async текущего запроса — там же выполняются запросы
+    асинхронного ORM и синхронных представлений под ASGI.
+    """
+    manager = record_queries(recorder)
+    recorder = await sync_to_async(manager.__enter__)()
+    try:
+        yield recorder
+    finally:
+        await sync_to_async(manager.__exit__)(None, None, None)
+
+
+def resolve_view_action(view_func, method):
+    """
+    Класс вьюсета и действие DRF, которые обработают запрос.
+
+    Для обычных (не DRF) представлений возвращает (None, None).
+    """
+    view_class = getattr(view_func, "cls", None)
+    if view_class is None:
+        return None, None
+    actions = getattr(view_func, "actions", None)
+    if actions:
+        return view_class, actions.get(method.lower())
+    return view_class, method.lower()
+
+
+def get_query_budget(view_class, action):
+    """Допустимое число SQL-запросов из атрибута query_budgets вьюсета."""
+    if view_class is None or action is None:
+        return None
+    return getattr(view_class, "query_budgets", {}).get(action)
@@ -0,0 +1,243 @@
+import http.client
+import json
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from io import StringIO
+from pathlib import Path
+
+from django.conf import settings
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+
+# Эндпоинты, у которых есть асинхронные версии.
+DEFAULT_MIX = (
+    "recipes-list=30,recipes-detail=30,ingredients-autocomplete=25,"
+    "short-link=10,recipes-download-shopping-cart=5"
+)
+SERVERS = {
+    "wsgi": ("foodgram.wsgi:application", [], "False"),
+    "asgi": (
+        "foodgram.asgi:application",
+        ["--worker-class", "uvicorn.workers.UvicornWorker"],
+        "True",
+    ),
+}
+
+
+def process_tree_rss(pid):
+    """Суммарная резидентная память процесса и его потомков (байты)."""
+    children = {}
+    for entry in Path("/proc").iterdir():
+        if not entry.name.isdigit():
+            continue
+        try:
+            stat = (entry / "stat").read_text()
+        except OSError:
+            continue
+        # Четвёртое поле — родитель; имя процесса в скобках может
+        # содержать пробелы.
+        parent = int(stat.rsplit(")", 1)[1].split()[1])
+        children.setdefault(parent, []).append(int(entry.name))
+    total = 0
+    pending = [pid]
+    while pending:
+        current = pending.pop()
+        pending.extend(children.get(current, []))
+        try:
+            status = Path(f"/proc/{current}/status").read_text()
+        except OSError:
+            continue
+        for line in status.splitlines():
+            if line.startswith("VmRSS:"):
+                total += int(line.split()[1]) * 1024
+    return total
+
+
+class Command(BaseCommand):
+    """
+    Сравнение развёртывания WSGI и ASGI на одной машине.
+
+    Для каждого варианта запускается gunicorn с одинаковым числом
+    воркеров: синхронные воркеры с foodgram.wsgi или UvicornWorker с
+    foodgram.asgi и ASYNC_VIEWS_ENABLED. На сервере прогоняется
+    load_replay со смесью эндпоинтов, у которых есть асинхронные версии,
+    затем открываются --connections медленных клиентов, не дописавших
+    запрос: команда выводит прирост памяти процессов сервера на
+    соединение и время ответа на запрос, пришедший при занятых
+    соединениях. Только Linux (память читается из /proc).
+    """
+
+    help = "Compare WSGI and ASGI deployments: RPS and memory per connection"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "servers",
+            nargs="*",
+            help=f"Варианты из {', '.join(SERVERS)} (по умолчанию все).",
+        )
+        parser.add_argument("--port", type=int, default=8765)
+        parser.add_argument("--workers", type=int, default=2)
+        parser.add_argument("--duration", type=float, default=20)
+        parser.add_argument("--warmup", type=float, default=3)
+        parser.add_argument("--concurrency", type=int, default=16)
+        parser.add_argument("--users", type=int, default=20)
+        parser.add_argument("--mix", default=DEFAULT_MIX)
+        parser.add_argument(
+            "--connections", type=int, default=200,
+            help="Число одновременных медленных клиентов.",
+        )
+        parser.add_argument(
+            "--probe-timeout", type=float, default=5,
+            help="Сколько ждать ответа при занятых соединениях (с).",
+        )
+        parser.add_argument(
+            "--output", default="",
+            help="Файл для сохранения результатов в JSON.",
+        )
+
+    def handle(self, *args, **options):
+        if not Path("/proc/self/status").exists():
+            raise CommandError("Память процессов читается из /proc: Linux.")
+        unknown = set(options["servers"]) - set(SERVERS)
+        if unknown:
+            raise CommandError(f"Неизвестные варианты: {', '.join(unknown)}")
+        self.options = options
+        results = {}
+        for name in options["servers"] or SERVERS:
+            self.stdout.write(f"=== {name} ===")
+            results[name] = self._bench(name)
+        self._print(results)
+        if options["output"]:
+            Path(options["output"]).write_text(
+                json.dumps(results, ensure_ascii=False, indent=2),
+                encoding="utf-8",
+            )
+            self.stdout.write(f"Результаты сохранены в {options['output']}")
+
+    def _bench(self, name):
+        app, extra, async_views = SERVERS[name]
+        options = self.options
+        address = f"127.0.0.1:{options['port']}"
+        env = {**os.environ, "ASYNC_VIEWS_ENABLED": async_views}
+        server = subprocess.Popen(
+            [
+                sys.executable, "-m", "gunicorn", app,
+                "--bind", address,
+                "--workers", str(options["workers"]),
+                *extra,
+            ],
+            cwd=settings.BASE_DIR,
+            env=env,
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL,
+        )
+        try:
+            self._wait_ready(server, address)
+            # Память — до нагрузки, пока её не исказили кеши воркеров.
+            result = self._connections(server, address)
+            result.update(self._throughput(f"http://{address}"))
+        finally:
+            server.terminate()
+            server.wait(timeout=30)
+        return result
+
+    def _wait_ready(self, server, address, timeout=30):
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            if server.poll() is not None:
+                raise CommandError(
+                    f"Сервер завершился с кодом {server.returncode}."
+                )
+            if self._probe(address, 1) is not None:
+                # Остальные воркеры могут ещё загружать приложение.
+                time.sleep(2)
+                return
+            time.sleep(0.2)
+        raise CommandError(f"Сервер {address} не ответил за {timeout} с.")
+
+    def _probe(self, address, timeout):
+        """Время ответа на GET /api/tags/ (с) или None."""
+        host, port = address.split(":")
+        connection = http.client.HTTPConnection(host, port, timeout=timeout)
+        started = time.perf_counter()
+        try:
+            connection.request("GET", "/api/tags/")
+            connection.getresponse().read()
+        except (OSError, http.client.HTTPException):
+            return None
+        finally:
+            connection.close()
+        return time.perf_counter() - started
+
+    def _throughput(self, base_url):
+        options = self.options
+        with tempfile.TemporaryDirectory() as directory:
+            output = os.path.join(directory, "run.json")
+            call_command(
+                "load_replay",
+                base_url=base_url,
+                duration=options["duration"],
+                warmup=options["warmup"],
+                concurrency=options["concurrency"],
+                users=options["users"],
+                mix=options["mix"],
+                output=output,
+                stdout=StringIO(),
+            )
+            total = json.loads(Path(output).read_text("utf-8"))["total"]
+        return {
+            key: total[key]
+            for key in ("throughput_rps", "p50_ms", "p99_ms", "error_rate")
+        }
+
+    def _connections(self, server, address):
+        """Медленные клиенты: отправлено начало запроса, но не конец."""
+        options = self.options
+        host, port = address.split(":")
+        idle_rss = process_tree_rss(server.pid)
+        sockets = []
+        try:
+            for _ in range(options["connections"]):
+                sock = socket.create_connection((host, int(port)))
+                sock.sendall(
+                    b"GET /api/tags/ HTTP/1.1\r\nHost: " + host.encode()
+                    + b"\r\n"
+                )
+                sockets.append(sock)
+            time.sleep(1)
+            rss = process_tree_rss(server.pid)
+            probe = self._probe(address, options["probe_timeout"])
+        finally:
+            for sock in sockets:
+                sock.close()
+        return {
+            "rss_mb": rss / 2 ** 20,
+            "per_connection_kb": (rss - idle_rss) / len(sockets) / 1024,
+            "probe_ms": None if probe is None else probe * 1000,
+        }
+
+    def _print(self, results):
+        connections = self.options["connections"]
+        self.stdout.write(
+            f"{'':6} {'rps':>8} {'p50':>8} {'p99':>8} {'err%':>6} "
+            f"{'RSS, МБ':>9} {'КБ/соед.':>9} "
+            f"{f'ответ при {connections} медл.':>22}"
+        )
+        for name, row in results.items():
+            probe = (
+                "нет ответа"
+                if row["probe_ms"] is None
+                else f"{row['probe_ms']:.1f} мс"
+            )
+            self.stdout.write(
+                f"{name:6} {row['throughput_rps']:>8.1f} "
+                f"{row['p50_ms']:>8.1f} {row['p99_ms']:>8.1f} "
+                f"{row['error_rate'] * 100:>6.2f} "
+                f"{row['rss_mb']:>9.1f} {row['per_connection_kb']:>9.1f} "
+                f"{probe:>22}"
+            )
+        self.stdout.write(self.style.SUCCESS("=== Готово ==="))
@@ -0,0 +1,164 @@
+import json
+import multiprocessing
+import os
+import random
+import shutil
+import statistics
+import tempfile
+import time
+from pathlib import Path
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils.module_loading import import_string
+
+from recipes.management.commands.generate_dataset import ZipfSampler
+
+BACKENDS = {
+    "locmem": "django.core.cache.backends.locmem.LocMemCache",
+    "filebased": "django.core.cache.backends.filebased.FileBasedCache",
+    "shared": "foodgram.cache.SharedMemoryCache",
+}
+
+
+def make_cache(name, directory, options):
+    backend = import_string(BACKENDS[name])
+    location = os.path.join(directory, name)
+    if name == "locmem":
+        location = f"bench-{os.getpid()}"
+    return backend(location, {"TIMEOUT": None, "OPTIONS": options})
+
+
+def run_worker(name, directory, cache_options, options, seed):
+    """
+    Нагрузка одного процесса: cache-aside по ключам с распределением Ципфа.
+
+    Возвращает число операций, попаданий и задержки get/set в секундах.
+    """
+    cache = make_cache(name, directory, cache_options)
+    rng = random.Random(seed)
+    sampler = ZipfSampler(rng, options["keys"], options["zipf"])
+    value = os.urandom(options["value_size"])
+    get_times, set_times = [], []
+    hits = 0
+    started = time.perf_counter()
+    for _ in range(options["operations"]):
+        key = f"bench:{sampler()}"
+        if rng.random() >= options["read_ratio"]:
+            begin = time.perf_counter()
+            cache.set(key, value)
+            set_times.append(time.perf_counter() - begin)
+            continue
+        begin = time.perf_counter()
+        found = cache.get(key)
+        get_times.append(time.perf_counter() - begin)
+        if found is not None:
+            hits += 1
+            continue
+        begin = time.perf_counter()
+        cache.set(key, value)
+        set_times.append(time.perf_counter() - begin)
+    return {
+        "elapsed": time.perf_counter() - started,
+        "operations": options["operations"],
+        "gets": len(get_times),
+        "hits": hits,
+        "get_times": get_times,
+        "set_times": set_times,
+    }
+
+
+def percentile(values, share):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(share * len(ordered)))]
+
+
+class Command(BaseCommand):
+    """
+    Сравнение бэкендов кеша при нескольких процессах-воркерах.
+
+    Каждый процесс выполняет get/set по общему набору ключей с
+    распределением Ципфа, как воркеры gunicorn. У LocMemCache кеш свой в
+    каждом процессе, поэтому его доля попаданий падает с ростом числа
+    воркеров; FileBasedCache и SharedMemoryCache общие.
+    """
+
+    help = "Benchmark LocMemCache, FileBasedCache and SharedMemoryCache"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--backends", default=",".join(BACKENDS),
+            help="Бэкенды через запятую: " + ", ".join(BACKENDS) + ".",
+        )
+        parser.add_argument("--workers", type=int, default=4)
+        parser.add_argument(
+            "--operations", type=int, default=20000,
+            help="Операций на один процесс.",
+        )
+        parser.add_argument("--keys", type=int, default=5000)
+        parser.add_argument("--value-size", type=int, default=512)
+        parser.add_argument("--read-ratio", type=float, default=0.95)
+        parser.add_argument("--zipf", type=float, default=1.1)
+        parser.add_argument("--slots", type=int, default=8192)
+        parser.add_argument("--slot-size", type=int, default=2048)
+        parser.add_argument("--seed", type=int, default=42)
+        parser.add_argument("--output", default="")
+
+    def handle(self, *args, **options):
+        names = [name for name in options["backends"].split(",") if name]
+        unknown = set(names) - set(BACKENDS)
+        if unknown:
+            raise CommandError(f"Неизвестные бэкенды: {', '.join(unknown)}")
+        cache_options = {
+            "SLOTS": options["slots"],
+            "SLOT_SIZE": options["slot_size"],
+        }
+        directory = tempfile.mkdtemp(prefix="bench-cache-")
+        results = {}
+        try:
+            for name in names:
+                results[name] = self._run_backend(
+                    name, directory, cache_options, options
+                )
+                row = results[name]
+                self.stdout.write(
+                    f"{name:10} {row['ops_per_second']:>10.0f} оп/с  "
+                    f"попаданий {row['hit_rate']:>6.1%}  "
+                    f"get p50 {row['get_p50_us']:>7.1f} мкс  "
+                    f"p99 {row['get_p99_us']:>8.1f} мкс  "
+                    f"set p50 {row['set_p50_us']:>7.1f} мкс"
+                )
+        finally:
+            shutil.rmtree(directory, ignore_errors=True)
+        if options["output"]:
+            Path(options["output"]).write_text(
+                json.dumps(results, ensure_ascii=False, indent=2),
+                encoding="utf-8",
+            )
+
+    def _run_backend(self, name, directory, cache_options, options):
+        context = multiprocessing.get_context("fork")
+        arguments = [
+            (name, directory, cache_options, options, options["seed"] + i)
+            for i in range(options["workers"])
+        ]
+        with context.Pool(options["workers"]) as pool:
+            workers = pool.starmap(run_worker, arguments)
+        elapsed = max(worker["elapsed"] for worker in workers)
+
+        get_times = [t for worker in workers for t in worker["get_times"]]
+        set_times = [t for worker in workers for t in worker["set_times"]]
+        gets = sum(worker["gets"] for worker in workers)
+        return {
+            "workers": options["workers"],
+            "ops_per_second": sum(w["operations"] for w in workers)
+            / elapsed,
+            "hit_rate": sum(w["hits"] for w in workers) / gets if gets
+            else 0.0,
+            "get_p50_us": statistics.median(get_times) * 1e6
+            if get_times else 0.0,
+            "get_p99_us": percentile(get_times, 0.99) * 1e6,
+            "set_p50_us": statistics.median(set_times) * 1e6
+            if set_times else 0.0,
+        }
@@ -0,0 +1,86 @@
+import statistics
+import threading
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS, connections
+
+from foodgram import db_pool
+
+
+class Command(BaseCommand):
+    """
+    Проверка пула соединений на локальном PostgreSQL.
+
+    Несколько потоков, как потоки воркера gunicorn, выполняют «запросы»:
+    SELECT 1 и закрытие соединения, как в конце HTTP-запроса. Команда
+    сравнивает время с открытием нового соединения и выводит состояние
+    пула.
+    """
+
+    help = "Benchmark pooled PostgreSQL connections"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--threads", type=int, default=4)
+        parser.add_argument("--requests", type=int, default=200)
+        parser.add_argument("--database", default=DEFAULT_DB_ALIAS)
+
+    def handle(self, *args, **options):
+        alias = options["database"]
+        connection = connections[alias]
+        if not hasattr(connection, "get_pool"):
+            raise CommandError(
+                f"База {alias} работает без пула: нужен PostgreSQL и "
+                "DB_POOL_ENABLED=True."
+            )
+        direct = self._direct(connection, options["requests"] // 10 or 1)
+        timings = []
+        lock = threading.Lock()
+
+        def worker():
+            local = []
+            for _ in range(options["requests"]):
+                started = time.perf_counter()
+                with connections[alias].cursor() as cursor:
+                    cursor.execute("SELECT 1")
+                connections[alias].close()
+                local.append(time.perf_counter() - started)
+            with lock:
+                timings.extend(local)
+
+        threads = [
+            threading.Thread(target=worker)
+            for _ in range(options["threads"])
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        pool = db_pool.pools()[alias]
+        self.stdout.write(
+            f"Новое соединение:  {statistics.median(direct) * 1000:.2f} мс"
+        )
+        self.stdout.write(
+            f"Соединение пула:   {statistics.median(timings) * 1000:.2f} мс "
+            f"(p99 {self._p99(timings) * 1000:.2f} мс, "
+            f"запросов {len(timings)})"
+        )
+        self.stdout.write(f"Пул: {pool.stats()}")
+        self.stdout.write(self.style.SUCCESS("=== Готово ==="))
+
+    def _direct(self, connection, count):
+        """Время запроса с открытием и закрытием соединения без пула."""
+        params = connection.get_connection_params()
+        timings = []
+        for _ in range(count):
+            started = time.perf_counter()
+            conn = connection.Database.connect(**params)
+            with conn.cursor() as cursor:
+                cursor.execute("SELECT 1")
+            conn.close()
+            timings.append(time.perf_counter() - started)
+        return timings
+
+    def _p99(self, timings):
+        ordered = sorted(timings)
+        return ordered[min(len(ordered) - 1, int(len(ordered) * 0.99))]
@@ -0,0 +1,346 @@
+import base64
+import gc
+import io
+import json
+import statistics
+import time
+import tracemalloc
+from pathlib import Path
+
+from django.conf import settings
+from django.contrib.auth.models import AnonymousUser
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.db.models import Count
+from django.test import RequestFactory
+from django.test.utils import CaptureQueriesContext, override_settings
+from PIL import Image
+from rest_framework.request import Request
+
+from api.fast_serializers import compile_serializer
+from api.recipes.documents import render_documents
+from api.recipes.filters import IngredientFilter
+from api.recipes.serializers import RecipeGetSerializer
+from api.recipes.views import RecipeViewSet
+from api.users.serializers import UserSubscribeRepresentSerializer
+from api.users.views import UserViewSet
+from api.utils import Base64ImageField
+from recipes.models import Ingredient
+from users.models import User
+
+DEFAULT_BASELINE = Path(settings.BASE_DIR) / "bench_micro_baseline.json"
+
+CASES = {}
+
+
+def case(name):
+    """
+    Регистрирует случай бенчмарка.
+
+    Функция получает BenchContext и возвращает вызываемый объект без
+    аргументов — именно его вызов и измеряется.
+    """
+
+    def decorator(func):
+        CASES[name] = func
+        return func
+
+    return decorator
+
+
+class BenchContext:
+    """Запросы от имени «тяжёлого» пользователя набора данных."""
+
+    def __init__(self):
+        self.viewer = (
+            User.objects.annotate(
+                follows=Count("follower", distinct=True),
+                cart=Count("shoppingcart", distinct=True),
+            )
+            .order_by("-cart", "-follows")
+            .first()
+        )
+        if self.viewer is None:
+            raise CommandError(
+                "База пуста, сначала запустите generate_dataset."
+            )
+        self.factory = RequestFactory(HTTP_HOST=settings.ALLOWED_HOSTS[0])
+
+    def request(self, path="/api/recipes/", params=None, anonymous=False):
+        request = Request(self.factory.get(path, params or {}))
+        request.user = AnonymousUser() if anonymous else self.viewer
+        return request
+
+    def recipe_viewset(self, anonymous=False):
+        return RecipeViewSet(
+            request=self.request(anonymous=anonymous),
+            action="list",
+            format_kwarg=None,
+        )
+
+
+def _recipe_serializer_case(size):
+    def setup(context):
+        view = context.recipe_viewset()
+        queryset = view.get_queryset()[:size]
+        serializer_context = {"request": view.request}
+
+        def run():
+            return RecipeGetSerializer(
+                queryset.all(), many=True, context=serializer_context
+            ).data
+
+        return run
+
+    return setup
+
+
+for _size in (6, 100, 1000):
+    case(f"recipe_get_serializer[{_size}]")(_recipe_serializer_case(_size))
+
+
+def _recipe_documents_case(size):
+    def setup(context):
+        view = context.recipe_viewset()
+        with override_settings(RECIPE_READ_MODEL=True):
+            queryset = view.get_queryset()[:size]
+
+        def run():
+            return render_documents(queryset.all(), view.request)
+
+        return run
+
+    return setup
+
+
+for _size in (6, 100, 1000):
+    case(f"recipe_documents[{_size}]")(_recipe_documents_case(_size))
+
+
+def _recipe_fast_serializer_case(size):
+    def setup(context):
+        view = context.recipe_viewset()
+        compiled = compile_serializer(RecipeGetSerializer)
+        queryset = compiled.values(view.get_queryset()[:size])
+
+        def run():
+            return compiled.render(queryset.all(), view.request)
+
+        return run
+
+    return setup
+
+
+for _size in (6, 100, 1000):
+    case(f"recipe_fast_serializer[{_size}]")(
+        _recipe_fast_serializer_case(_size)
+    )
+
+
+@case("user_subscribe_represent_serializer[6]")
+def user_subscribe_represent(context):
+    request = context.request(
+        "/api/users/subscriptions/", {"recipes_limit": 3}
+    )
+    authors = UserViewSet()._get_subscriptions_queryset(request)[:6]
+
+    def run():
+        return UserSubscribeRepresentSerializer(
+            authors.all(), many=True, context={"request": request}
+        ).data
+
+    return run
+
+
+def _get_queryset_case(anonymous):
+    def setup(context):
+        view = context.recipe_viewset(anonymous=anonymous)
+
+        def run():
+            return list(view.get_queryset()[:100])
+
+        return run
+
+    return setup
+
+
+case("recipe_viewset_get_queryset[annotated]")(_get_queryset_case(False))
+case("recipe_viewset_get_queryset[anonymous]")(_get_queryset_case(True))
+
+
+@case("generate_shopping_cart_file")
+def generate_shopping_cart_file(context):
+    view = context.recipe_viewset()
+
+    def run():
+        return view._generate_shopping_cart_file(context.viewer)
+
+    return run
+
+
+def _image_case(side):
+    def setup(context):
+        buffer = io.BytesIO()
+        Image.new("RGB", (side, side), (200, 120, 40)).save(buffer, "PNG")
+        data = "data:image/png;base64," + base64.b64encode(
+            buffer.getvalue()
+        ).decode()
+        field = Base64ImageField()
+
+        def run():
+            return field.to_internal_value(data)
+
+        return run
+
+    return setup
+
+
+for _side in (64, 512, 2048):
+    case(f"base64_image_field[{_side}px]")(_image_case(_side))
+
+
+@case("ingredient_filter_prefix")
+def ingredient_filter_prefix(context):
+    request = context.request("/api/ingredients/", anonymous=True)
+    prefixes = ("а", "мол", "сах", "карт", "я")
+
+    def run():
+        return [
+            list(
+                IngredientFilter(
+                    {"name": prefix},
+                    queryset=Ingredient.objects.all(),
+                    request=request,
+                ).qs
+            )
+            for prefix in prefixes
+        ]
+
+    return run
+
+
+class Command(BaseCommand):
+    """
+    Микробенчмарки горячих участков API на синтетическом наборе данных.
+
+    Для каждого случая измеряются медианное время, пик выделенной памяти
+    и число SQL-запросов. Команда завершается с ошибкой, если результат
+    хуже сохранённого базового.
+    """
+
+    help = "Run serializer/queryset micro-benchmarks against a baseline"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "-k", "--select", default="",
+            help="Запускать только случаи, содержащие подстроку.",
+        )
+        parser.add_argument("--repeat", type=int, default=5)
+        parser.add_argument(
+            "--baseline", default=str(DEFAULT_BASELINE),
+            help="Файл с базовыми результатами.",
+        )
+        parser.add_argument(
+            "--save-baseline", action="store_true",
+            help="Сохранить результаты как новые базовые.",
+        )
+        parser.add_argument(
+            "--tolerance", type=float, default=0.25,
+            help="Допустимое ухудшение времени и памяти (доля).",
+        )
+        parser.add_argument("--output", default="")
+
+    def handle(self, *args, **options):
+        context = BenchContext()
+        names = [name for name in CASES if options["select"] in name]
+        if not names:
+            raise CommandError("Нет подходящих случаев.")
+
+        results = {}
+        for name in names:
+            results[name] = self._measure(
+                CASES[name](context), options["repeat"]
+            )
+            row = results[name]
+            self.stdout.write(
+                f"{name:45} {row['time_ms']:>10.2f} ms "
+                f"{row['alloc_peak_kb']:>10.1f} KiB "
+                f"{row['queries']:>5} SQL"
+            )
+
+        if options["output"]:
+            self._dump(options["output"], results)
+        baseline_path = Path(options["baseline"])
+        if options["save_baseline"]:
+            stored = {}
+            if baseline_path.exists():
+                stored = json.loads(baseline_path.read_text("utf-8"))
+            stored.update(results)
+            self._dump(baseline_path, stored)
+            self.stdout.write(f"Базовые результаты: {baseline_path}")
+            return
+        if baseline_path.exists():
+            self._compare(
+                results,
+                json.loads(baseline_path.read_text("utf-8")),
+                options["tolerance"],
+            )
+
+    def _measure(self, run, repeat):
+        run()
+        with CaptureQueriesContext(connection) as captured:
+            run()
+        queries = len(captured)
+
+        timings = []
+        for _ in range(max(1, repeat)):
+            gc.collect()
+            started = time.perf_counter()
+            run()
+            timings.append(time.perf_counter() - started)
+
+        gc.collect()
+        tracemalloc.start()
+        try:
+            run()
+            _, peak = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+        return {
+            "time_ms": statistics.median(timings) * 1000,
+            "alloc_peak_kb": peak / 1024,
+            "queries": queries,
+        }
+
+    def _compare(self, results, baseline, tolerance):
+        regressions = []
+        for name, row in results.items():
+            before = baseline.get(name)
+            if before is None:
+                continue
+            if row["queries"] > before["queries"]:
+                regressions.append(
+                    f"{name}: SQL-запросов {row['queries']} "
+                    f"(было {before['queries']})"
+                )
+            for key in ("time_ms", "alloc_peak_kb"):
+                limit = before[key] * (1 + tolerance)
+                if row[key] > limit:
+                    regressions.append(
+                        f"{name}: {key} {row[key]:.2f} "
+                        f"(было {before[key]:.2f})"
+                    )
+        if regressions:
+            raise CommandError(
+                "Регрессии относительно базовых результатов:\n"
+                + "\n".join(regressions)
+            )
+        self.stdout.write(
+            self.style.SUCCESS("=== Регрессий не обнаружено ===")
+        )
+
+    def _dump(self, path, data):
+        Path(path).write_text(
+            json.dumps(data, ensure_ascii=False, indent=2, sort_keys=True),
+            encoding="utf-8",
+        )
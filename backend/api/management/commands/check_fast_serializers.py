@@ -0,0 +1,94 @@
+import json
+
+from django.conf import settings
+from django.contrib.auth.models import AnonymousUser
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Count
+from django.test import RequestFactory
+from rest_framework.request import Request
+
+from api.fast_serializers import compile_serializer
+from api.recipes.serializers import RecipeGetSerializer, RecipeSmallSerializer
+from api.recipes.views import RecipeViewSet
+from api.users.serializers import UserSerializer
+from recipes.models import Recipe
+from users.models import User
+
+
+class Command(BaseCommand):
+    """
+    Сверка собранных сериализаторов с DRF.
+
+    Для анонима и пользователя с подписками и корзиной сравнивает вывод
+    RecipeGetSerializer, RecipeSmallSerializer и UserSerializer на
+    одних и тех же объектах, с учётом порядка ключей.
+    """
+
+    help = "Compare compiled serializers output with DRF serializers"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--size", type=int, default=200, help="Объектов в выборке."
+        )
+
+    def handle(self, *args, **options):
+        viewer = (
+            User.objects.annotate(
+                follows=Count("follower", distinct=True),
+                cart=Count("shoppingcart", distinct=True),
+            )
+            .order_by("-cart", "-follows")
+            .first()
+        )
+        if viewer is None:
+            raise CommandError(
+                "База пуста, сначала запустите generate_dataset."
+            )
+        factory = RequestFactory(HTTP_HOST=settings.ALLOWED_HOSTS[0])
+        size = options["size"]
+        failures = 0
+        for user in (AnonymousUser(), viewer):
+            request = Request(factory.get("/api/recipes/"))
+            request.user = user
+            view = RecipeViewSet(
+                request=request, action="list", format_kwarg=None
+            )
+            recipes = view.get_queryset()[:size]
+            cases = (
+                (RecipeGetSerializer, recipes),
+                (RecipeSmallSerializer, Recipe.objects.all()[:size]),
+                (UserSerializer, User.objects.all()[:size]),
+            )
+            for serializer_class, queryset in cases:
+                failures += self._compare(serializer_class, queryset, request)
+        if failures:
+            raise CommandError(f"Расхождений: {failures}")
+        self.stdout.write(
+            self.style.SUCCESS("=== Вывод сериализаторов совпадает ===")
+        )
+
+    def _compare(self, serializer_class, queryset, request):
+        expected = serializer_class(
+            queryset, many=True, context={"request": request}
+        ).data
+        compiled = compile_serializer(serializer_class)
+        actual = compiled.render(compiled.values(queryset), request)
+        viewer = request.user.get_username() or "аноним"
+        label = f"{serializer_class.__name__} ({viewer})"
+        mismatches = [
+            (left, right)
+            for left, right in zip(expected, actual)
+            if json.dumps(left) != json.dumps(right)
+        ]
+        if len(expected) != len(actual):
+            mismatches.append((len(expected), len(actual)))
+        if not mismatches:
+            self.stdout.write(f"{label:40} {len(actual)} объектов совпадают")
+            return 0
+        left, right = mismatches[0]
+        self.stdout.write(
+            self.style.ERROR(f"{label}: {len(mismatches)} расхождений")
+        )
+        self.stdout.write(f"  DRF:       {json.dumps(left)}")
+        self.stdout.write(f"  собранный: {json.dumps(right)}")
+        return len(mismatches)
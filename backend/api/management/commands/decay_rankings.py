@@ -0,0 +1,31 @@
+from django.core.management.base import BaseCommand
+
+from api.recipes.ranking import decay, rebuild
+
+
+class Command(BaseCommand):
+    """
+    Затухание популярности рецептов за последние дни.
+
+    Запускается периодически (например, раз в час из cron). С --rebuild
+    popularity и trending пересчитываются заново по избранному и спискам
+    покупок — после загрузки данных в обход сигналов.
+    """
+
+    help = "Decay trending scores of recipes"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--rebuild",
+            action="store_true",
+            help="Пересчитать рейтинги с нуля.",
+        )
+
+    def handle(self, *args, **options):
+        if options["rebuild"]:
+            count = rebuild()
+            message = f"Рейтингов пересчитано: {count}"
+        else:
+            count = decay()
+            message = f"Рейтингов обновлено: {count}"
+        self.stdout.write(self.style.SUCCESS(f"=== {message} ==="))
@@ -0,0 +1,508 @@
+import http.client
+import json
+import math
+import random
+import subprocess
+import threading
+import time
+from collections import defaultdict
+from pathlib import Path
+from urllib.parse import urlencode, urlsplit
+
+from django.core.management.base import BaseCommand, CommandError
+
+from recipes.management.commands.generate_dataset import DATASET_PASSWORD
+
+# Веса сценариев по умолчанию: доля запросов каждого типа в общей смеси.
+DEFAULT_MIX = {
+    "recipes-list": 30,
+    "recipes-list-filtered": 15,
+    "recipes-detail": 20,
+    "ingredients-autocomplete": 15,
+    "recipes-favorite": 5,
+    "recipes-shopping-cart": 5,
+    "users-subscriptions": 5,
+    "recipes-download-shopping-cart": 3,
+    "users-subscribe": 2,
+}
+# Эндпоинты вне смеси по умолчанию, доступные через --mix.
+EXTRA_ENDPOINTS = ("short-link",)
+# Эндпоинты, требующие токена.
+AUTH_REQUIRED = {
+    "recipes-favorite",
+    "recipes-shopping-cart",
+    "users-subscriptions",
+    "recipes-download-shopping-cart",
+    "users-subscribe",
+}
+
+
+def percentile(sorted_values, fraction):
+    """Перцентиль методом ближайшего ранга."""
+    if not sorted_values:
+        return None
+    # Ранг ceil(f * n): наименьшее значение, не меньше которого доля f.
+    index = max(0, math.ceil(fraction * len(sorted_values)) - 1)
+    return sorted_values[min(index, len(sorted_values) - 1)]
+
+
+class ApiClient:
+    """HTTP-клиент с keep-alive соединением на один поток."""
+
+    def __init__(self, base_url, timeout):
+        parts = urlsplit(base_url)
+        connection_class = (
+            http.client.HTTPSConnection
+            if parts.scheme == "https"
+            else http.client.HTTPConnection
+        )
+        self.connection = connection_class(parts.netloc, timeout=timeout)
+        self.prefix = parts.path.rstrip("/")
+
+    def request(self, method, path, token=None, params=None, payload=None):
+        url = self.prefix + path
+        if params:
+            url = f"{url}?{urlencode(params, doseq=True)}"
+        headers = {"Accept": "application/json"}
+        body = None
+        if token:
+            headers["Authorization"] = f"Token {token}"
+        if payload is not None:
+            body = json.dumps(payload)
+            headers["Content-Type"] = "application/json"
+        try:
+            self.connection.request(method, url, body=body, headers=headers)
+            response = self.connection.getresponse()
+            content = response.read()
+        except (OSError, http.client.HTTPException):
+            self.connection.close()
+            raise
+        return response.status, content
+
+    def json(self, method, path, **kwargs):
+        status, content = self.request(method, path, **kwargs)
+        if status >= 400:
+            raise CommandError(f"{method} {path} вернул {status}")
+        return json.loads(content) if content else None
+
+
+class VirtualUser:
+    """Авторизованный пользователь со своим состоянием переключателей."""
+
+    def __init__(self, user_id, token):
+        self.user_id = user_id
+        self.token = token
+        self.favorites = set()
+        self.cart = set()
+        self.following = set()
+        self.lock = threading.Lock()
+
+
+class Stats:
+    """Задержки и статусы ответов по эндпоинтам."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.latencies = defaultdict(list)
+        self.errors = defaultdict(int)
+        self.statuses = defaultdict(lambda: defaultdict(int))
+        self.bytes = defaultdict(int)
+
+    def record(self, name, elapsed, status, size, ok):
+        with self.lock:
+            self.latencies[name].append(elapsed)
+            self.statuses[name][str(status)] += 1
+            self.bytes[name] += size
+            if not ok:
+                self.errors[name] += 1
+
+    def summary(self, elapsed):
+        endpoints = {}
+        for name in sorted(self.latencies):
+            values = sorted(self.latencies[name])
+            count = len(values)
+            endpoints[name] = {
+                "requests": count,
+                "errors": self.errors[name],
+                "error_rate": self.errors[name] / count,
+                "throughput_rps": count / elapsed,
+                "mean_ms": sum(values) / count * 1000,
+                "p50_ms": percentile(values, 0.50) * 1000,
+                "p95_ms": percentile(values, 0.95) * 1000,
+                "p99_ms": percentile(values, 0.99) * 1000,
+                "max_ms": values[-1] * 1000,
+                "bytes": self.bytes[name],
+                "statuses": dict(self.statuses[name]),
+            }
+        all_values = sorted(
+            value for values in self.latencies.values() for value in values
+        )
+        total_errors = sum(self.errors.values())
+        total = {
+            "requests": len(all_values),
+            "errors": total_errors,
+            "error_rate": (
+                total_errors / len(all_values) if all_values else 0
+            ),
+            "throughput_rps": len(all_values) / elapsed,
+            "p50_ms": (percentile(all_values, 0.50) or 0) * 1000,
+            "p95_ms": (percentile(all_values, 0.95) or 0) * 1000,
+            "p99_ms": (percentile(all_values, 0.99) or 0) * 1000,
+        }
+        return endpoints, total
+
+
+class Command(BaseCommand):
+    """
+    Нагрузочный прогон API запущенного сервера.
+
+    Воспроизводит взвешенную смесь запросов из docs/openapi-schema.yml
+    от имени пользователей, созданных generate_dataset, и сохраняет
+    перцентили задержек, пропускную способность и долю ошибок в JSON.
+    """
+
+    help = "Replay a weighted API request mix against a running server"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--base-url", default="http://127.0.0.1:8000",
+            help="Адрес сервера.",
+        )
+        parser.add_argument(
+            "--duration", type=float, default=30,
+            help="Длительность прогона в секундах.",
+        )
+        parser.add_argument(
+            "--warmup", type=float, default=3,
+            help="Прогрев в секундах, не попадает в статистику.",
+        )
+        parser.add_argument(
+            "--concurrency", type=int, default=8,
+            help="Число параллельных виртуальных клиентов общей смеси.",
+        )
+        parser.add_argument(
+            "--scenario-concurrency", default="",
+            help=(
+                "Отдельные клиенты для сценариев, например "
+                "'short-link=32,users-subscribe=2'; такие сценарии "
+                "исключаются из общей смеси."
+            ),
+        )
+        parser.add_argument(
+            "--users", type=int, default=20,
+            help="Сколько пользователей авторизовать.",
+        )
+        parser.add_argument("--password", default=DATASET_PASSWORD)
+        parser.add_argument(
+            "--mix", default="",
+            help=(
+                "Веса эндпоинтов, например "
+                "'recipes-list=50,recipes-detail=50'; "
+                "не указанные эндпоинты исключаются."
+            ),
+        )
+        parser.add_argument("--timeout", type=float, default=30)
+        parser.add_argument("--seed", type=int, default=42)
+        parser.add_argument(
+            "--output", default="",
+            help="Файл для сохранения результатов в JSON.",
+        )
+        parser.add_argument(
+            "--compare", default="",
+            help="JSON предыдущего прогона для сравнения.",
+        )
+
+    def handle(self, *args, **options):
+        self.options = options
+        self.mix = self._parse_mix(options["mix"])
+        self.dedicated = self._parse_concurrency(
+            options["scenario_concurrency"]
+        )
+        for name in self.dedicated:
+            self.mix.pop(name, None)
+        client = ApiClient(options["base_url"], options["timeout"])
+        self._discover(client)
+        self.virtual_users = self._login(client, options["users"])
+        if not self.virtual_users:
+            for name in AUTH_REQUIRED:
+                self.mix.pop(name, None)
+                self.dedicated.pop(name, None)
+            self.stderr.write(
+                "Не удалось авторизовать ни одного пользователя, "
+                "проверяются только анонимные эндпоинты."
+            )
+        if not self.mix and not self.dedicated:
+            raise CommandError("Смесь запросов пуста.")
+
+        if options["warmup"]:
+            self._run(Stats(), options["warmup"])
+        stats = Stats()
+        elapsed = self._run(stats, options["duration"])
+        endpoints, total = stats.summary(elapsed)
+        result = {
+            "meta": {
+                "commit": self._git_commit(),
+                "started_at": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+                "base_url": options["base_url"],
+                "duration_s": elapsed,
+                "concurrency": options["concurrency"] if self.mix else 0,
+                "scenario_concurrency": self.dedicated,
+                "users": len(self.virtual_users),
+                "mix": self.mix,
+                "seed": options["seed"],
+            },
+            "endpoints": endpoints,
+            "total": total,
+        }
+        self._print(result)
+        if options["compare"]:
+            self._print_comparison(result, options["compare"])
+        if options["output"]:
+            Path(options["output"]).write_text(
+                json.dumps(result, ensure_ascii=False, indent=2),
+                encoding="utf-8",
+            )
+            self.stdout.write(f"Результаты сохранены в {options['output']}")
+
+    def _parse_mix(self, value):
+        if not value:
+            return dict(DEFAULT_MIX)
+        mix = {}
+        for item in value.split(","):
+            name, _, weight = item.partition("=")
+            name = name.strip()
+            if name not in DEFAULT_MIX and name not in EXTRA_ENDPOINTS:
+                raise CommandError(
+                    f"Неизвестный эндпоинт {name!r}, доступны: "
+                    f"{', '.join([*DEFAULT_MIX, *EXTRA_ENDPOINTS])}"
+                )
+            mix[name] = float(weight or 1)
+        return mix
+
+    def _parse_concurrency(self, value):
+        """Число отдельных клиентов по сценариям из --scenario-concurrency."""
+        concurrency = {}
+        for item in filter(None, value.split(",")):
+            name, _, count = item.partition("=")
+            name = name.strip()
+            if name not in DEFAULT_MIX and name not in EXTRA_ENDPOINTS:
+                raise CommandError(
+                    f"Неизвестный эндпоинт {name!r}, доступны: "
+                    f"{', '.join([*DEFAULT_MIX, *EXTRA_ENDPOINTS])}"
+                )
+            try:
+                concurrency[name] = int(count)
+            except ValueError:
+                raise CommandError(
+                    f"Число клиентов сценария {name!r} должно быть целым."
+                )
+            if concurrency[name] < 1:
+                raise CommandError(
+                    f"Число клиентов сценария {name!r} должно быть больше 0."
+                )
+        return concurrency
+
+    def _discover(self, client):
+        """Сбор идентификаторов, по которым строятся запросы."""
+        self.tags = [
+            tag["slug"] for tag in client.json("GET", "/api/tags/")
+        ]
+        page = client.json("GET", "/api/recipes/", params={"limit": 200})
+        self.recipe_count = page["count"]
+        self.recipe_ids = [recipe["id"] for recipe in page["results"]]
+        self.author_ids = sorted(
+            {recipe["author"]["id"] for recipe in page["results"]}
+        )
+        if not self.recipe_ids:
+            raise CommandError(
+                "На сервере нет рецептов, запустите generate_dataset."
+            )
+        ingredients = client.json(
+            "GET", "/api/ingredients/", params={"name": ""}
+        )
+        self.prefixes = sorted(
+            {item["name"][:length].lower()
+             for item in ingredients
+             for length in (1, 2, 3)}
+        )
+
+    def _login(self, client, count):
+        users = client.json(
+            "GET", "/api/users/", params={"limit": count}
+        )["results"]
+        virtual_users = []
+        for user in users:
+            status, content = client.request(
+                "POST",
+                "/api/auth/token/login/",
+                payload={
+                    "email": user["email"],
+                    "password": self.options["password"],
+                },
+            )
+            if status == 200:
+                virtual_users.append(
+                    VirtualUser(user["id"], json.loads(content)["auth_token"])
+                )
+        return virtual_users
+
+    def _run(self, stats, duration):
+        """
+        Общая смесь в --concurrency потоках и отдельные потоки сценариев
+        из --scenario-concurrency, каждый со своим зерном.
+        """
+        mixes = [self.mix] * (self.options["concurrency"] if self.mix else 0)
+        for name, count in self.dedicated.items():
+            mixes += [{name: 1}] * count
+        deadline = time.monotonic() + duration
+        started = time.monotonic()
+        threads = [
+            threading.Thread(
+                target=self._worker,
+                args=(index, mix, stats, deadline),
+                daemon=True,
+            )
+            for index, mix in enumerate(mixes)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return time.monotonic() - started
+
+    def _worker(self, index, mix, stats, deadline):
+        rng = random.Random(self.options["seed"] + index)
+        client = ApiClient(self.options["base_url"], self.options["timeout"])
+        names = list(mix)
+        weights = [mix[name] for name in names]
+        while time.monotonic() < deadline:
+            name = rng.choices(names, weights)[0]
+            user = (
+                rng.choice(self.virtual_users)
+                if self.virtual_users
+                else None
+            )
+            method, path, params, expected = self._build_request(
+                name, user, rng
+            )
+            token = user.token if user and name in AUTH_REQUIRED else None
+            if user and name not in AUTH_REQUIRED and rng.random() < 0.5:
+                token = user.token
+            started = time.perf_counter()
+            try:
+                status, content = client.request(
+                    method, path, token=token, params=params
+                )
+            except (OSError, http.client.HTTPException):
+                status, content = 0, b""
+            stats.record(
+                name,
+                time.perf_counter() - started,
+                status,
+                len(content),
+                status in expected,
+            )
+
+    def _toggle(self, user, collection, key):
+        """Возвращает метод запроса и обновляет ожидаемое состояние."""
+        with user.lock:
+            if key in collection:
+                collection.discard(key)
+                return "DELETE", {204}
+            collection.add(key)
+            return "POST", {201}
+
+    def _build_request(self, name, user, rng):
+        recipe_id = rng.choice(self.recipe_ids)
+        if name == "recipes-list":
+            params = {"page": rng.randint(1, 20), "limit": 6}
+            return "GET", "/api/recipes/", params, {200}
+        if name == "recipes-list-filtered":
+            params = {"limit": rng.choice((6, 12, 24))}
+            if self.tags:
+                params["tags"] = rng.sample(
+                    self.tags, rng.randint(1, min(2, len(self.tags)))
+                )
+            if rng.random() < 0.3:
+                params["author"] = rng.choice(self.author_ids)
+            if user and rng.random() < 0.2:
+                params["is_favorited"] = 1
+            return "GET", "/api/recipes/", params, {200}
+        if name == "recipes-detail":
+            return "GET", f"/api/recipes/{recipe_id}/", None, {200}
+        if name == "ingredients-autocomplete":
+            params = {"name": rng.choice(self.prefixes)}
+            return "GET", "/api/ingredients/", params, {200}
+        if name == "recipes-favorite":
+            method, expected = self._toggle(user, user.favorites, recipe_id)
+            path = f"/api/recipes/{recipe_id}/favorite/"
+            return method, path, None, expected | {400}
+        if name == "recipes-shopping-cart":
+            method, expected = self._toggle(user, user.cart, recipe_id)
+            path = f"/api/recipes/{recipe_id}/shopping_cart/"
+            return method, path, None, expected | {400}
+        if name == "users-subscriptions":
+            params = {"limit": 6, "recipes_limit": 3}
+            return "GET", "/api/users/subscriptions/", params, {200}
+        if name == "recipes-download-shopping-cart":
+            path = "/api/recipes/download_shopping_cart/"
+            return "GET", path, None, {200}
+        if name == "short-link":
+            return "GET", f"/s/{recipe_id}/", None, {302}
+        if name == "users-subscribe":
+            author_id = rng.choice(self.author_ids)
+            if author_id == user.user_id:
+                return "GET", f"/api/users/{author_id}/", None, {200}
+            method, expected = self._toggle(user, user.following, author_id)
+            path = f"/api/users/{author_id}/subscribe/"
+            return method, path, None, expected | {400}
+        raise CommandError(f"Неизвестный эндпоинт {name!r}")
+
+    def _git_commit(self):
+        try:
+            return subprocess.run(
+                ["git", "rev-parse", "--short", "HEAD"],
+                capture_output=True,
+                text=True,
+                check=True,
+            ).stdout.strip()
+        except (OSError, subprocess.CalledProcessError):
+            return None
+
+    def _print(self, result):
+        header = (
+            f"{'endpoint':34} {'req':>7} {'rps':>8} {'err%':>6} "
+            f"{'p50':>8} {'p95':>8} {'p99':>8}"
+        )
+        self.stdout.write(header)
+        rows = list(result["endpoints"].items()) + [("TOTAL", result["total"])]
+        for name, row in rows:
+            self.stdout.write(
+                f"{name:34} {row['requests']:>7} "
+                f"{row['throughput_rps']:>8.1f} "
+                f"{row['error_rate'] * 100:>6.2f} "
+                f"{row['p50_ms']:>8.1f} {row['p95_ms']:>8.1f} "
+                f"{row['p99_ms']:>8.1f}"
+            )
+
+    def _print_comparison(self, result, baseline_path):
+        baseline = json.loads(Path(baseline_path).read_text("utf-8"))
+        self.stdout.write(
+            f"\nСравнение с {baseline_path} "
+            f"(коммит {baseline['meta'].get('commit')}):"
+        )
+        rows = list(result["endpoints"].items()) + [("TOTAL", result["total"])]
+        for name, row in rows:
+            before = (
+                baseline["total"]
+                if name == "TOTAL"
+                else baseline["endpoints"].get(name)
+            )
+            if not before:
+                continue
+            deltas = []
+            for key in ("p50_ms", "p95_ms", "p99_ms", "throughput_rps"):
+                if before[key]:
+                    change = (row[key] - before[key]) / before[key] * 100
+                    deltas.append(f"{key} {change:+.1f}%")
+            self.stdout.write(f"{name:34} {', '.join(deltas)}")
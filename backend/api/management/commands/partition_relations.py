@@ -0,0 +1,46 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+from foodgram.partitioning import (
+    partition,
+    partition_count,
+    partitioned_models,
+)
+
+
+class Command(BaseCommand):
+    """
+    Разбиение избранного, списков покупок и подписок по user_id.
+
+    Только PostgreSQL: таблицы пересоздаются как PARTITION BY HASH
+    (user_id) с заданным числом секций, строки переносятся под
+    блокировкой таблицы. Повторный запуск с другим числом секций
+    перераспределяет строки. Без аргумента выводит текущее число секций.
+    """
+
+    help = "Hash-partition relationship tables by user_id (PostgreSQL)"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "partitions",
+            nargs="?",
+            type=int,
+            help="Число секций (не меньше 2).",
+        )
+
+    def handle(self, *args, **options):
+        if connection.vendor != "postgresql":
+            raise CommandError(
+                "Разбиение таблиц доступно только для PostgreSQL."
+            )
+        partitions = options["partitions"]
+        if partitions is not None and partitions < 2:
+            raise CommandError("Число секций должно быть не меньше 2.")
+        for model in partitioned_models():
+            table = model._meta.db_table
+            current = partition_count(model)
+            if partitions is not None and current != partitions:
+                partition(model, partitions)
+                current = partitions
+            self.stdout.write(f"{table}: секций {current}")
+        self.stdout.write(self.style.SUCCESS("=== Готово ==="))
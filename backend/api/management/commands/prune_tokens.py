@@ -0,0 +1,38 @@
+from django.core.management.base import BaseCommand
+from django.db.models import Q
+from rest_framework.authtoken.models import Token
+
+from api.authentication import expired_before
+
+
+class Command(BaseCommand):
+    """
+    Удаление устаревших токенов: истёкших (AUTH_TOKEN_TTL_DAYS) и
+    принадлежащих заблокированным пользователям.
+
+    Токены удаляются пачками по --batch-size, чтобы не держать долгую
+    блокировку таблицы.
+    """
+
+    help = "Delete expired tokens and tokens of inactive users"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--batch-size", type=int, default=1000, help="Токенов в пачке."
+        )
+
+    def handle(self, *args, **options):
+        stale = Q(user__is_active=False)
+        border = expired_before()
+        if border is not None:
+            stale |= Q(created__lt=border)
+        queryset = Token.objects.filter(stale).order_by("pk")
+        deleted = 0
+        while keys := list(
+            queryset.values_list("pk", flat=True)[: options["batch_size"]]
+        ):
+            count, _ = Token.objects.filter(pk__in=keys).delete()
+            deleted += count
+        self.stdout.write(
+            self.style.SUCCESS(f"=== Токенов удалено: {deleted} ===")
+        )
@@ -0,0 +1,25 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from recipes.models import Tombstone
+
+
+class Command(BaseCommand):
+    """
+    Удаление надгробий старше SYNC_RETENTION_DAYS.
+
+    Клиенты с более старым токеном получат 410 и выполнят полную
+    синхронизацию.
+    """
+
+    help = "Delete change feed tombstones older than SYNC_RETENTION_DAYS"
+
+    def handle(self, *args, **options):
+        border = timezone.now() - timedelta(days=settings.SYNC_RETENTION_DAYS)
+        deleted, _ = Tombstone.objects.filter(deleted_at__lt=border).delete()
+        self.stdout.write(
+            self.style.SUCCESS(f"=== Надгробий удалено: {deleted} ===")
+        )
@@ -0,0 +1,46 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Count
+
+from api.recipes.timeline import backfill, update_mode
+from recipes.models import TimelineEntry
+from users.models import Follow, User
+
+
+class Command(BaseCommand):
+    """
+    Пересборка лент подписок.
+
+    Нужна после загрузки данных в обход сигналов (bulk_create,
+    generate_dataset): выставляет авторам feed_pull по числу подписчиков
+    и заполняет ленты последними рецептами остальных авторов.
+    """
+
+    help = "Rebuild subscription timelines"
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            TimelineEntry.objects.all().delete()
+            User.objects.filter(feed_pull=True).update(feed_pull=False)
+            authors = (
+                User.objects.annotate(followers=Count("following"))
+                .filter(followers__gt=0)
+                .values_list("id", flat=True)
+            )
+            pulled = 0
+            for author_id in authors:
+                if update_mode(author_id):
+                    pulled += 1
+                    continue
+                backfill(
+                    Follow.objects.filter(author_id=author_id).values_list(
+                        "user_id", flat=True
+                    ),
+                    author_id,
+                )
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"=== Записей в лентах: {TimelineEntry.objects.count()}, "
+                f"авторов без рассылки: {pulled} ==="
+            )
+        )
@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand
+
+from api.recipes.documents import build_documents
+from recipes.models import Recipe
+
+
+class Command(BaseCommand):
+    """Пересборка документов рецептов (RecipeDocument) пакетами."""
+
+    help = "Rebuild denormalized recipe documents"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=500)
+
+    def handle(self, *args, **options):
+        ids = list(Recipe.objects.order_by("id").values_list("id", flat=True))
+        size = options["batch_size"]
+        for start in range(0, len(ids), size):
+            build_documents(ids[start:start + size])
+        self.stdout.write(
+            self.style.SUCCESS(f"=== Документов пересобрано: {len(ids)} ===")
+        )
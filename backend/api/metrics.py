@@ -0,0 +1,368 @@
+import atexit
+import fcntl
+import json
+import os
+import threading
+import time
+from pathlib import Path
+
+from django.conf import settings
+from django.http import HttpResponse
+from django.utils.crypto import constant_time_compare
+from rest_framework import permissions
+from rest_framework.decorators import (
+    api_view,
+    permission_classes,
+    renderer_classes,
+)
+from rest_framework.renderers import BaseRenderer
+
+from foodgram import stats
+
+LATENCY_BUCKETS = (
+    0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0,
+)
+SQL_QUERIES_BUCKETS = (1, 2, 5, 10, 20, 50, 100)
+
+# Описание метрик: имя -> (тип, справка).
+METRICS = {
+    "foodgram_http_requests_total": (
+        "counter", "Обработанные запросы по маршруту, методу и статусу."
+    ),
+    "foodgram_http_request_duration_seconds": (
+        "histogram", "Время обработки запроса."
+    ),
+    "foodgram_http_response_size_bytes_total": (
+        "counter", "Суммарный размер тел ответов."
+    ),
+    "foodgram_sql_queries": (
+        "histogram", "Число SQL-запросов на один HTTP-запрос."
+    ),
+    "foodgram_sql_duration_seconds_total": (
+        "counter", "Суммарное время выполнения SQL."
+    ),
+    "foodgram_db_pool_connections": (
+        "gauge", "Соединения пулов по состоянию (idle, in_use)."
+    ),
+    "foodgram_db_pool_checkouts_total": (
+        "counter", "Выдачи соединений из пула."
+    ),
+    "foodgram_db_pool_wait_seconds_total": (
+        "counter", "Суммарное время получения соединения из пула."
+    ),
+    "foodgram_db_pool_timeouts_total": (
+        "counter", "Отказы из-за исчерпания пула."
+    ),
+    "foodgram_db_pool_opened_total": (
+        "counter", "Открытые пулами соединения."
+    ),
+    "foodgram_db_pool_closed_total": (
+        "counter", "Закрытые пулами соединения по причине."
+    ),
+    "foodgram_cache_oversize_total": (
+        "counter", "Значения, не поместившиеся в кеш в общей памяти."
+    ),
+}
+# Счётчики завершившихся воркеров.
+DEAD_FILE = "dead.json"
+HISTOGRAM_BUCKETS = {
+    "foodgram_http_request_duration_seconds": LATENCY_BUCKETS,
+    "foodgram_sql_queries": SQL_QUERIES_BUCKETS,
+}
+
+
+def get_metrics_dir():
+    return Path(settings.METRICS_DIR)
+
+
+class MetricsRegistry:
+    """
+    Метрики одного процесса.
+
+    Каждый воркер gunicorn раз в flush_interval секунд сохраняет снимок
+    в файл METRICS_DIR/<pid>.json; эндпоинт метрик суммирует файлы всех
+    воркеров. Счётчики завершившегося воркера переносятся при сборе в
+    общий файл, чтобы они не убывали, а файлы не копились.
+    Показатели (gauge) суммируются только по живым воркерам.
+    """
+
+    def __init__(self, flush_interval=1.0):
+        self.flush_interval = flush_interval
+        self.lock = threading.Lock()
+        self.counters = {}
+        self.histograms = {}
+        self.gauges = {}
+        self.flush_lock = threading.Lock()
+        self.dirty = False
+        self.pid = None
+
+    def _reset_after_fork(self):
+        """
+        Первая запись в процессе (в том числе в новом воркере).
+
+        Метрики родителя отбрасываются, чтобы не сохранить их под pid
+        воркера, и запускается фоновый поток, сохраняющий снимок даже
+        когда воркер простаивает.
+        """
+        if self.pid != os.getpid():
+            self.pid = os.getpid()
+            self.counters = {}
+            self.histograms = {}
+            self.gauges = {}
+            threading.Thread(
+                target=self._flush_periodically, daemon=True
+            ).start()
+
+    def _flush_periodically(self):
+        pid = os.getpid()
+        while self.pid == pid:
+            time.sleep(self.flush_interval)
+            if self.dirty:
+                self.flush()
+
+    def inc(self, name, labels, value=1):
+        key = tuple(sorted(labels.items()))
+        with self.lock:
+            self._reset_after_fork()
+            series = self.counters.setdefault(name, {})
+            series[key] = series.get(key, 0) + value
+            self.dirty = True
+
+    def set(self, name, labels, value):
+        key = tuple(sorted(labels.items()))
+        with self.lock:
+            self._reset_after_fork()
+            self.gauges.setdefault(name, {})[key] = value
+            self.dirty = True
+
+    def observe(self, name, labels, value):
+        key = tuple(sorted(labels.items()))
+        buckets = HISTOGRAM_BUCKETS[name]
+        with self.lock:
+            self._reset_after_fork()
+            series = self.histograms.setdefault(name, {})
+            state = series.get(key)
+            if state is None:
+                state = series[key] = [0] * (len(buckets) + 2)
+            for index, bound in enumerate(buckets):
+                if value <= bound:
+                    state[index] += 1
+            state[-2] += value
+            state[-1] += 1
+            self.dirty = True
+
+    def snapshot(self):
+        with self.lock:
+            self._reset_after_fork()
+            return {
+                "counters": _as_snapshot(self.counters),
+                "histograms": _as_snapshot(self.histograms),
+                "gauges": _as_snapshot(self.gauges),
+            }
+
+    def flush(self):
+        """Атомарно заменяет файл снимка этого процесса."""
+        with self.flush_lock:
+            self.dirty = False
+            directory = get_metrics_dir()
+            directory.mkdir(parents=True, exist_ok=True)
+            data = json.dumps(self.snapshot())
+            target = directory / f"{os.getpid()}.json"
+            temporary = directory / f".{os.getpid()}.tmp"
+            temporary.write_text(data, encoding="utf-8")
+            os.replace(temporary, target)
+
+
+registry = MetricsRegistry()
+
+
+@atexit.register
+def _flush_on_exit():
+    if registry.pid == os.getpid():
+        registry.flush()
+
+
+def _metric_recorded(sender, kind, name, labels, value, **kwargs):
+    if not getattr(settings, "METRICS_ENABLED", True):
+        return
+    if kind == "gauge":
+        registry.set(name, labels, value)
+    else:
+        registry.inc(name, labels, value)
+
+
+def connect_signals():
+    """Метрики пула соединений и кеша из пакета foodgram."""
+    stats.metric_recorded.connect(_metric_recorded)
+
+
+def _is_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except (PermissionError, OverflowError):
+        pass
+    return True
+
+
+def _read(path):
+    try:
+        return json.loads(path.read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        return None
+
+
+def _merge(data, counters, histograms, gauges=False):
+    """Добавляет снимок data к суммам; показатели — к счётчикам."""
+    groups = [data.get("counters", {})]
+    if gauges:
+        groups.append(data.get("gauges", {}))
+    for group in groups:
+        for name, series in group.items():
+            target = counters.setdefault(name, {})
+            for labels, value in series:
+                key = tuple(tuple(pair) for pair in labels)
+                target[key] = target.get(key, 0) + value
+    for name, series in data.get("histograms", {}).items():
+        target = histograms.setdefault(name, {})
+        for labels, state in series:
+            key = tuple(tuple(pair) for pair in labels)
+            if key in target:
+                target[key] = [a + b for a, b in zip(target[key], state)]
+            else:
+                target[key] = list(state)
+
+
+def _as_snapshot(series):
+    return {
+        name: [[list(key), value] for key, value in items.items()]
+        for name, items in series.items()
+    }
+
+
+def _archive(path, directory):
+    """
+    Переносит счётчики и гистограммы завершившегося воркера в
+    METRICS_DIR/dead.json и удаляет его файл.
+    """
+    data = _read(path)
+    if data is not None:
+        counters, histograms = {}, {}
+        archive = directory / DEAD_FILE
+        _merge(_read(archive) or {}, counters, histograms)
+        _merge(data, counters, histograms)
+        temporary = directory / ".dead.tmp"
+        temporary.write_text(
+            json.dumps(
+                {
+                    "counters": _as_snapshot(counters),
+                    "histograms": _as_snapshot(histograms),
+                }
+            ),
+            encoding="utf-8",
+        )
+        os.replace(temporary, archive)
+    path.unlink(missing_ok=True)
+
+
+def collect():
+    """
+    Сумма метрик всех воркеров.
+
+    Сбор идёт под блокировкой METRICS_DIR/.lock: файлы завершившихся
+    воркеров переносятся в общий файл (_archive) одним процессом, и
+    параллельный сбор не видит их дважды.
+    """
+    registry.flush()
+    directory = get_metrics_dir()
+    counters, histograms = {}, {}
+    with open(directory / ".lock", "a") as lock:
+        # Блокировка снимается при закрытии файла.
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        for path in directory.glob("*.json"):
+            if not path.stem.isdigit():
+                continue
+            if not _is_alive(int(path.stem)):
+                _archive(path, directory)
+                continue
+            data = _read(path)
+            if data is not None:
+                _merge(data, counters, histograms, gauges=True)
+        _merge(_read(directory / DEAD_FILE) or {}, counters, histograms)
+    return counters, histograms
+
+
+def _escape(value):
+    return (
+        str(value)
+        .replace("\\", "\\\\")
+        .replace("\n", "\\n")
+        .replace('"', '\\"')
+    )
+
+
+def _labels(pairs):
+    if not pairs:
+        return ""
+    return "{%s}" % ",".join(
+        f'{key}="{_escape(value)}"' for key, value in pairs
+    )
+
+
+def render_prometheus(counters, histograms):
+    """Текстовый формат экспозиции Prometheus 0.0.4."""
+    lines = []
+    for name, (kind, help_text) in METRICS.items():
+        series = (histograms if kind == "histogram" else counters).get(name)
+        if not series:
+            continue
+        lines.append(f"# HELP {name} {help_text}")
+        lines.append(f"# TYPE {name} {kind}")
+        for key in sorted(series):
+            if kind != "histogram":
+                lines.append(f"{name}{_labels(key)} {series[key]}")
+                continue
+            state = series[key]
+            bounds = HISTOGRAM_BUCKETS[name] + ("+Inf",)
+            for bound, count in zip(bounds, state[:-2] + [state[-1]]):
+                labels = _labels(key + (("le", bound),))
+                lines.append(f"{name}_bucket{labels} {count}")
+            lines.append(f"{name}_sum{_labels(key)} {state[-2]}")
+            lines.append(f"{name}_count{_labels(key)} {state[-1]}")
+    return "\n".join(lines) + "\n"
+
+
+class PrometheusRenderer(BaseRenderer):
+    media_type = "text/plain"
+    format = "prometheus"
+    charset = "utf-8"
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if isinstance(data, str):
+            return data.encode(self.charset)
+        return json.dumps(data).encode(self.charset)
+
+
+class IsStaffOrMetricsToken(permissions.BasePermission):
+    """Доступ администраторам или по заголовку Bearer METRICS_TOKEN."""
+
+    def has_permission(self, request, view):
+        token = getattr(settings, "METRICS_TOKEN", "")
+        # Сравнение за постоянное время (hmac.compare_digest).
+        if token and constant_time_compare(
+            request.headers.get("Authorization", ""), f"Bearer {token}"
+        ):
+            return True
+        return bool(request.user and request.user.is_staff)
+
+
+@api_view(["GET"])
+@permission_classes([IsStaffOrMetricsToken])
+@renderer_classes([PrometheusRenderer])
+def metrics_view(request):
+    """Метрики всех воркеров в формате Prometheus."""
+    return HttpResponse(
+        render_prometheus(*collect()),
+        content_type="text/plain; version=0.0.4; charset=utf-8",
+    )
@@ -0,0 +1,259 @@
+import abc
+import logging
+import time
+
+from asgiref.sync import (
+    async_to_sync,
+    iscoroutinefunction,
+    markcoroutinefunction,
+    sync_to_async,
+)
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+
+from api.instrumentation import (
+    QueryRecorder,
+    arecord_queries,
+    get_query_budget,
+    record_queries,
+    resolve_view_action,
+)
+from api.metrics import registry
+from api.profiling import RequestProfiler, get_staff_user, requested_mode
+from api.tracing import QueryTracer
+
+logger = logging.getLogger("api.query_budget")
+
+
+class HybridMiddleware(abc.ABC):
+    """
+    Основа middleware для WSGI и ASGI.
+
+    Под ASGI get_response асинхронный, и запрос обрабатывает acall():
+    синхронное middleware в цепочке перевело бы в поток и асинхронные
+    представления. Наследники реализуют оба метода.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.acall(request)
+        return self.call(request)
+
+    @abc.abstractmethod
+    def call(self, request):
+        """Обработка запроса под WSGI."""
+
+    @abc.abstractmethod
+    async def acall(self, request):
+        """Обработка запроса под ASGI."""
+
+
+class QueryBudgetMiddleware(HybridMiddleware):
+    """
+    Предупреждение о превышении бюджета SQL-запросов (только при DEBUG).
+
+    Бюджет задаётся атрибутом query_budgets вьюсета для каждого действия.
+    """
+
+    def __init__(self, get_response):
+        if not settings.DEBUG:
+            raise MiddlewareNotUsed
+        super().__init__(get_response)
+
+    def call(self, request):
+        with record_queries() as recorder:
+            response = self.get_response(request)
+        self._check(request, recorder)
+        return response
+
+    async def acall(self, request):
+        async with arecord_queries() as recorder:
+            response = await self.get_response(request)
+        self._check(request, recorder)
+        return response
+
+    def _check(self, request, recorder):
+        budget = getattr(request, "_query_budget", None)
+        if budget is not None and recorder.count > budget[1]:
+            logger.warning(
+                "%s %s: %d SQL-запросов при бюджете %d (%s)",
+                request.method,
+                request.path,
+                recorder.count,
+                budget[1],
+                budget[0],
+            )
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        view_class, action = resolve_view_action(view_func, request.method)
+        budget = get_query_budget(view_class, action)
+        if budget is not None:
+            request._query_budget = (
+                f"{view_class.__name__}.{action}",
+                budget,
+            )
+
+
+class MetricsMiddleware(HybridMiddleware):
+    """
+    Сбор метрик по маршрутам для эндпоинта /api/metrics.
+
+    Маршрут — имя URL (например, recipes-list или
+    recipes-download-shopping-cart); для нераспознанных адресов
+    используется "unmatched".
+    """
+
+    def __init__(self, get_response):
+        if not getattr(settings, "METRICS_ENABLED", True):
+            raise MiddlewareNotUsed
+        super().__init__(get_response)
+
+    def call(self, request):
+        started = time.perf_counter()
+        with record_queries() as recorder:
+            response = self.get_response(request)
+        self._observe(request, response, recorder, started)
+        return response
+
+    async def acall(self, request):
+        started = time.perf_counter()
+        async with arecord_queries() as recorder:
+            response = await self.get_response(request)
+        self._observe(request, response, recorder, started)
+        return response
+
+    def _observe(self, request, response, recorder, started):
+        duration = time.perf_counter() - started
+        match = request.resolver_match
+        labels = {
+            "route": match.url_name if match and match.url_name
+            else "unmatched",
+            "method": request.method,
+        }
+        registry.observe(
+            "foodgram_http_request_duration_seconds", labels, duration
+        )
+        registry.observe("foodgram_sql_queries", labels, recorder.count)
+        registry.inc(
+            "foodgram_sql_duration_seconds_total", labels, recorder.duration
+        )
+        if response.streaming:
+            self._count_streamed(response, labels)
+        else:
+            registry.inc(
+                "foodgram_http_response_size_bytes_total",
+                labels,
+                len(response.content),
+            )
+        registry.inc(
+            "foodgram_http_requests_total",
+            {**labels, "status": str(response.status_code)},
+        )
+
+    def _count_streamed(self, response, labels):
+        """Размер потокового ответа учитывается по отданным частям."""
+        content = response.streaming_content
+        name = "foodgram_http_response_size_bytes_total"
+
+        if response.is_async:
+
+            async def counted():
+                size = 0
+                try:
+                    async for chunk in content:
+                        size += len(chunk)
+                        yield chunk
+                finally:
+                    registry.inc(name, labels, size)
+
+        else:
+
+            def counted():
+                size = 0
+                try:
+                    for chunk in content:
+                        size += len(chunk)
+                        yield chunk
+                finally:
+                    registry.inc(name, labels, size)
+
+        response.streaming_content = counted()
+
+
+class QueryTraceMiddleware(HybridMiddleware):
+    """
+    Журнал медленных и повторяющихся SQL-запросов (SQL_TRACE_ENABLED).
+
+    Каждый запрос к базе сопровождается стеком «действие вьюсета →
+    сериализатор → поле», см. api.tracing.
+    """
+
+    def __init__(self, get_response):
+        if not getattr(settings, "SQL_TRACE_ENABLED", False):
+            raise MiddlewareNotUsed
+        super().__init__(get_response)
+
+    def call(self, request):
+        tracer = QueryTracer(request)
+        with record_queries(QueryRecorder(listeners=[tracer.on_query])):
+            response = self.get_response(request)
+        tracer.finish()
+        return response
+
+    async def acall(self, request):
+        tracer = QueryTracer(request)
+        async with arecord_queries(
+            QueryRecorder(listeners=[tracer.on_query])
+        ):
+            response = await self.get_response(request)
+        tracer.finish()
+        return response
+
+
+class ProfilingMiddleware(HybridMiddleware):
+    """
+    Профилирование запроса по заголовку X-Profile или ?profile=1.
+
+    Доступно только администраторам (сессия или токен); профиль
+    сохраняется в PROFILE_DIR и в админке «Профили запросов», его
+    идентификатор возвращается в заголовке X-Profile-Id. Запросы без
+    флага проходят без дополнительной работы.
+    """
+
+    def __init__(self, get_response):
+        if not getattr(settings, "PROFILING_ENABLED", True):
+            raise MiddlewareNotUsed
+        super().__init__(get_response)
+
+    def call(self, request):
+        if requested_mode(request) is None:
+            return self.get_response(request)
+        return self._profile(request, self.get_response)
+
+    async def acall(self, request):
+        if requested_mode(request) is None:
+            return await self.get_response(request)
+        # Профилировщик и выборка стека работают в потоке запросов к
+        # базе; код самого цикла событий в профиль не попадает.
+        return await sync_to_async(self._profile)(
+            request, async_to_sync(self.get_response)
+        )
+
+    def _profile(self, request, get_response):
+        user = get_staff_user(request)
+        if user is None:
+            return get_response(request)
+        profiler = RequestProfiler(requested_mode(request))
+        response = profiler.run(get_response, request)
+        profile = profiler.save(request, response, user)
+        response["X-Profile-Id"] = profile.key
+        return response
@@ -0,0 +1,43 @@
+# Generated by Django 4.2.24 on 2026-10-19 08:38
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RequestProfile',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('key', models.CharField(max_length=32, unique=True, verbose_name='Идентификатор')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='Дата снятия')),
+                ('method', models.CharField(max_length=8, verbose_name='Метод')),
+                ('path', models.CharField(max_length=512, verbose_name='Адрес')),
+                ('status_code', models.PositiveSmallIntegerField(verbose_name='Статус')),
+                ('mode', models.CharField(max_length=16, verbose_name='Режим')),
+                ('duration_ms', models.FloatField(verbose_name='Время, мс')),
+                ('sql_count', models.PositiveIntegerField(verbose_name='SQL-запросов')),
+                ('sql_ms', models.FloatField(verbose_name='Время SQL, мс')),
+                ('serializer_ms', models.FloatField(verbose_name='Время сериализации, мс (оценка)')),
+                ('samples', models.PositiveIntegerField(verbose_name='Снимков стека')),
+                ('collapsed_file', models.CharField(max_length=64, verbose_name='Свёрнутые стеки')),
+                ('cprofile_file', models.CharField(blank=True, max_length=64, verbose_name='Дамп cProfile')),
+                ('statements', models.JSONField(default=list, verbose_name='Самые долгие SQL-запросы')),
+                ('user', models.ForeignKey(null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='request_profiles', to=settings.AUTH_USER_MODEL, verbose_name='Пользователь')),
+            ],
+            options={
+                'verbose_name': 'Профиль запроса',
+                'verbose_name_plural': 'Профили запросов',
+                'ordering': ['-created_at'],
+            },
+        ),
+    ]
@@ -0,0 +1,50 @@
+from django.conf import settings
+from django.db import models
+
+
+class RequestProfile(models.Model):
+    """Профиль HTTP-запроса, снятый по заголовку X-Profile."""
+
+    PATH_MAX_LENGTH = 512
+
+    key = models.CharField(
+        max_length=32, unique=True, verbose_name="Идентификатор"
+    )
+    created_at = models.DateTimeField(
+        auto_now_add=True, verbose_name="Дата снятия"
+    )
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.SET_NULL,
+        null=True,
+        related_name="request_profiles",
+        verbose_name="Пользователь",
+    )
+    method = models.CharField(max_length=8, verbose_name="Метод")
+    path = models.CharField(max_length=PATH_MAX_LENGTH, verbose_name="Адрес")
+    status_code = models.PositiveSmallIntegerField(verbose_name="Статус")
+    mode = models.CharField(max_length=16, verbose_name="Режим")
+    duration_ms = models.FloatField(verbose_name="Время, мс")
+    sql_count = models.PositiveIntegerField(verbose_name="SQL-запросов")
+    sql_ms = models.FloatField(verbose_name="Время SQL, мс")
+    serializer_ms = models.FloatField(
+        verbose_name="Время сериализации, мс (оценка)"
+    )
+    samples = models.PositiveIntegerField(verbose_name="Снимков стека")
+    collapsed_file = models.CharField(
+        max_length=64, verbose_name="Свёрнутые стеки"
+    )
+    cprofile_file = models.CharField(
+        max_length=64, blank=True, verbose_name="Дамп cProfile"
+    )
+    statements = models.JSONField(
+        default=list, verbose_name="Самые долгие SQL-запросы"
+    )
+
+    class Meta:
+        ordering = ["-created_at"]
+        verbose_name = "Профиль запроса"
+        verbose_name_plural = "Профили запросов"
+
+    def __str__(self):
+        return f"{self.method} {self.path} ({self.duration_ms:.0f} мс)"
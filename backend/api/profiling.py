@@ -0,0 +1,247 @@
+import cProfile
+import sys
+import threading
+import time
+import uuid
+from collections import Counter
+from pathlib import Path
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models.signals import post_delete
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework.serializers import BaseSerializer
+from rest_framework.settings import api_settings
+
+from api.instrumentation import QueryRecorder, record_queries
+from api.models import RequestProfile
+from api.tracing import attribution, fingerprint, normalize_sql
+
+PROFILE_HEADER = "X-Profile"
+PROFILE_PARAM = "profile"
+MODES = ("sample", "cprofile")
+TOP_STATEMENTS = 20
+
+
+def get_profile_dir():
+    return Path(settings.PROFILE_DIR)
+
+
+def remove_files(names):
+    directory = get_profile_dir()
+    for name in names:
+        (directory / name).unlink(missing_ok=True)
+
+
+def _profile_deleted(sender, instance, using="default", **kwargs):
+    # Файлы удаляются после фиксации: откат удаления их не потеряет.
+    names = [
+        name
+        for name in (instance.collapsed_file, instance.cprofile_file)
+        if name
+    ]
+    transaction.on_commit(lambda: remove_files(names), using=using)
+
+
+def connect_signals():
+    """Удаление файлов профиля вместе с записью, в том числе из админки."""
+    post_delete.connect(_profile_deleted, sender=RequestProfile)
+
+
+def requested_mode(request):
+    """
+    Режим профилирования, запрошенный заголовком X-Profile или
+    параметром ?profile=, либо None.
+    """
+    value = request.headers.get(PROFILE_HEADER)
+    if value is None:
+        value = request.GET.get(PROFILE_PARAM)
+    if value is None:
+        return None
+    value = value.strip().lower()
+    if value in ("", "0", "false", "no"):
+        return None
+    return value if value in MODES else MODES[0]
+
+
+def get_staff_user(request):
+    """
+    Администратор, отправивший запрос, или None.
+
+    Сессия проверяется через request.user, токен — аутентификаторами DRF,
+    так как до представления DRF запрос ещё не аутентифицирован.
+    """
+    user = getattr(request, "user", None)
+    if user is not None and user.is_authenticated:
+        return user if user.is_staff else None
+    for authenticator_class in api_settings.DEFAULT_AUTHENTICATION_CLASSES:
+        try:
+            result = authenticator_class().authenticate(request)
+        except (AuthenticationFailed, AttributeError):
+            continue
+        if result is not None:
+            return result[0] if result[0].is_staff else None
+    return None
+
+
+def _frame_name(frame):
+    module = frame.f_globals.get("__name__", "?")
+    return f"{module}:{frame.f_code.co_name}"
+
+
+def _is_serializer_frame(frame):
+    return frame.f_code.co_name == "to_representation" and isinstance(
+        frame.f_locals.get("self"), BaseSerializer
+    )
+
+
+class StackSampler:
+    """
+    Статистический профилировщик одного потока.
+
+    Фоновый поток раз в interval секунд снимает стек профилируемого
+    потока через sys._current_frames и копит свёрнутые стеки
+    (формат collapsed для flamegraph.pl и speedscope).
+    """
+
+    def __init__(self, thread_id, interval):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks = Counter()
+        self.samples = 0
+        self.serializer_samples = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is not None:
+                self._sample(frame)
+
+    def _sample(self, frame):
+        names = []
+        in_serializer = False
+        while frame is not None:
+            names.append(_frame_name(frame))
+            in_serializer = in_serializer or _is_serializer_frame(frame)
+            frame = frame.f_back
+        self.stacks[";".join(reversed(names))] += 1
+        self.samples += 1
+        self.serializer_samples += in_serializer
+
+    def collapsed(self):
+        return "".join(
+            f"{stack} {count}\n" for stack, count in self.stacks.most_common()
+        )
+
+
+class SqlCollector:
+    """Время SQL по отпечаткам запросов с источником в коде."""
+
+    def __init__(self):
+        self.statements = {}
+
+    def on_query(self, sql, params, many, duration):
+        normalized = normalize_sql(sql)
+        key = fingerprint(normalized)
+        entry = self.statements.get(key)
+        if entry is None:
+            entry = self.statements[key] = {
+                "fingerprint": key,
+                "sql": normalized,
+                "source": attribution(),
+                "count": 0,
+                "total_ms": 0.0,
+            }
+        entry["count"] += 1
+        entry["total_ms"] += duration * 1000
+
+    def top(self, limit=TOP_STATEMENTS):
+        statements = sorted(
+            self.statements.values(),
+            key=lambda entry: entry["total_ms"],
+            reverse=True,
+        )[:limit]
+        return [
+            {**entry, "total_ms": round(entry["total_ms"], 3)}
+            for entry in statements
+        ]
+
+
+class RequestProfiler:
+    """
+    Профиль одного HTTP-запроса.
+
+    В режиме sample работает только StackSampler; в режиме cprofile
+    дополнительно сохраняется дамп cProfile (.prof) для pstats/snakeviz.
+    Время сериализации оценивается по доле снимков стека, в которых есть
+    to_representation сериализатора.
+    """
+
+    def __init__(self, mode):
+        self.mode = mode
+        self.key = uuid.uuid4().hex
+        self.sampler = StackSampler(
+            threading.get_ident(), settings.PROFILE_SAMPLE_INTERVAL
+        )
+        self.sql = SqlCollector()
+        self.recorder = QueryRecorder(listeners=[self.sql.on_query])
+        self.profile = cProfile.Profile() if mode == "cprofile" else None
+        self.duration = 0.0
+
+    def run(self, get_response, request):
+        started = time.perf_counter()
+        self.sampler.start()
+        if self.profile is not None:
+            self.profile.enable()
+        try:
+            with record_queries(self.recorder):
+                return get_response(request)
+        finally:
+            if self.profile is not None:
+                self.profile.disable()
+            self.sampler.stop()
+            self.duration = time.perf_counter() - started
+
+    def serializer_ms(self):
+        if not self.sampler.samples:
+            return 0.0
+        share = self.sampler.serializer_samples / self.sampler.samples
+        return share * self.duration * 1000
+
+    def save(self, request, response, user):
+        """Пишет файлы профиля в PROFILE_DIR и создаёт RequestProfile."""
+        directory = get_profile_dir()
+        directory.mkdir(parents=True, exist_ok=True)
+        collapsed_file = f"{self.key}.collapsed"
+        (directory / collapsed_file).write_text(
+            self.sampler.collapsed(), encoding="utf-8"
+        )
+        cprofile_file = ""
+        if self.profile is not None:
+            cprofile_file = f"{self.key}.prof"
+            self.profile.dump_stats(directory / cprofile_file)
+        return RequestProfile.objects.create(
+            key=self.key,
+            user=user,
+            method=request.method,
+            path=request.get_full_path()[:RequestProfile.PATH_MAX_LENGTH],
+            status_code=response.status_code,
+            mode=self.mode,
+            duration_ms=self.duration * 1000,
+            sql_count=self.recorder.count,
+            sql_ms=self.recorder.duration * 1000,
+            serializer_ms=self.serializer_ms(),
+            samples=self.sampler.samples,
+            collapsed_file=collapsed_file,
+            cprofile_file=cprofile_file,
+            statements=self.sql.top(),
+        )
@@ -0,0 +1,201 @@
+from django.conf import settings
+from django.db.models.signals import m2m_changed, post_save, pre_delete
+
+from api.recipes.serializers import RecipeGetSerializer
+from api.users.serializers import UserSerializer
+from api.utils import is_subscribed
+from foodgram import query_cache
+from recipes.models import Ingredient, Recipe, RecipeDocument, Tag
+from users.models import User
+
+RECIPE_FIELDS = RecipeGetSerializer.Meta.fields
+AUTHOR_FIELDS = UserSerializer.Meta.fields
+# Поля автора, которые попадают в документ рецепта.
+AUTHOR_DOCUMENT_FIELDS = {
+    "email", "username", "first_name", "last_name", "avatar",
+}
+VIEWER_FIELDS = ("is_favorited", "is_in_shopping_cart")
+# Аннотация рецепта с подпиской на автора (api.utils.subscribed_to).
+AUTHOR_SUBSCRIBED = "author__is_subscribed"
+
+
+def is_enabled():
+    return getattr(settings, "RECIPE_READ_MODEL", False)
+
+
+def build_documents(recipe_ids):
+    """
+    Пересобирает документы рецептов и возвращает {id: данные}.
+
+    Документ — вывод RecipeGetSerializer без запроса (относительные адреса
+    файлов) и без полей, зависящих от пользователя.
+    """
+    recipes = list(
+        Recipe.objects.filter(id__in=recipe_ids)
+        .select_related("author")
+        .prefetch_related("tags", "recipe_ingredients__ingredient")
+    )
+    for recipe in recipes:
+        recipe.is_favorited = recipe.is_in_shopping_cart = False
+    rows = RecipeGetSerializer(recipes, many=True).data
+    documents = {}
+    for recipe, row in zip(recipes, rows):
+        for field in VIEWER_FIELDS:
+            row.pop(field)
+        author = dict(row.pop("author"))
+        author.pop("is_subscribed")
+        documents[recipe.id] = RecipeDocument(
+            recipe=recipe,
+            data={**row, "author": author},
+            source_updated_at=recipe.updated_at,
+        )
+    RecipeDocument.objects.bulk_create(
+        documents.values(),
+        update_conflicts=True,
+        unique_fields=["recipe"],
+        update_fields=["data", "source_updated_at"],
+    )
+    return {
+        recipe_id: document.data
+        for recipe_id, document in documents.items()
+    }
+
+
+def _absolute(request, url):
+    if not url or request is None:
+        return url
+    return request.build_absolute_uri(url)
+
+
+def render_documents(recipes, request):
+    """
+    Представление рецептов из документов с полями текущего пользователя.
+
+    recipes — объекты с id, author_id, updated_at и аннотациями
+    is_favorited/is_in_shopping_cart и AUTHOR_SUBSCRIBED. Отсутствующие
+    и устаревшие документы пересобираются.
+    """
+    recipes = list(recipes)
+    stored = RecipeDocument.objects.filter(
+        recipe_id__in=[recipe.id for recipe in recipes]
+    )
+    documents = {}
+    for document in stored:
+        documents[document.recipe_id] = document
+    stale = [
+        recipe.id
+        for recipe in recipes
+        if recipe.id not in documents
+        or documents[recipe.id].source_updated_at != recipe.updated_at
+    ]
+    data = {
+        recipe_id: document.data
+        for recipe_id, document in documents.items()
+    }
+    if stale:
+        data.update(build_documents(stale))
+
+    result = []
+    for recipe in recipes:
+        # Рецепт удалён после выборки: документа для него нет.
+        document = data.get(recipe.id)
+        if document is None:
+            continue
+        subscribed = getattr(recipe, AUTHOR_SUBSCRIBED, None)
+        if subscribed is None:
+            subscribed = is_subscribed(request, recipe.author_id)
+        author = {**document["author"], "is_subscribed": subscribed}
+        author["avatar"] = _absolute(request, author["avatar"])
+        row = {
+            **document,
+            "author": {field: author[field] for field in AUTHOR_FIELDS},
+            "is_favorited": recipe.is_favorited,
+            "is_in_shopping_cart": recipe.is_in_shopping_cart,
+            "image": _absolute(request, document["image"]),
+        }
+        result.append({field: row[field] for field in RECIPE_FIELDS})
+    return result
+
+
+def _drop_documents(queryset):
+    """Удаляет документы: они пересоберутся при следующем чтении."""
+    RecipeDocument.objects.filter(recipe__in=queryset).delete()
+
+
+def _tag_saved(sender, instance, created, **kwargs):
+    if not created:
+        _drop_documents(Recipe.objects.filter(tags=instance))
+
+
+def _ingredient_saved(sender, instance, created, **kwargs):
+    if not created:
+        _drop_documents(Recipe.objects.filter(ingredients=instance))
+
+
+def _tags_updated(sender, pks, **kwargs):
+    _drop_documents(Recipe.objects.filter(tags__in=pks))
+
+
+def _ingredients_updated(sender, pks, **kwargs):
+    _drop_documents(Recipe.objects.filter(ingredients__in=pks))
+
+
+def _tag_deleting(sender, instance, **kwargs):
+    # До каскада: после удаления связи с рецептами уже не найти.
+    _drop_documents(Recipe.objects.filter(tags=instance))
+
+
+def _ingredient_deleting(sender, instance, **kwargs):
+    _drop_documents(Recipe.objects.filter(ingredients=instance))
+
+
+def _links_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    """Теги и ингредиенты рецепта изменены через add/remove/set/clear."""
+    if action not in ("post_add", "post_remove", "pre_clear"):
+        return
+    if not reverse:
+        recipe_ids = [instance.pk]
+    elif pk_set is not None:
+        recipe_ids = pk_set
+    else:
+        # tag.recipes.clear(): рецепты известны только до удаления связей.
+        field = "tags" if sender is Recipe.tags.through else "ingredients"
+        recipe_ids = Recipe.objects.filter(**{field: instance}).values("id")
+    RecipeDocument.objects.filter(recipe_id__in=recipe_ids).delete()
+
+
+def _author_saved(sender, instance, created, update_fields=None, **kwargs):
+    if created or (
+        update_fields is not None
+        and not AUTHOR_DOCUMENT_FIELDS.intersection(update_fields)
+    ):
+        return
+    _drop_documents(Recipe.objects.filter(author=instance))
+
+
+def _authors_updated(sender, pks, fields, **kwargs):
+    if AUTHOR_DOCUMENT_FIELDS.intersection(fields):
+        _drop_documents(Recipe.objects.filter(author__in=pks))
+
+
+def connect_signals():
+    """
+    Сброс документов при изменении и удалении тегов и ингредиентов,
+    изменении связей рецепта с ними и данных авторов, в том числе через
+    QuerySet.update() и bulk_update() (сигнал query_cache.rows_updated).
+
+    Изменения самого рецепта видны по updated_at, поэтому отдельный
+    обработчик для Recipe не нужен.
+    """
+    if not is_enabled():
+        return
+    post_save.connect(_tag_saved, sender=Tag)
+    post_save.connect(_ingredient_saved, sender=Ingredient)
+    pre_delete.connect(_tag_deleting, sender=Tag)
+    pre_delete.connect(_ingredient_deleting, sender=Ingredient)
+    m2m_changed.connect(_links_changed, sender=Recipe.tags.through)
+    m2m_changed.connect(_links_changed, sender=Recipe.ingredients.through)
+    post_save.connect(_author_saved, sender=User)
+    query_cache.rows_updated.connect(_tags_updated, sender=Tag)
+    query_cache.rows_updated.connect(_ingredients_updated, sender=Ingredient)
+    query_cache.rows_updated.connect(_authors_updated, sender=User)
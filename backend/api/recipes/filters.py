@@ -1,15 +1,27 @@
+from django.db.models import Exists, OuterRef
 from django_filters import rest_framework as filters
 
-from recipes.models import Ingredient, Recipe, Tag
+from api.recipes.ranking import ORDERINGS
+from recipes.models import (
+    Favorite,
+    Ingredient,
+    Recipe,
+    ShoppingCart,
+    Tag,
+)
 
 
 class RecipeFilter(filters.FilterSet):
-    """Фильтрация рецептов по тегам, автору, избранному и списку покупок."""
+    """
+    Фильтрация рецептов по тегам, автору, избранному и списку покупок,
+    сортировка по популярности.
+    """
 
     tags = filters.ModelMultipleChoiceFilter(
-        queryset=Tag.objects.all(),
+        queryset=Tag.objects.cached(),
         field_name="tags__slug",
         to_field_name="slug",
+        method="filter_tags",
     )
     author = filters.NumberFilter(field_name="author__id")
     is_favorited = filters.BooleanFilter(method="filter_is_favorited")
@@ -17,19 +29,52 @@ class RecipeFilter(filters.FilterSet):
         method="filter_is_in_shopping_cart"
     )
 
+    ordering = filters.ChoiceFilter(
+        choices=(
+            ("popular", "Популярные"),
+            ("trending", "Популярные за последние дни"),
+        ),
+        method="filter_ordering",
+    )
+
     class Meta:
         model = Recipe
         fields = ["tags", "author", "is_favorited", "is_in_shopping_cart"]
 
-    def filter_is_favorited(self, queryset, name, value):
+    def filter_tags(self, queryset, name, value):
+        if not value:
+            return queryset
+        # Подзапрос вместо JOIN: без дублей и DISTINCT, сортировка идёт
+        # по индексу.
+        return queryset.filter(
+            Exists(
+                Recipe.tags.through.objects.filter(
+                    recipe=OuterRef("pk"), tag__in=value
+                )
+            )
+        )
+
+    def filter_ordering(self, queryset, name, value):
+        return queryset.order_by(f"-{ORDERINGS[value]}", "-id")
+
+    def _filter_user_relation(self, queryset, model, value):
+        # Подзапрос с user_id = ... читает одну секцию разбитой таблицы
+        # (foodgram.partitioning) и не размножает строки рецептов.
         if self.request.user.is_authenticated and value:
-            return queryset.filter(in_favorites__user=self.request.user)
+            return queryset.filter(
+                Exists(
+                    model.objects.filter(
+                        user=self.request.user, recipe=OuterRef("pk")
+                    )
+                )
+            )
         return queryset
 
+    def filter_is_favorited(self, queryset, name, value):
+        return self._filter_user_relation(queryset, Favorite, value)
+
     def filter_is_in_shopping_cart(self, queryset, name, value):
-        if self.request.user.is_authenticated and value:
-            return queryset.filter(in_shoppingcarts__user=self.request.user)
-        return queryset
+        return self._filter_user_relation(queryset, ShoppingCart, value)
 
 
 class IngredientFilter(filters.FilterSet):
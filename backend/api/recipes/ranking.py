@@ -0,0 +1,160 @@
+import atexit
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Case, F, FloatField, IntegerField, Value, When
+from django.db.models.functions import Greatest
+from django.db.models.signals import post_save
+from django.utils import timezone
+
+from api.recipes.view_counts import DeltaBuffer
+from recipes.models import Favorite, Recipe, ShoppingCart
+
+# Вклад добавления в trending.
+WEIGHTS = {Favorite: 1.0, ShoppingCart: 0.5}
+# Значения ?ordering= и поля сортировки (по убыванию).
+ORDERINGS = {"popular": "popularity", "trending": "trending"}
+
+
+def decay_factor(elapsed):
+    """Во сколько раз вклад уменьшился за elapsed."""
+    half_life = timedelta(hours=settings.RANKING_HALF_LIFE_HOURS)
+    return 0.5 ** (max(elapsed, timedelta(0)) / half_life)
+
+
+def _by_recipe(deltas, index, output_field):
+    return Case(
+        *(
+            When(pk=recipe_id, then=Value(delta[index]))
+            for recipe_id, delta in deltas.items()
+        ),
+        default=Value(0),
+        output_field=output_field,
+    )
+
+
+def apply(deltas, using="default"):
+    """
+    Прибавляет {id рецепта: (popularity, trending)} одним UPDATE; оценки
+    не опускаются ниже нуля.
+    """
+    if not deltas:
+        return
+    Recipe.objects.using(using).filter(pk__in=sorted(deltas)).update(
+        popularity=Greatest(
+            F("popularity") + _by_recipe(deltas, 0, IntegerField()),
+            Value(0),
+        ),
+        trending=Greatest(
+            F("trending") + _by_recipe(deltas, 1, FloatField()),
+            Value(0.0),
+        ),
+    )
+
+
+class RankingBuffer(DeltaBuffer):
+    """
+    Изменения popularity и trending от избранного и списков покупок.
+
+    Добавление не обновляет строку рецепта сразу: приращения копятся в
+    воркере и сохраняются пачкой, как просмотры (view_counts).
+    """
+
+    models = (Recipe,)
+
+    def combine(self, value, delta):
+        return (value[0] + delta[0], value[1] + delta[1])
+
+    def save(self, deltas, using):
+        apply(deltas, using=using)
+
+
+buffer = RankingBuffer()
+atexit.register(buffer.flush_on_exit)
+
+
+def _record(recipe_id, popularity, trending, using):
+    # Откаченное добавление не должно попасть в буфер.
+    transaction.on_commit(
+        lambda: buffer.add(recipe_id, (popularity, trending), using=using),
+        using=using,
+    )
+
+
+def _relation_saved(
+    sender, instance, created, raw=False, using="default", **kwargs
+):
+    if not created or raw:
+        return
+    _record(instance.recipe_id, 1, WEIGHTS[sender], using)
+
+
+def record_removal(model, recipe_id, added_at, using="default"):
+    """
+    Снимает вклад удалённой из избранного или корзины записи.
+
+    Вызывается явно, а не из post_delete: обработчик отключил бы быстрое
+    каскадное удаление рецептов и пользователей. Записи, удалённые
+    каскадом вместе с пользователем, учитываются при decay_rankings
+    --rebuild.
+    """
+    weight = WEIGHTS[model] * decay_factor(timezone.now() - added_at)
+    _record(recipe_id, -1, -weight, using)
+
+
+def connect_signals():
+    for model in WEIGHTS:
+        post_save.connect(_relation_saved, sender=model)
+
+
+def decay(now=None):
+    """
+    Затухание trending с прошлого прохода.
+
+    Рецептам, получившим ranked_at на одном проходе, множитель считается
+    один раз; добавления после прохода затухают с его момента.
+    """
+    now = now or timezone.now()
+    moments = (
+        Recipe.objects.exclude(ranked_at=None)
+        .order_by()
+        .values_list("ranked_at", flat=True)
+        .distinct()
+    )
+    updated = 0
+    for moment in list(moments):
+        updated += Recipe.objects.filter(ranked_at=moment).update(
+            trending=F("trending") * decay_factor(now - moment),
+            ranked_at=now,
+        )
+    updated += Recipe.objects.filter(ranked_at=None).update(ranked_at=now)
+    return updated
+
+
+def rebuild(now=None, batch_size=1000):
+    """Пересчёт popularity и trending по избранному и спискам покупок."""
+    now = now or timezone.now()
+    popularity, trending = {}, {}
+    for model, weight in WEIGHTS.items():
+        rows = model.objects.order_by().values_list("recipe_id", "created_at")
+        for recipe_id, created_at in rows.iterator(chunk_size=batch_size):
+            popularity[recipe_id] = popularity.get(recipe_id, 0) + 1
+            trending[recipe_id] = trending.get(recipe_id, 0.0) + (
+                weight * decay_factor(now - created_at)
+            )
+    recipes = [
+        Recipe(
+            id=recipe_id,
+            popularity=popularity.get(recipe_id, 0),
+            trending=trending.get(recipe_id, 0.0),
+            ranked_at=now,
+        )
+        for recipe_id in Recipe.objects.values_list("id", flat=True)
+    ]
+    Recipe.objects.bulk_update(
+        recipes,
+        ["popularity", "trending", "ranked_at"],
+        batch_size=batch_size,
+    )
+    return len(recipes)
@@ -1,9 +1,11 @@
 from django.db import transaction
+from django.db.models import prefetch_related_objects
 from rest_framework import serializers
 from rest_framework.validators import UniqueTogetherValidator
 
+from api.sparse_fields import SparseFieldsSerializerMixin
 from api.users.serializers import UserSerializer
-from api.utils import Base64ImageField
+from api.utils import Base64ImageField, BulkPrimaryKeyRelatedField
 from recipes.models import (
     Favorite,
     Ingredient,
@@ -63,7 +65,9 @@ class RecipeSmallSerializer(serializers.ModelSerializer):
         fields = ("id", "name", "image", "cooking_time")
 
 
-class RecipeGetSerializer(serializers.ModelSerializer):
+class RecipeGetSerializer(
+    SparseFieldsSerializerMixin, serializers.ModelSerializer
+):
     """Полный сериализатор рецепта для чтения."""
 
     tags = TagSerializer(many=True, read_only=True)
@@ -94,8 +98,8 @@ class RecipeGetSerializer(serializers.ModelSerializer):
 class RecipeCreateSerializer(serializers.ModelSerializer):
     """Сериализатор для создания и обновления рецептов."""
 
-    tags = serializers.PrimaryKeyRelatedField(
-        queryset=Tag.objects.all(),
+    tags = BulkPrimaryKeyRelatedField(
+        queryset=Tag.objects.cached(),
         many=True
     )
     ingredients = IngredientPostSerializer(
@@ -133,10 +137,15 @@ class RecipeCreateSerializer(serializers.ModelSerializer):
                 {"ingredients": "Список ингредиентов не может быть пустым."}
             )
 
+        existing_ids = set(
+            Ingredient.objects.filter(
+                id__in=[item["id"] for item in ingredients]
+            ).cached().values_list("id", flat=True)
+        )
         ingredient_ids = set()
         for ingredient_data in ingredients:
             ingredient_id = ingredient_data["id"]
-            if not Ingredient.objects.filter(id=ingredient_id).exists():
+            if ingredient_id not in existing_ids:
                 raise serializers.ValidationError(
                     {
                         "ingredients": f"Ингредиент с id {ingredient_id}"
@@ -206,6 +215,13 @@ class RecipeCreateSerializer(serializers.ModelSerializer):
 
     def to_representation(self, instance):
         request = self.context.get("request")
+        # После update предзагруженные ингредиенты устарели.
+        getattr(instance, "_prefetched_objects_cache", {}).pop(
+            "recipe_ingredients", None
+        )
+        prefetch_related_objects(
+            [instance], "tags", "recipe_ingredients__ingredient"
+        )
         if not hasattr(instance, "is_favorited"):
             instance.is_favorited = False
         if not hasattr(instance, "is_in_shopping_cart"):
@@ -1,8 +1,54 @@
-from django.shortcuts import get_object_or_404, redirect
+from django.conf import settings
+from django.http import Http404
+from django.shortcuts import redirect
+from django.utils.cache import patch_cache_control
 
-from recipes.models import Recipe
+from api.recipes import short_links, view_counts
 
 
-def short_link_redirect(request, pk):
-    recipe = get_object_or_404(Recipe, pk=pk)
-    return redirect(f"/recipes/{recipe.id}/")
+def _recipe_id(code):
+    """Id рецепта из кода ссылки; старые ссылки вида /s/<id>/."""
+    recipe_id = short_links.decode(code)
+    if recipe_id is None and code.isascii() and code.isdigit():
+        # Как конвертер <int:pk>: только цифры ASCII.
+        if len(code) <= len(str(short_links.MAX_RECIPE_ID)):
+            recipe_id = int(code)
+    if recipe_id is None or recipe_id > short_links.MAX_RECIPE_ID:
+        return None
+    return recipe_id
+
+
+def _redirect(recipe_id):
+    view_counts.counter.add(recipe_id)
+    response = redirect(f"/recipes/{recipe_id}/")
+    # Редирект не меняется, пока рецепт существует: его кешируют браузер
+    # и CDN. nginx редирект не кеширует, чтобы переходы доходили до
+    # счётчика.
+    patch_cache_control(
+        response, public=True, max_age=settings.SHORT_LINK_MAX_AGE
+    )
+    return response
+
+
+def short_link_redirect(request, code):
+    """
+    Переход по короткой ссылке без запросов к базе.
+
+    Код проверяется по контрольной сумме, существование рецепта — по
+    битовой карте id, просмотр записывается в буфер воркера. Старые
+    ссылки вида /s/<id>/ продолжают работать.
+    """
+    recipe_id = _recipe_id(code)
+    if recipe_id is None or not short_links.recipe_exists(recipe_id):
+        raise Http404("Рецепт не найден.")
+    return _redirect(recipe_id)
+
+
+async def async_short_link_redirect(request, code):
+    """short_link_redirect для ASGI (ASYNC_VIEWS_ENABLED)."""
+    recipe_id = _recipe_id(code)
+    if recipe_id is None or not await short_links.arecipe_exists(
+        recipe_id
+    ):
+        raise Http404("Рецепт не найден.")
+    return _redirect(recipe_id)
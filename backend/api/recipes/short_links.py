@@ -0,0 +1,163 @@
+import math
+import string
+import threading
+import time
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db.models.signals import post_delete
+from django.utils.crypto import salted_hmac
+
+from foodgram import invalidation
+from recipes.models import Recipe
+
+ALPHABET = string.digits + string.ascii_letters
+BASE = len(ALPHABET)
+DIGITS = {char: index for index, char in enumerate(ALPHABET)}
+# Бит контрольной суммы в коде: без секрета подходит 1 код из миллиона.
+CHECK_BITS = 20
+CHECK_MASK = (1 << CHECK_BITS) - 1
+# Наибольший id (bigint): коды длиннее и id больше заведомо не подходят.
+MAX_RECIPE_ID = 2 ** 63 - 1
+MAX_CODE_LENGTH = math.ceil(
+    (MAX_RECIPE_ID.bit_length() + CHECK_BITS) / math.log2(BASE)
+)
+SALT = "foodgram.short_link"
+RECIPE_TAG_PREFIX = f"{Recipe._meta.label_lower}:"
+
+
+def _checksum(recipe_id):
+    digest = salted_hmac(SALT, str(recipe_id)).digest()
+    return int.from_bytes(digest[:4], "big") & CHECK_MASK
+
+
+def encode(recipe_id):
+    """Короткий код рецепта: id и контрольная сумма в base62."""
+    value = (recipe_id << CHECK_BITS) | _checksum(recipe_id)
+    chars = []
+    while value:
+        value, digit = divmod(value, BASE)
+        chars.append(ALPHABET[digit])
+    return "".join(reversed(chars))
+
+
+def decode(code):
+    """Id рецепта из кода или None, если код повреждён или подделан."""
+    if len(code) > MAX_CODE_LENGTH:
+        return None
+    value = 0
+    for char in code:
+        digit = DIGITS.get(char)
+        if digit is None:
+            return None
+        value = value * BASE + digit
+    recipe_id = value >> CHECK_BITS
+    if not 1 <= recipe_id <= MAX_RECIPE_ID:
+        return None
+    if value & CHECK_MASK != _checksum(recipe_id):
+        return None
+    return recipe_id
+
+
+class RecipeIdSet:
+    """
+    Битовая карта id существующих рецептов в памяти процесса.
+
+    Загружается одним запросом и перечитывается раз в
+    SHORT_LINK_REFRESH секунд. Id, которого нет в карте (рецепт создан
+    в другом воркере), проверяется запросом и добавляется. Удалённые
+    рецепты убираются сразу в своём процессе и по шине инвалидации — в
+    остальных; без шины — при следующем перечитывании.
+    """
+
+    def __init__(self):
+        self.bits = bytearray()
+        self.loaded_at = None
+        self.lock = threading.Lock()
+
+    def __contains__(self, recipe_id):
+        index = recipe_id >> 3
+        return index < len(self.bits) and bool(
+            self.bits[index] & (1 << (recipe_id & 7))
+        )
+
+    @staticmethod
+    def _set(bits, recipe_id):
+        index = recipe_id >> 3
+        if index >= len(bits):
+            bits.extend(bytes(index + 1 - len(bits)))
+        bits[index] |= 1 << (recipe_id & 7)
+
+    def add(self, recipe_id):
+        self._set(self.bits, recipe_id)
+
+    def discard(self, recipe_id):
+        index = recipe_id >> 3
+        if index < len(self.bits):
+            self.bits[index] &= ~(1 << (recipe_id & 7)) & 0xFF
+
+    def _is_stale(self):
+        return (
+            self.loaded_at is None
+            or time.monotonic() - self.loaded_at > settings.SHORT_LINK_REFRESH
+        )
+
+    def load(self):
+        bits = bytearray()
+        for recipe_id in Recipe.objects.values_list("id", flat=True):
+            self._set(bits, recipe_id)
+        self.bits = bits
+        self.loaded_at = time.monotonic()
+
+    def refresh(self):
+        if self._is_stale():
+            with self.lock:
+                if self._is_stale():
+                    self.load()
+
+    def exists(self, recipe_id):
+        self.refresh()
+        if recipe_id in self:
+            return True
+        if Recipe.objects.filter(pk=recipe_id).exists():
+            self.add(recipe_id)
+            return True
+        return False
+
+    async def aexists(self, recipe_id):
+        """exists() для асинхронных представлений."""
+        if self._is_stale():
+            await sync_to_async(self.refresh)()
+        if recipe_id in self:
+            return True
+        if await Recipe.objects.filter(pk=recipe_id).aexists():
+            self.add(recipe_id)
+            return True
+        return False
+
+
+recipe_ids = RecipeIdSet()
+
+
+def recipe_exists(recipe_id):
+    return recipe_ids.exists(recipe_id)
+
+
+async def arecipe_exists(recipe_id):
+    return await recipe_ids.aexists(recipe_id)
+
+
+def _recipe_deleted(sender, instance, **kwargs):
+    recipe_ids.discard(instance.pk)
+
+
+@invalidation.subscribe
+def _on_invalidation(tags, message_origin):
+    """Рецепт изменён или удалён в другом воркере: проверить заново."""
+    for tag in tags:
+        if tag.startswith(RECIPE_TAG_PREFIX):
+            recipe_ids.discard(int(tag[len(RECIPE_TAG_PREFIX):]))
+
+
+def connect_signals():
+    post_delete.connect(_recipe_deleted, sender=Recipe)
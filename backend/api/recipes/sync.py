@@ -0,0 +1,243 @@
+import datetime
+import threading
+
+from django.conf import settings
+from django.core import signing
+from django.db import transaction
+from django.contrib.auth import get_user_model
+from django.db.models import Q, QuerySet, Value
+from django.db.models.signals import post_delete, pre_delete
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.exceptions import APIException, ValidationError
+
+from recipes.models import Favorite, Recipe, ShoppingCart, Tombstone
+
+TOKEN_SALT = "foodgram.sync"
+TOKEN_PARAM = "since"
+EPOCH = datetime.datetime(1970, 1, 1, tzinfo=datetime.timezone.utc)
+MODEL_KINDS = {
+    Recipe: Tombstone.RECIPE,
+    Favorite: Tombstone.FAVORITE,
+    ShoppingCart: Tombstone.SHOPPING_CART,
+}
+
+# Текущая пачка надгробий потока.
+_pending = threading.local()
+
+
+class SyncTokenExpired(APIException):
+    status_code = status.HTTP_410_GONE
+    default_detail = (
+        "Токен синхронизации устарел, нужна полная синхронизация."
+    )
+    default_code = "sync_token_expired"
+
+
+def to_micros(moment):
+    return (moment - EPOCH) // datetime.timedelta(microseconds=1)
+
+
+def from_micros(micros):
+    return EPOCH + datetime.timedelta(microseconds=micros)
+
+
+class _Batch:
+    """Надгробия одной транзакции, сохраняемые одним запросом."""
+
+    def __init__(self, using):
+        self.using = using
+        self.rows = []
+
+    def __call__(self):
+        now = timezone.now()
+        Tombstone.objects.using(self.using).bulk_create(
+            Tombstone(
+                kind=kind, object_id=object_id, user_id=user_id,
+                deleted_at=now,
+            )
+            for kind, object_id, user_id in self.rows
+        )
+
+
+def record_deletions(kind, object_ids, user_id=None, using="default"):
+    """
+    Записывает надгробия после фиксации текущей транзакции.
+
+    Удаления одной транзакции (например, каскад при удалении автора)
+    сохраняются одним запросом.
+    """
+    connection = transaction.get_connection(using)
+    batch = getattr(_pending, "batch", None)
+    registered = batch is not None and any(
+        entry[1] is batch for entry in connection.run_on_commit
+    )
+    rows = [(kind, pk, user_id) for pk in object_ids]
+    if connection.in_atomic_block and registered:
+        batch.rows.extend(rows)
+        return
+    batch = _pending.batch = _Batch(using)
+    batch.rows.extend(rows)
+    transaction.on_commit(batch, using=using)
+
+
+def _recipe_deleted(sender, instance, using="default", **kwargs):
+    record_deletions(Tombstone.RECIPE, [instance.pk], using=using)
+
+
+def _deleted_user_ids(origin):
+    """
+    Id пользователей, удаляемых вместе с рецептом: их надгробия не нужны
+    и нарушили бы внешний ключ.
+    """
+    if isinstance(origin, get_user_model()):
+        return {origin.pk}
+    if isinstance(origin, QuerySet) and origin.model is get_user_model():
+        # Один запрос на всё удаление, а не на каждый рецепт.
+        if not hasattr(origin, "_sync_user_ids"):
+            origin._sync_user_ids = set(origin.values_list("pk", flat=True))
+        return origin._sync_user_ids
+    return set()
+
+
+def _recipe_deleting(sender, instance, using="default", origin=None, **kwargs):
+    """
+    Надгробия избранного и корзин других пользователей до каскада.
+
+    Обработчики post_delete на самих записях отключили бы быстрое
+    каскадное удаление, поэтому пары (пользователь, рецепт) читаются
+    одним запросом до удаления рецепта.
+    """
+    skip = _deleted_user_ids(origin)
+    querysets = [
+        model.objects.using(using)
+        .filter(recipe_id=instance.pk)
+        .order_by()
+        .annotate(kind=Value(kind))
+        .values_list("kind", "user_id")
+        for model, kind in MODEL_KINDS.items()
+        if model is not Recipe
+    ]
+    rows = querysets[0].union(*querysets[1:], all=True)
+    for kind, user_id in rows:
+        if user_id not in skip:
+            record_deletions(kind, [instance.pk], user_id, using=using)
+
+
+def connect_signals():
+    """
+    Надгробия удалённых рецептов, в том числе при каскадном удалении, и
+    удалённых вместе с ними записей избранного и корзин.
+    """
+    pre_delete.connect(_recipe_deleting, sender=Recipe)
+    post_delete.connect(_recipe_deleted, sender=Recipe)
+
+
+def encode_token(kind, user_id, changed, deleted):
+    return signing.dumps(
+        {"k": kind, "u": user_id, "c": changed, "d": deleted},
+        salt=TOKEN_SALT,
+        compress=True,
+    )
+
+
+def make_token(kind, user_id, since):
+    """Токен, с которым лента отдаст всё изменённое после since."""
+    cursor = [to_micros(since), 0]
+    return encode_token(kind, user_id, cursor, cursor)
+
+
+def decode_token(token, kind, user_id):
+    """Курсоры (время в мкс, id) изменений и удалений из токена."""
+    try:
+        data = signing.loads(token, salt=TOKEN_SALT)
+        if data["k"] != kind or data["u"] != user_id:
+            raise ValueError(token)
+        changed, deleted = data["c"], data["d"]
+    except (signing.BadSignature, ValueError, KeyError, TypeError):
+        raise ValidationError(
+            {TOKEN_PARAM: "Некорректный токен синхронизации."}
+        )
+    retention = datetime.timedelta(days=settings.SYNC_RETENTION_DAYS)
+    if from_micros(deleted[0]) < timezone.now() - retention:
+        raise SyncTokenExpired()
+    return changed, deleted
+
+
+def _page(queryset, time_field, value_field, cursor, horizon, limit):
+    """
+    Следующие limit значений после курсора в порядке (время, id).
+
+    Берутся только строки не новее horizon: транзакции, начатые раньше,
+    успевают зафиксироваться, и курсор их не обгоняет.
+    """
+    if cursor is not None:
+        moment = from_micros(cursor[0])
+        queryset = queryset.filter(
+            Q(**{f"{time_field}__gt": moment})
+            | Q(**{time_field: moment, "id__gt": cursor[1]})
+        )
+    rows = list(
+        queryset.filter(**{f"{time_field}__lte": horizon})
+        .order_by(time_field, "id")
+        .values_list(value_field, time_field, "id")[: limit + 1]
+    )
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    if rows:
+        cursor = [to_micros(rows[-1][1]), rows[-1][2]]
+    return [row[0] for row in rows], cursor, has_more
+
+
+def get_changes(
+    kind, queryset, time_field, value_field, request, user=None,
+    reusable=False,
+):
+    """
+    Изменения и удаления после токена из ?since=.
+
+    queryset — изменённые записи, time_field — их время изменения,
+    value_field — id рецепта. Без токена отдаёт все записи с начала и
+    удаления только после момента запроса. reusable — запись можно
+    добавить снова после удаления (избранное, корзина). Возвращает
+    (id изменённых, id удалённых, новый токен, есть ли ещё страницы).
+    """
+    user_id = user.id if user is not None else None
+    limit = _limit(request)
+    horizon = timezone.now() - datetime.timedelta(seconds=settings.SYNC_LAG)
+    token = request.query_params.get(TOKEN_PARAM)
+    if token:
+        changed_cursor, deleted_cursor = decode_token(token, kind, user_id)
+    else:
+        changed_cursor, deleted_cursor = None, [to_micros(horizon), 0]
+
+    changed, changed_cursor, more_changed = _page(
+        queryset, time_field, value_field, changed_cursor, horizon, limit
+    )
+    tombstones = Tombstone.objects.filter(kind=kind, user=user)
+    if reusable:
+        # Добавленные снова после удаления записи придут в changed.
+        tombstones = tombstones.exclude(
+            object_id__in=queryset.values(value_field)
+        )
+    deleted, deleted_cursor, more_deleted = _page(
+        tombstones, "deleted_at", "object_id", deleted_cursor, horizon, limit
+    )
+    if changed_cursor is None:
+        changed_cursor = [0, 0]
+    return (
+        changed,
+        deleted,
+        encode_token(kind, user_id, changed_cursor, deleted_cursor),
+        more_changed or more_deleted,
+    )
+
+
+def _limit(request):
+    try:
+        limit = int(
+            request.query_params.get("limit", settings.SYNC_PAGE_SIZE)
+        )
+    except ValueError:
+        raise ValidationError({"limit": "Ожидается целое число."})
+    return max(1, min(limit, settings.SYNC_MAX_PAGE_SIZE))
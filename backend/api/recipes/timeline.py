@@ -0,0 +1,210 @@
+import functools
+import heapq
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, Q
+from django.db.models.signals import post_delete, post_save
+from rest_framework.exceptions import ValidationError
+
+from api.recipes.sync import from_micros, to_micros
+from recipes.models import Recipe, TimelineEntry
+from users.models import Follow, User
+
+CURSOR_PARAM = "cursor"
+
+
+def _entries(user_ids, recipes, author_id):
+    return (
+        TimelineEntry(
+            user_id=user_id,
+            recipe_id=recipe_id,
+            author_id=author_id,
+            created_at=created_at,
+        )
+        for user_id in user_ids
+        for recipe_id, created_at in recipes
+    )
+
+
+def _insert(entries, using="default"):
+    TimelineEntry.objects.using(using).bulk_create(
+        entries, batch_size=settings.FEED_BATCH_SIZE, ignore_conflicts=True
+    )
+
+
+def fan_out(recipe_id, author_id, created_at, using="default"):
+    """Пишет новый рецепт в ленты подписчиков автора без feed_pull."""
+    followers = Follow.objects.using(using).filter(
+        author_id=author_id, author__feed_pull=False
+    )
+    _insert(
+        _entries(
+            followers.values_list("user_id", flat=True),
+            [(recipe_id, created_at)],
+            author_id,
+        ),
+        using,
+    )
+
+
+def backfill(user_ids, author_id, using="default"):
+    """Последние FEED_BACKFILL_SIZE рецептов автора в ленты user_ids."""
+    recipes = list(
+        Recipe.objects.using(using)
+        .filter(author_id=author_id)
+        .order_by("-created_at", "-id")
+        .values_list("id", "created_at")[: settings.FEED_BACKFILL_SIZE]
+    )
+    if recipes:
+        _insert(_entries(user_ids, recipes, author_id), using)
+
+
+def update_mode(author_id, using="default"):
+    """
+    Переключает автора между рассылкой и чтением по числу подписчиков.
+
+    Автору, вернувшемуся к рассылке, ленты подписчиков дополняются его
+    последними рецептами. Возвращает feed_pull автора.
+    """
+    row = (
+        User.objects.using(using)
+        .filter(pk=author_id)
+        .annotate(followers=Count("following"))
+        .values_list("feed_pull", "followers")
+        .first()
+    )
+    if row is None:
+        return False
+    pull, followers = row
+    new_pull = followers > settings.FEED_FANOUT_MAX_FOLLOWERS
+    if new_pull != pull:
+        User.objects.using(using).filter(pk=author_id).update(
+            feed_pull=new_pull
+        )
+        if not new_pull:
+            backfill(
+                Follow.objects.using(using)
+                .filter(author_id=author_id)
+                .values_list("user_id", flat=True),
+                author_id,
+                using,
+            )
+    return new_pull
+
+
+def _recipe_saved(
+    sender, instance, created, raw=False, using="default", **kwargs
+):
+    if created and not raw:
+        transaction.on_commit(
+            functools.partial(
+                fan_out,
+                instance.id,
+                instance.author_id,
+                instance.created_at,
+                using,
+            ),
+            using=using,
+        )
+
+
+def _follow_saved(
+    sender, instance, created, raw=False, using="default", **kwargs
+):
+    if created and not raw and not update_mode(instance.author_id, using):
+        backfill([instance.user_id], instance.author_id, using)
+
+
+def _follow_deleted(
+    sender, instance, using="default", origin=None, **kwargs
+):
+    if not isinstance(origin, Follow) and (
+        getattr(origin, "model", None) is not Follow
+    ):
+        # Подписка удалена вместе с пользователем: его записи ленты
+        # удаляются каскадом.
+        return
+    TimelineEntry.objects.using(using).filter(
+        user_id=instance.user_id, author_id=instance.author_id
+    ).delete()
+    update_mode(instance.author_id, using)
+
+
+def connect_signals():
+    post_save.connect(_recipe_saved, sender=Recipe)
+    post_save.connect(_follow_saved, sender=Follow)
+    post_delete.connect(_follow_deleted, sender=Follow)
+
+
+def decode_cursor(value):
+    if not value:
+        return None
+    try:
+        micros, recipe_id = value.split("_")
+        return from_micros(int(micros)), int(recipe_id)
+    except (ValueError, OverflowError):
+        raise ValidationError({CURSOR_PARAM: "Некорректный курсор."})
+
+
+def encode_cursor(created_at, recipe_id):
+    return f"{to_micros(created_at)}_{recipe_id}"
+
+
+def _limit(request):
+    try:
+        limit = int(
+            request.query_params.get(
+                "limit", settings.REST_FRAMEWORK["PAGE_SIZE"]
+            )
+        )
+    except ValueError:
+        raise ValidationError({"limit": "Ожидается целое число."})
+    return max(1, min(limit, settings.FEED_MAX_PAGE_SIZE))
+
+
+def _page(queryset, id_field, cursor, limit):
+    """Строки (время публикации, id рецепта) после курсора, новые сначала."""
+    if cursor is not None:
+        moment, recipe_id = cursor
+        queryset = queryset.filter(
+            Q(created_at__lt=moment)
+            | Q(created_at=moment, **{f"{id_field}__lt": recipe_id})
+        )
+    return list(
+        queryset.order_by("-created_at", f"-{id_field}")
+        .values_list("created_at", id_field)[:limit]
+    )
+
+
+def get_feed(user, request):
+    """
+    Страница ленты подписок: (id рецептов, курсор следующей страницы).
+
+    Разосланные рецепты читаются из ленты пользователя, рецепты авторов с
+    feed_pull — по индексу (author, created_at, id); обе выборки
+    сливаются по (время публикации, id).
+    """
+    limit = _limit(request)
+    cursor = decode_cursor(request.query_params.get(CURSOR_PARAM))
+    pushed = TimelineEntry.objects.filter(user=user)
+    pulled = Recipe.objects.filter(
+        author__in=Follow.objects.filter(
+            user=user, author__feed_pull=True
+        ).values("author")
+    )
+    rows = []
+    for row in heapq.merge(
+        _page(pushed, "recipe_id", cursor, limit + 1),
+        _page(pulled, "id", cursor, limit + 1),
+        reverse=True,
+    ):
+        # Рецепт, разосланный до перехода автора на чтение, приходит
+        # из обеих выборок.
+        if not rows or rows[-1] != row:
+            rows.append(row)
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor(*rows[-1])
+    return [recipe_id for _, recipe_id in rows], next_cursor
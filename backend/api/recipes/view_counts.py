@@ -0,0 +1,207 @@
+import abc
+import atexit
+import logging
+import os
+import threading
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections, transaction
+
+from recipes.models import Recipe, RecipeViewCount
+
+logger = logging.getLogger("api.view_counts")
+
+
+def is_enabled():
+    return getattr(settings, "VIEW_COUNTER_ENABLED", True)
+
+
+def upsert(deltas, using="default"):
+    """
+    Прибавляет {id рецепта: просмотры} одним INSERT ... ON CONFLICT.
+
+    Просмотры удалённых рецептов отбрасываются подзапросом к рецептам.
+    ON CONFLICT ... DO UPDATE поддерживают PostgreSQL и SQLite 3.24+.
+    """
+    if not deltas:
+        return
+    connection = connections[using]
+    quote = connection.ops.quote_name
+    table = quote(RecipeViewCount._meta.db_table)
+    recipe_column = quote(RecipeViewCount._meta.pk.column)
+    views_column = quote("views")
+    rows = ", ".join(["(%s, %s)"] * len(deltas))
+    sql = (
+        f"INSERT INTO {table} ({recipe_column}, {views_column}) "
+        f"SELECT column1, column2 FROM (VALUES {rows}) AS deltas "
+        f"WHERE column1 IN (SELECT {quote(Recipe._meta.pk.column)} "
+        f"FROM {quote(Recipe._meta.db_table)}) "
+        f"ON CONFLICT ({recipe_column}) DO UPDATE "
+        f"SET {views_column} = {table}.{views_column} + "
+        f"EXCLUDED.{views_column}"
+    )
+    params = [value for item in sorted(deltas.items()) for value in item]
+    with transaction.atomic(using=using), connection.cursor() as cursor:
+        cursor.execute(sql, params)
+
+
+class DeltaBuffer(abc.ABC):
+    """
+    Буфер приращений по рецептам одного процесса.
+
+    Приращения суммируются в памяти и раз в VIEW_COUNTER_FLUSH_INTERVAL
+    секунд (или при VIEW_COUNTER_MAX_PENDING рецептах в буфере)
+    сбрасываются фоновым потоком методом save() одним запросом, поэтому
+    популярный рецепт не блокирует строку на каждое событие. Остаток
+    сбрасывается при завершении воркера (worker_exit в gunicorn.conf.py
+    и atexit); при ошибке базы приращения возвращаются в буфер.
+
+    Приращения привязаны к базе, в которой произошли события (псевдоним
+    и имя базы): если имя сменилось (тестовая база удалена), они
+    отбрасываются, а не пишутся в другую базу. При выходе процесса сброс
+    пропускается, если таблиц models в базе нет.
+    """
+
+    models = ()
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.flush_lock = threading.Lock()
+        # {(псевдоним, имя базы): {id рецепта: приращение}}.
+        self.pending = {}
+        self.wakeup = threading.Event()
+        self.pid = None
+
+    def is_enabled(self):
+        return True
+
+    def combine(self, value, delta):
+        return value + delta
+
+    @abc.abstractmethod
+    def save(self, deltas, using):
+        """Прибавляет {id рецепта: приращение} в базе using."""
+
+    def _reset_after_fork(self):
+        """Буфер родителя отбрасывается, в воркере запускается поток."""
+        if self.pid != os.getpid():
+            self.pid = os.getpid()
+            self.pending = {}
+            self.wakeup = threading.Event()
+            threading.Thread(
+                target=self._flush_periodically, daemon=True
+            ).start()
+
+    def _flush_periodically(self):
+        pid = os.getpid()
+        while self.pid == pid:
+            self.wakeup.wait(settings.VIEW_COUNTER_FLUSH_INTERVAL)
+            self.wakeup.clear()
+            try:
+                self.flush()
+            finally:
+                # Поток не держит соединение с базой между сбросами.
+                connections.close_all()
+
+    @staticmethod
+    def _target(using):
+        return using, connections[using].settings_dict["NAME"]
+
+    def _add(self, pending, recipe_id, delta):
+        if recipe_id in pending:
+            delta = self.combine(pending[recipe_id], delta)
+        pending[recipe_id] = delta
+
+    def add(self, recipe_id, delta=1, using=DEFAULT_DB_ALIAS):
+        if not self.is_enabled():
+            return
+        target = self._target(using)
+        with self.lock:
+            self._reset_after_fork()
+            self._add(self.pending.setdefault(target, {}), recipe_id, delta)
+            size = sum(len(deltas) for deltas in self.pending.values())
+            if size >= settings.VIEW_COUNTER_MAX_PENDING:
+                self.wakeup.set()
+
+    def pending_for(self, recipe_ids, using=DEFAULT_DB_ALIAS):
+        target = self._target(using)
+        with self.lock:
+            pending = self.pending.get(target, {})
+            return {
+                recipe_id: pending[recipe_id]
+                for recipe_id in recipe_ids
+                if recipe_id in pending
+            }
+
+    def _tables_exist(self, using):
+        tables = connections[using].introspection.table_names()
+        return all(model._meta.db_table in tables for model in self.models)
+
+    def flush(self, on_exit=False):
+        """Сбрасывает буфер в базу; возвращает число рецептов."""
+        saved = 0
+        with self.flush_lock:
+            with self.lock:
+                pending, self.pending = self.pending, {}
+            for target, deltas in pending.items():
+                using = target[0]
+                if self._target(using) != target:
+                    logger.warning(
+                        "База %s сменилась, буфер %s отброшен",
+                        using,
+                        type(self).__name__,
+                    )
+                    continue
+                try:
+                    if on_exit and not self._tables_exist(using):
+                        continue
+                    self.save(deltas, using)
+                except Exception:
+                    logger.exception(
+                        "Не удалось сохранить буфер %s", type(self).__name__
+                    )
+                    if on_exit:
+                        continue
+                    with self.lock:
+                        restored = self.pending.setdefault(target, {})
+                        for recipe_id, delta in deltas.items():
+                            self._add(restored, recipe_id, delta)
+                    continue
+                saved += len(deltas)
+        return saved
+
+    def flush_on_exit(self):
+        if self.pid == os.getpid():
+            self.flush(on_exit=True)
+
+
+class ViewCounter(DeltaBuffer):
+    """Просмотры рецептов; сохраняются в RecipeViewCount через upsert()."""
+
+    models = (Recipe, RecipeViewCount)
+
+    def is_enabled(self):
+        return is_enabled()
+
+    def save(self, deltas, using):
+        upsert(deltas, using=using)
+
+    def get(self, recipe_ids):
+        """
+        {id рецепта: просмотры}: сохранённые в базе и ещё не сброшенные
+        этим процессом. Буферы других воркеров видны после их сброса.
+        """
+        recipe_ids = list(recipe_ids)
+        views = dict.fromkeys(recipe_ids, 0)
+        views.update(
+            RecipeViewCount.objects.filter(
+                recipe_id__in=recipe_ids
+            ).values_list("recipe_id", "views")
+        )
+        for recipe_id, count in self.pending_for(recipe_ids).items():
+            views[recipe_id] += count
+        return views
+
+
+counter = ViewCounter()
+atexit.register(counter.flush_on_exit)
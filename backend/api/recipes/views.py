@@ -1,12 +1,43 @@
-from django.db.models import BooleanField, Exists, OuterRef, Sum, Value
-from django.http import HttpResponse
+from asgiref.sync import sync_to_async
+from django.db import transaction
+from django.db.models import (
+    BooleanField,
+    Count,
+    Exists,
+    F,
+    Max,
+    OuterRef,
+    Prefetch,
+    Sum,
+    Value,
+)
+from django.http import Http404, HttpResponse, StreamingHttpResponse
 from django.shortcuts import get_object_or_404
 from django_filters.rest_framework import DjangoFilterBackend
 from rest_framework import viewsets
 from rest_framework.decorators import action
+from rest_framework.exceptions import ValidationError
 from rest_framework.permissions import AllowAny, IsAuthenticated
 from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
 
+from api import async_views
+from api.async_views import AsyncActionsMixin
+from api.conditional import (
+    ConditionalGetMixin,
+    make_etag,
+    table_state,
+    viewer_state,
+)
+from api.fast_serializers import FastListMixin
+from api.recipes import (
+    documents,
+    ranking,
+    short_links,
+    sync,
+    timeline,
+    view_counts,
+)
 from api.recipes.filters import IngredientFilter, RecipeFilter
 from api.recipes.permissions import IsAdminAuthorOrReadOnly
 from api.recipes.serializers import (
@@ -17,7 +48,13 @@ from api.recipes.serializers import (
     ShoppingCartSerializer,
     TagSerializer,
 )
-from api.utils import create_model_instance, delete_model_instance
+from api.replicas import ReplicaReadMixin
+from api.sparse_fields import SparseFieldsMixin, model_columns
+from api.utils import (
+    create_model_instance,
+    delete_model_instance,
+    subscribed_to,
+)
 from recipes.models import (
     Favorite,
     Ingredient,
@@ -26,72 +63,475 @@ from recipes.models import (
     ShoppingCart,
     Tag,
 )
+from users.models import Follow, User
 
 
-class TagViewSet(viewsets.ReadOnlyModelViewSet):
+class TagViewSet(ReplicaReadMixin, viewsets.ReadOnlyModelViewSet):
     """Вьюсет для тегов. Только чтение."""
 
-    queryset = Tag.objects.all()
+    queryset = Tag.objects.cached()
     serializer_class = TagSerializer
     permission_classes = [AllowAny]
     pagination_class = None
 
 
-class IngredientViewSet(viewsets.ReadOnlyModelViewSet):
+class IngredientViewSet(
+    ReplicaReadMixin, AsyncActionsMixin, viewsets.ReadOnlyModelViewSet
+):
     """Вьюсет для ингредиентов. Только чтение."""
 
-    queryset = Ingredient.objects.all()
+    queryset = Ingredient.objects.cached()
     serializer_class = IngredientSerializer
     permission_classes = [AllowAny]
     filter_backends = [DjangoFilterBackend]
     filterset_class = IngredientFilter
     pagination_class = None
+    async_actions = ("list",)
 
+    async def alist(self, request, *args, **kwargs):
+        """Поиск по началу названия асинхронным ORM."""
+        queryset = self.filter_queryset(self.get_queryset())
+        ingredients = [ingredient async for ingredient in queryset]
+        return Response(self.get_serializer(ingredients, many=True).data)
 
-class RecipeViewSet(viewsets.ModelViewSet):
+
+class RecipeViewSet(
+    ConditionalGetMixin,
+    ReplicaReadMixin,
+    AsyncActionsMixin,
+    FastListMixin,
+    SparseFieldsMixin,
+    viewsets.ModelViewSet,
+):
     """CRUD рецептов + избранное + список покупок"""
 
     permission_classes = [IsAdminAuthorOrReadOnly]
     filter_backends = [DjangoFilterBackend]
     filterset_class = RecipeFilter
     http_method_names = ["get", "post", "patch", "delete"]
+    # Допустимое число SQL-запросов на действие (QueryBudgetMiddleware,
+    # api.tests.QueryBudgetTests): наибольшее измеренное число при любых
+    # FAST_SERIALIZERS, ASYNC_VIEWS_ENABLED и RECIPE_READ_MODEL (запись
+    # пересобирает документ рецепта) плюс 2 запроса запаса — промах кеша
+    # токенов и однократная загрузка карты коротких ссылок в воркере.
+    query_budgets = {
+        "list": 13,
+        "retrieve": 8,
+        "create": 25,
+        "partial_update": 30,
+        "destroy": 15,
+        "favorite": 7,
+        "shopping_cart": 7,
+        "download_shopping_cart": 3,
+        "get_link": 2,
+        "batch": 7,
+        "changes": 9,
+        "favorite_changes": 4,
+        "shopping_cart_changes": 4,
+        "feed": 11,
+    }
+    # Действия, отдающие полное представление рецептов.
+    read_actions = ("list", "retrieve", "batch", "changes", "feed")
+    sparse_actions = read_actions
+    # Наибольшее число рецептов в одном запросе batch.
+    batch_max_size = 100
+    async_actions = ("list", "retrieve", "download_shopping_cart")
 
     def get_queryset(self):
-        """Возвращает queryset с предзагрузкой и аннотациями."""
+        """
+        Возвращает queryset с предзагрузкой и аннотациями.
+
+        При ?fields= / ?omit= загружаются только нужные колонки, связи и
+        аннотации.
+        """
         user = (
             self.request.user if self.request.user.is_authenticated else None
         )
 
-        queryset = Recipe.objects.select_related("author").prefetch_related(
-            "tags",
-            "recipe_ingredients__ingredient"
-        )
+        fields = self.get_requested_fields()
+        if self._uses_read_model():
+            # Остальное берётся из RecipeDocument, лишние поля
+            # отбрасываются при выводе.
+            queryset = Recipe.objects.only("id", "author_id", "updated_at")
+            fields = None
+        else:
+            queryset = Recipe.objects.all()
+            if fields is not None:
+                queryset = queryset.only(*model_columns(Recipe, fields))
+            if (fields is None or "author" in fields) and not (
+                self._renders_rows()
+            ):
+                queryset = self._with_author(queryset, user)
+            if fields is None or "tags" in fields:
+                queryset = queryset.prefetch_related("tags")
+            if fields is None or "ingredients" in fields:
+                queryset = queryset.prefetch_related(
+                    "recipe_ingredients__ingredient"
+                )
+        flags = [
+            name
+            for name in ("is_favorited", "is_in_shopping_cart")
+            if fields is None or name in fields
+        ]
 
         if user:
+            models = {
+                "is_favorited": Favorite,
+                "is_in_shopping_cart": ShoppingCart,
+            }
+            queryset = queryset.annotate(**{
+                name: Exists(
+                    models[name].objects.filter(
+                        user=user, recipe=OuterRef("pk")
+                    )
+                )
+                for name in flags
+            })
+        else:
+            queryset = queryset.annotate(**{
+                name: Value(False, output_field=BooleanField())
+                for name in flags
+            })
+        if (fields is None or "author" in fields) and self._renders_rows():
+            # Документы и собранный сериализатор читают флаг подписки из
+            # строки рецепта.
+            queryset = queryset.annotate(**{
+                documents.AUTHOR_SUBSCRIBED: subscribed_to(
+                    self.request, "author"
+                )
+            })
+        return queryset
+
+    def _with_author(self, queryset, user):
+        """Автор рецепта; при выводе пользователю — с флагом подписки."""
+        if user is None or self.action not in self.read_actions:
+            return queryset.select_related("author")
+        return queryset.prefetch_related(
+            Prefetch(
+                "author",
+                queryset=User.objects.annotate(
+                    is_subscribed=subscribed_to(self.request)
+                ),
+            )
+        )
+
+    def _renders_rows(self):
+        """Представления строятся из документов или строк values()."""
+        if self._uses_read_model():
+            return True
+        if (
+            self.action not in self.read_actions
+            or self.get_compiled_serializer() is None
+        ):
+            return False
+        # Карточку собранным сериализатором строит только aretrieve.
+        return self.action != "retrieve" or async_views.is_enabled()
+
+    def get_validators(self):
+        """
+        ETag карточки — время изменения рецепта и автора и флаги
+        пользователя; ETag списка — число и наибольшее время изменения
+        рецептов выборки, рейтинг при сортировке по популярности,
+        отпечатки тегов, ингредиентов и связей с ними рецептов выборки и
+        отпечаток избранного, корзины и подписок.
+        """
+        viewer = self.get_viewer()
+        if self.action == "retrieve":
+            return self._detail_validators(viewer)
+        ranking_state = {}
+        ordering = self.request.query_params.get("ordering")
+        field = ranking.ORDERINGS.get(ordering)
+        if field is not None:
+            # Порядок меняется с рейтингом, а не со временем изменения.
+            ranking_state = {
+                "ranking": Sum(F(field) * F("id")),
+                "ranked_at": Max("ranked_at"),
+            }
+        recipes = self.filter_queryset(Recipe.objects.all())
+        ids = recipes.values("id")
+        state = recipes.aggregate(
+            count=Count("id"),
+            updated_at=Max("updated_at"),
+            author_updated_at=Max("author__updated_at"),
+            **ranking_state,
+            **table_state("tags", Tag.objects.all(), "updated_at"),
+            **table_state(
+                "ingredients", Ingredient.objects.all(), "updated_at"
+            ),
+            **table_state(
+                "recipe_tags",
+                Recipe.tags.through.objects.filter(recipe__in=ids),
+                "id",
+            ),
+            **table_state(
+                "recipe_ingredients",
+                IngredientInRecipe.objects.filter(recipe__in=ids),
+                "id",
+            ),
+            **viewer_state(viewer, Favorite, ShoppingCart, Follow),
+        )
+        etag = make_etag(
+            self.request.build_absolute_uri(),
+            viewer and viewer.id,
+            *state.values(),
+        )
+        # Удаление не меняет наибольшее время, поэтому только ETag.
+        return etag, None
+
+    def _detail_validators(self, viewer):
+        lookup = self.kwargs[self.lookup_url_kwarg or self.lookup_field]
+        columns = ["updated_at", "author__updated_at"]
+        try:
+            queryset = Recipe.objects.filter(pk=lookup)
+        except ValueError:
+            return None
+        if viewer is not None:
             queryset = queryset.annotate(
                 is_favorited=Exists(
-                    Favorite.objects.filter(user=user, recipe=OuterRef("pk"))
+                    Favorite.objects.filter(user=viewer, recipe=OuterRef("pk"))
                 ),
                 is_in_shopping_cart=Exists(
                     ShoppingCart.objects.filter(
-                        user=user,
-                        recipe=OuterRef("pk")
+                        user=viewer, recipe=OuterRef("pk")
                     )
-                )
+                ),
+                is_subscribed=Exists(
+                    Follow.objects.filter(
+                        user=viewer, author=OuterRef("author")
+                    )
+                ),
             )
-        else:
-            queryset = queryset.annotate(
-                is_favorited=Value(False, output_field=BooleanField()),
-                is_in_shopping_cart=Value(False, output_field=BooleanField())
+            columns += ["is_favorited", "is_in_shopping_cart", "is_subscribed"]
+        row = queryset.values_list(*columns).first()
+        if row is None:
+            return None
+        etag = make_etag(
+            self.request.build_absolute_uri(), viewer and viewer.id, *row
+        )
+        # Флаги пользователя не имеют времени изменения.
+        last_modified = max(row[:2]) if viewer is None else None
+        return etag, last_modified
+
+    def _uses_read_model(self):
+        return documents.is_enabled() and self.action in self.read_actions
+
+    def list(self, request, *args, **kwargs):
+        if not self._uses_read_model():
+            return super().list(request, *args, **kwargs)
+        page = self.paginate_queryset(
+            self.filter_queryset(self.get_queryset())
+        )
+        return self.get_paginated_response([
+            self.prune(data)
+            for data in documents.render_documents(page, request)
+        ])
+
+    def retrieve(self, request, *args, **kwargs):
+        if not self._uses_read_model():
+            return super().retrieve(request, *args, **kwargs)
+        recipe = self.get_object()
+        return Response(
+            self.prune(documents.render_documents([recipe], request)[0])
+        )
+
+    async def alist(self, request, *args, **kwargs):
+        if self._uses_read_model():
+            return await sync_to_async(self.list)(request, *args, **kwargs)
+        return await super().alist(request, *args, **kwargs)
+
+    async def aretrieve(self, request, *args, **kwargs):
+        """
+        Карточка рецепта собранным сериализатором и асинхронным ORM —
+        те же запросы, что и у list на одну строку.
+        """
+        compiled = self.get_compiled_serializer()
+        if compiled is None or self._uses_read_model():
+            return await sync_to_async(self.retrieve)(
+                request, *args, **kwargs
             )
-        return queryset
+        lookup = self.kwargs[self.lookup_url_kwarg or self.lookup_field]
+        queryset = await sync_to_async(self.filter_queryset)(
+            self.get_queryset()
+        )
+        try:
+            row = await compiled.values(queryset).filter(pk=lookup).aget()
+        except (ValueError, TypeError):
+            raise Http404
+        except Recipe.DoesNotExist:
+            # Текст как у get_object_or_404 синхронного retrieve.
+            raise Http404("No Recipe matches the given query.")
+        data = await compiled.arender([row], request)
+        return Response(data[0])
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        response = super().finalize_response(
+            request, response, *args, **kwargs
+        )
+        if self.action == "retrieve" and response.status_code in (200, 304):
+            # Ответ 304 на повторный запрос тоже считается просмотром.
+            lookup = self.kwargs[self.lookup_url_kwarg or self.lookup_field]
+            view_counts.counter.add(int(lookup))
+        return response
+
+    def perform_create(self, serializer):
+        self._save_with_document(serializer)
+
+    def perform_update(self, serializer):
+        self._save_with_document(serializer)
+
+    def _save_with_document(self, serializer):
+        """Сохраняет рецепт и его документ в одной транзакции."""
+        if not documents.is_enabled():
+            serializer.save()
+            return
+        with transaction.atomic():
+            serializer.save()
+            documents.build_documents([serializer.instance.id])
 
     def get_serializer_class(self):
         """Выбираем сериализатор в зависимости от action"""
-        if self.action in ["list", "retrieve"]:
+        if self.action in self.read_actions:
             return RecipeGetSerializer
         return RecipeCreateSerializer
 
+    def _get_batch_ids(self, request):
+        """Id из ?ids=1,2,3 или {"ids": [1, 2, 3]} без повторов."""
+        if request.method == "POST":
+            raw = request.data.get("ids", [])
+        else:
+            raw = request.query_params.get("ids", "")
+        if isinstance(raw, str):
+            raw = [value for value in raw.split(",") if value.strip()]
+        if not isinstance(raw, list):
+            raise ValidationError({"ids": "Ожидается список id."})
+        try:
+            ids = list(dict.fromkeys(int(value) for value in raw))
+        except (TypeError, ValueError):
+            raise ValidationError({"ids": "Id должны быть целыми числами."})
+        if not ids:
+            raise ValidationError({"ids": "Укажите хотя бы один id."})
+        if len(ids) > self.batch_max_size:
+            raise ValidationError(
+                {"ids": f"Не больше {self.batch_max_size} id за запрос."}
+            )
+        return ids
+
+    @action(
+        detail=False,
+        methods=["get", "post"],
+        permission_classes=[AllowAny],
+    )
+    def batch(self, request):
+        """
+        Несколько рецептов одним запросом в порядке ids.
+
+        Несуществующие id пропускаются.
+        """
+        return Response(
+            self._render_recipes(self._get_batch_ids(request))
+        )
+
+    def _render_recipes(self, ids):
+        """Представления рецептов с указанными id в порядке ids."""
+        if not ids:
+            return []
+        position = {recipe_id: index for index, recipe_id in enumerate(ids)}
+        queryset = self.get_queryset().filter(id__in=ids)
+        compiled = self.get_compiled_serializer()
+        if self._uses_read_model():
+            recipes = sorted(queryset, key=lambda item: position[item.id])
+            return [
+                self.prune(item)
+                for item in documents.render_documents(recipes, self.request)
+            ]
+        if compiled is not None:
+            rows = sorted(
+                compiled.values(queryset),
+                key=lambda row: position[row["id"]],
+            )
+            return compiled.render(rows, self.request)
+        recipes = sorted(queryset, key=lambda item: position[item.id])
+        return self.get_serializer(recipes, many=True).data
+
+    @action(detail=False, methods=["get"], permission_classes=[AllowAny])
+    def changes(self, request):
+        """
+        Рецепты, изменённые и удалённые после токена ?since=.
+
+        Ответ: changed — представления рецептов, deleted — id удалённых,
+        token — токен следующего запроса, has_more — есть ли ещё страницы.
+        """
+        changed, deleted, token, has_more = sync.get_changes(
+            sync.MODEL_KINDS[Recipe],
+            Recipe.objects.all(),
+            "updated_at",
+            "id",
+            request,
+        )
+        return Response({
+            "changed": self._render_recipes(changed),
+            "deleted": deleted,
+            "token": token,
+            "has_more": has_more,
+        })
+
+    @action(
+        detail=False, methods=["get"], permission_classes=[IsAuthenticated]
+    )
+    def feed(self, request):
+        """
+        Рецепты авторов из подписок, новые сначала.
+
+        Постраничный вывод по курсору: next содержит ссылку на следующую
+        страницу с ?cursor=.
+        """
+        ids, cursor = timeline.get_feed(request.user, request)
+        next_url = None
+        if cursor is not None:
+            next_url = replace_query_param(
+                request.build_absolute_uri(), timeline.CURSOR_PARAM, cursor
+            )
+        return Response(
+            {"next": next_url, "results": self._render_recipes(ids)}
+        )
+
+    def _relation_changes(self, request, model):
+        changed, deleted, token, has_more = sync.get_changes(
+            sync.MODEL_KINDS[model],
+            model.objects.filter(user=request.user),
+            "created_at",
+            "recipe_id",
+            request,
+            user=request.user,
+            reusable=True,
+        )
+        return Response({
+            "changed": changed,
+            "deleted": deleted,
+            "token": token,
+            "has_more": has_more,
+        })
+
+    @action(
+        detail=False,
+        methods=["get"],
+        permission_classes=[IsAuthenticated],
+        url_path="favorite/changes",
+    )
+    def favorite_changes(self, request):
+        """Id рецептов, добавленных в избранное и убранных из него."""
+        return self._relation_changes(request, Favorite)
+
+    @action(
+        detail=False,
+        methods=["get"],
+        permission_classes=[IsAuthenticated],
+        url_path="shopping_cart/changes",
+    )
+    def shopping_cart_changes(self, request):
+        """Id рецептов, добавленных в список покупок и убранных из него."""
+        return self._relation_changes(request, ShoppingCart)
+
     @action(
         detail=True,
         methods=["post", "delete"],
@@ -126,25 +566,41 @@ class RecipeViewSet(viewsets.ModelViewSet):
                 request, ShoppingCart, recipe, error_message
             )
 
-    def _generate_shopping_cart_file(self, user):
-        """Генерация текста списка покупок для пользователя."""
-        ingredients = (
+    def _shopping_cart_ingredients(self, user):
+        """Суммы ингредиентов из списка покупок пользователя."""
+        return (
             IngredientInRecipe.objects.filter(
                 recipe__in_shoppingcarts__user=user
             )
             .values("ingredient__name", "ingredient__measurement_unit")
             .annotate(total_amount=Sum("amount"))
         )
+
+    def _shopping_cart_line(self, ingredient):
+        ingredient_name = ingredient["ingredient__name"]
+        total_amount = ingredient["total_amount"]
+        measurement_unit = ingredient["ingredient__measurement_unit"]
+        return f"{ingredient_name} - {total_amount}, {measurement_unit}"
+
+    def _generate_shopping_cart_file(self, user):
+        """Генерация текста списка покупок для пользователя."""
         lines = ["Список покупок:\n"]
-        for ingredient in ingredients:
-            ingredient_name = ingredient["ingredient__name"]
-            total_amount = ingredient["total_amount"]
-            measurement_unit = ingredient["ingredient__measurement_unit"]
-            lines.append(
-                f"{ingredient_name} - {total_amount}, {measurement_unit}"
-            )
+        for ingredient in self._shopping_cart_ingredients(user):
+            lines.append(self._shopping_cart_line(ingredient))
         return "\n".join(lines)
 
+    def _shopping_cart_response(self, content):
+        response_class = (
+            HttpResponse
+            if isinstance(content, str)
+            else StreamingHttpResponse
+        )
+        response = response_class(content, content_type="text/plain")
+        response["Content-Disposition"] = (
+            'attachment; filename="shopping_cart.txt"'
+        )
+        return response
+
     @action(
         detail=False,
         methods=["get"],
@@ -152,12 +608,23 @@ class RecipeViewSet(viewsets.ModelViewSet):
     )
     def download_shopping_cart(self, request):
         """Скачивание файла со списком покупок пользователя."""
-        file_content = self._generate_shopping_cart_file(request.user)
-        response = HttpResponse(file_content, content_type="text/plain")
-        response["Content-Disposition"] = (
-            'attachment; filename="shopping_cart.txt"'
+        return self._shopping_cart_response(
+            self._generate_shopping_cart_file(request.user)
         )
-        return response
+
+    async def adownload_shopping_cart(self, request):
+        """
+        Список покупок потоком: строки отправляются клиенту по мере
+        чтения асинхронным ORM.
+        """
+        ingredients = self._shopping_cart_ingredients(request.user)
+
+        async def lines():
+            yield "Список покупок:\n"
+            async for ingredient in ingredients.aiterator():
+                yield "\n" + self._shopping_cart_line(ingredient)
+
+        return self._shopping_cart_response(lines())
 
     @action(
         detail=True,
@@ -167,6 +634,13 @@ class RecipeViewSet(viewsets.ModelViewSet):
     )
     def get_link(self, request, pk=None):
         """Возвращает короткую ссылку на рецепт."""
-        recipe = self.get_object()
-        short_url = request.build_absolute_uri(f"/s/{recipe.id}/")
+        try:
+            recipe_id = int(pk)
+        except ValueError:
+            raise Http404
+        if not short_links.recipe_exists(recipe_id):
+            raise Http404
+        short_url = request.build_absolute_uri(
+            f"/s/{short_links.encode(recipe_id)}/"
+        )
         return Response({"short-link": short_url})
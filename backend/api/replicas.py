@@ -0,0 +1,76 @@
+from django.db import DatabaseError
+from rest_framework.permissions import SAFE_METHODS
+
+from foodgram import db_router
+
+
+class ReplicaReadMixin:
+    """
+    Безопасные запросы вьюсета читают из реплики.
+
+    Аутентификация идёт по основной базе, остальная обработка — по
+    исправной реплике (db_router.replicas). После небезопасного запроса
+    пользователь REPLICA_STICKY_SECONDS читает основную базу, чтобы
+    видеть свои изменения. Если реплика отказала посреди запроса, он
+    повторяется на основной базе.
+    """
+
+    def dispatch(self, request, *args, **kwargs):
+        self._replica_alias = self._replica_token = None
+        self._skip_replica = self._replica_async = False
+        try:
+            return super().dispatch(request, *args, **kwargs)
+        except DatabaseError:
+            if not self._retry_on_default():
+                raise
+            return super().dispatch(request, *args, **kwargs)
+
+    async def adispatch(self, request, *args, **kwargs):
+        """dispatch() для AsyncActionsMixin."""
+        self._replica_alias = self._replica_token = None
+        self._skip_replica = False
+        # initial() выполняется в sync_to_async, освобождение — в цикле
+        # событий, где токен read_from недействителен.
+        self._replica_async = True
+        try:
+            return await super().adispatch(request, *args, **kwargs)
+        except DatabaseError:
+            if not self._retry_on_default():
+                raise
+            return await super().adispatch(request, *args, **kwargs)
+
+    def _retry_on_default(self):
+        alias = self._release_replica()
+        if alias is None:
+            return False
+        db_router.replicas.mark_down(alias)
+        self._skip_replica = True
+        return True
+
+    def initial(self, request, *args, **kwargs):
+        super().initial(request, *args, **kwargs)
+        if (
+            self._skip_replica
+            or request.method not in SAFE_METHODS
+            or db_router.is_pinned(request.user)
+        ):
+            return
+        alias = db_router.replicas.choose()
+        if alias is not None:
+            self._replica_alias = alias
+            self._replica_token = db_router.read_from(alias)
+
+    def _release_replica(self):
+        alias, token = self._replica_alias, self._replica_token
+        self._replica_alias = self._replica_token = None
+        if token is not None and self._replica_async:
+            db_router.clear()
+        elif token is not None:
+            db_router.reset(token)
+        return alias
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        self._release_replica()
+        if request.method not in SAFE_METHODS:
+            db_router.pin(request.user)
+        return super().finalize_response(request, response, *args, **kwargs)
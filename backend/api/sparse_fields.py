@@ -0,0 +1,96 @@
+from rest_framework.exceptions import ValidationError
+
+FIELDS_PARAM = "fields"
+OMIT_PARAM = "omit"
+
+
+def _split(value):
+    return [name.strip() for name in value.split(",") if name.strip()]
+
+
+def model_columns(model, fields):
+    """Поля модели среди запрошенных — для queryset.only()."""
+    columns = []
+    for field in model._meta.concrete_fields:
+        if field.name in fields:
+            columns.append(field.name)
+    return columns
+
+
+class SparseFieldsSerializerMixin:
+    """
+    Сериализатор с выбором полей: Serializer(..., fields=("id", "name")).
+
+    Поля, не вошедшие в fields, не строятся и не выводятся.
+    """
+
+    def __init__(self, *args, fields=None, **kwargs):
+        self.sparse_fields = fields
+        super().__init__(*args, **kwargs)
+
+    def get_fields(self):
+        fields = super().get_fields()
+        if self.sparse_fields is None:
+            return fields
+        return {
+            name: field
+            for name, field in fields.items()
+            if name in self.sparse_fields
+        }
+
+
+class SparseFieldsMixin:
+    """
+    ?fields=id,name и ?omit=text для действий sparse_actions.
+
+    Сериализатор действия должен принимать fields
+    (SparseFieldsSerializerMixin); get_queryset вьюсета может по
+    get_requested_fields() не загружать лишнее.
+    """
+
+    sparse_actions = ("list", "retrieve")
+
+    def get_requested_fields(self):
+        """Запрошенные поля в порядке сериализатора или None — все."""
+        if not hasattr(self, "_requested_fields"):
+            self._requested_fields = self._parse_requested_fields()
+        return self._requested_fields
+
+    def _parse_requested_fields(self):
+        if self.action not in self.sparse_actions:
+            return None
+        params = self.request.query_params
+        only = _split(params.get(FIELDS_PARAM, ""))
+        omit = _split(params.get(OMIT_PARAM, ""))
+        if not only and not omit:
+            return None
+        available = self.get_serializer_class().Meta.fields
+        errors = {}
+        for param, names in ((FIELDS_PARAM, only), (OMIT_PARAM, omit)):
+            unknown = [name for name in names if name not in available]
+            if unknown:
+                errors[param] = f"Неизвестные поля: {', '.join(unknown)}."
+        if errors:
+            raise ValidationError(errors)
+        return tuple(
+            name
+            for name in available
+            if (not only or name in only) and name not in omit
+        )
+
+    def is_field_requested(self, name):
+        fields = self.get_requested_fields()
+        return fields is None or name in fields
+
+    def get_serializer(self, *args, **kwargs):
+        fields = self.get_requested_fields()
+        if fields is not None:
+            kwargs.setdefault("fields", fields)
+        return super().get_serializer(*args, **kwargs)
+
+    def prune(self, data):
+        """Оставляет в готовом представлении только запрошенные поля."""
+        fields = self.get_requested_fields()
+        if fields is None:
+            return data
+        return {name: data[name] for name in fields}
@@ -0,0 +1,1007 @@
+import base64
+import io
+import json
+import os
+import subprocess
+import sys
+import tempfile
+from datetime import timedelta
+from pathlib import Path
+
+from django.apps import apps
+from django.db import DEFAULT_DB_ALIAS, connection, connections
+from django.db.models import Value
+from django.db.models.signals import (
+    m2m_changed,
+    post_delete,
+    post_save,
+    pre_delete,
+)
+from django.http import StreamingHttpResponse
+from django.test import (
+    RequestFactory,
+    SimpleTestCase,
+    TestCase,
+    TransactionTestCase,
+    override_settings,
+)
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from PIL import Image
+from rest_framework.authtoken.models import Token
+from rest_framework.routers import SimpleRouter
+from rest_framework.test import APIClient
+
+from api import metrics
+from api.authentication import CachedTokenAuthentication
+from api.instrumentation import get_query_budget
+from api.management.commands.load_replay import percentile
+from api.middleware import MetricsMiddleware
+from api.recipes import documents, short_links, timeline
+from api.recipes.sync import make_token
+from api.recipes.view_counts import DeltaBuffer
+from api.recipes.views import RecipeViewSet
+from api.users.views import UserViewSet
+from foodgram import query_cache
+from foodgram.cache import SharedMemoryCache
+from recipes.models import (
+    Favorite,
+    Ingredient,
+    IngredientInRecipe,
+    Recipe,
+    RecipeDocument,
+    ShoppingCart,
+    Tag,
+    Tombstone,
+)
+from users.models import Follow, User
+
+
+@override_settings(SYNC_LAG=0)
+class RelationTombstoneTests(TestCase):
+    """Надгробия избранного и корзины при удалении рецепта каскадом."""
+
+    def setUp(self):
+        self.author = User.objects.create_user(
+            username="author", email="author@example.com", password="x"
+        )
+        self.reader = User.objects.create_user(
+            username="reader", email="reader@example.com", password="x"
+        )
+        self.recipes = [
+            Recipe.objects.create(
+                author=self.author, name=f"Рецепт {i}", text="-",
+                cooking_time=1,
+            )
+            for i in range(3)
+        ]
+        self.client = APIClient()
+        self.client.force_authenticate(self.reader)
+
+    def changes(self, path, since=None):
+        params = {"since": since} if since else {}
+        response = self.client.get(f"/api/recipes/{path}/changes/", params)
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def test_recipe_deleted_by_author(self):
+        _, deleted, removed = (recipe.id for recipe in self.recipes)
+        for recipe in self.recipes:
+            Favorite.objects.create(user=self.reader, recipe=recipe)
+        ShoppingCart.objects.create(user=self.reader, recipe_id=deleted)
+        favorites = self.changes("favorite")["token"]
+        cart = self.changes("shopping_cart")["token"]
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.delete(f"/api/recipes/{removed}/favorite/")
+            Recipe.objects.get(pk=deleted).delete()
+
+        self.assertCountEqual(
+            self.changes("favorite", favorites)["deleted"], [removed, deleted]
+        )
+        self.assertEqual(
+            self.changes("shopping_cart", cart)["deleted"], [deleted]
+        )
+
+    def test_author_deleted_with_own_favorites(self):
+        recipe = self.recipes[0]
+        author_id = self.author.id
+        Favorite.objects.create(user=self.author, recipe=recipe)
+        Favorite.objects.create(user=self.reader, recipe=recipe)
+        token = self.changes("favorite")["token"]
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.author.delete()
+
+        self.assertEqual(
+            self.changes("favorite", token)["deleted"], [recipe.id]
+        )
+        self.assertFalse(Tombstone.objects.filter(user_id=author_id).exists())
+
+
+class ShortLinkTests(TestCase):
+    """Некорректные коды дают 404, редирект кешируется браузером и CDN."""
+
+    def test_invalid_codes(self):
+        for code in ("²", "٣", "0", "9" * 19, "9" * 5000, "z" * 15):
+            with self.subTest(code=code[:20]):
+                response = self.client.get(f"/s/{code}/")
+                self.assertEqual(response.status_code, 404)
+
+    @override_settings(SHORT_LINK_MAX_AGE=3600)
+    def test_redirect_is_cacheable(self):
+        author = User.objects.create_user(
+            username="author", email="author@example.com", password="x"
+        )
+        recipe = Recipe.objects.create(
+            author=author, name="Рецепт", text="-", cooking_time=1
+        )
+        response = self.client.get(f"/s/{short_links.encode(recipe.id)}/")
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(response["Cache-Control"], "public, max-age=3600")
+
+
+class TokenCacheTests(TestCase):
+    """Аутентификация по снимку пользователя в кеше."""
+
+    def test_deactivated_by_update(self):
+        user = User.objects.create_user(
+            username="reader", email="reader@example.com", password="x"
+        )
+        token = Token.objects.create(user=user)
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION=f"Token {token.key}")
+        self.assertEqual(client.get("/api/users/me/").status_code, 200)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            User.objects.filter(pk=user.pk).update(is_active=False)
+
+        self.assertEqual(client.get("/api/users/me/").status_code, 401)
+
+    def test_flags_from_cached_snapshot(self):
+        cases = {
+            "staff": {"is_staff": True},
+            "superuser": {"is_superuser": True},
+        }
+        for name, flags in cases.items():
+            user = User.objects.create_user(
+                username=name, email=f"{name}@example.com", password="x",
+                **flags,
+            )
+            token = Token.objects.create(user=user)
+            authentication = CachedTokenAuthentication()
+            # Второй вызов берёт пользователя из снимка в кеше.
+            for _ in range(2):
+                cached, _ = authentication.authenticate_credentials(token.key)
+                with self.subTest(user=name):
+                    self.assertEqual(cached.is_staff, user.is_staff)
+                    self.assertEqual(cached.is_superuser, user.is_superuser)
+                    self.assertTrue(cached.is_active)
+
+
+class RecordingBuffer(DeltaBuffer):
+    def __init__(self):
+        super().__init__()
+        self.saved = []
+
+    def save(self, deltas, using):
+        self.saved.append((using, deltas))
+
+
+class DeltaBufferTests(TestCase):
+    """Буфер приращений пишет только в базу, где они накоплены."""
+
+    def test_flush_to_same_database(self):
+        buffer = RecordingBuffer()
+        buffer.add(1)
+        buffer.add(1, 2)
+        self.assertEqual(buffer.flush(), 1)
+        self.assertEqual(buffer.saved, [(DEFAULT_DB_ALIAS, {1: 3})])
+
+    def test_database_replaced(self):
+        buffer = RecordingBuffer()
+        buffer.add(1)
+        settings_dict = connections[DEFAULT_DB_ALIAS].settings_dict
+        name = settings_dict["NAME"]
+        settings_dict["NAME"] = f"{name}-other"
+        try:
+            with self.assertLogs("api.view_counts", "WARNING"):
+                self.assertEqual(buffer.flush(), 0)
+        finally:
+            settings_dict["NAME"] = name
+        self.assertEqual(buffer.saved, [])
+        self.assertEqual(buffer.pending, {})
+
+
+@override_settings(RECIPE_READ_MODEL=True)
+class RecipeDocumentTests(TestCase):
+    """Документы рецептов сбрасываются при update() связанных строк."""
+
+    def setUp(self):
+        documents.connect_signals()
+        self.addCleanup(self.disconnect_signals)
+        self.author = User.objects.create_user(
+            username="author", email="author@example.com", password="x"
+        )
+        self.tag = Tag.objects.create(name="Завтрак", slug="breakfast")
+        self.recipe = Recipe.objects.create(
+            author=self.author, name="Рецепт", text="-", cooking_time=1
+        )
+        self.recipe.tags.add(self.tag)
+        documents.build_documents([self.recipe.id])
+
+    @staticmethod
+    def disconnect_signals():
+        for sender, handler in (
+            (Tag, documents._tags_updated),
+            (Ingredient, documents._ingredients_updated),
+            (User, documents._authors_updated),
+        ):
+            query_cache.rows_updated.disconnect(handler, sender=sender)
+        post_save.disconnect(documents._tag_saved, sender=Tag)
+        post_save.disconnect(documents._ingredient_saved, sender=Ingredient)
+        post_save.disconnect(documents._author_saved, sender=User)
+        pre_delete.disconnect(documents._tag_deleting, sender=Tag)
+        pre_delete.disconnect(
+            documents._ingredient_deleting, sender=Ingredient
+        )
+        for through in (Recipe.tags.through, Recipe.ingredients.through):
+            m2m_changed.disconnect(documents._links_changed, sender=through)
+
+    def has_document(self):
+        return RecipeDocument.objects.filter(recipe=self.recipe).exists()
+
+    def test_tag_updated(self):
+        Tag.objects.filter(pk=self.tag.pk).update(name="Ужин")
+        self.assertFalse(self.has_document())
+
+    def test_author_updated(self):
+        User.objects.filter(pk=self.author.pk).update(is_active=False)
+        self.assertTrue(self.has_document())
+        User.objects.filter(pk=self.author.pk).update(first_name="Имя")
+        self.assertFalse(self.has_document())
+
+    def test_recipe_deleted_before_render(self):
+        recipes = list(
+            Recipe.objects.annotate(
+                is_favorited=Value(False), is_in_shopping_cart=Value(False)
+            )
+        )
+        RecipeDocument.objects.all().delete()
+        Recipe.objects.all().delete()
+        self.assertEqual(documents.render_documents(recipes, None), [])
+
+
+class RecipeListETagTests(TestCase):
+    """ETag списка рецептов меняется с тегами и ингредиентами."""
+
+    def setUp(self):
+        author = User.objects.create_user(
+            username="author", email="author@example.com", password="x"
+        )
+        self.tag = Tag.objects.create(name="Завтрак", slug="breakfast")
+        self.ingredient = Ingredient.objects.create(
+            name="Соль", measurement_unit="г"
+        )
+        self.recipe = Recipe.objects.create(
+            author=author, name="Рецепт", text="-", cooking_time=1
+        )
+        self.recipe.tags.add(self.tag)
+        self.link = IngredientInRecipe.objects.create(
+            recipe=self.recipe, ingredient=self.ingredient, amount=1
+        )
+
+    def etag(self):
+        response = self.client.get("/api/recipes/")
+        self.assertEqual(response.status_code, 200)
+        return response["ETag"]
+
+    def assertETagChanges(self, change):
+        etag = self.etag()
+        change()
+        self.assertNotEqual(self.etag(), etag)
+
+    def test_tag_and_ingredient_changed(self):
+        def rename(instance):
+            instance.name += " (изменено)"
+            instance.save()
+
+        self.assertETagChanges(lambda: rename(self.tag))
+        self.assertETagChanges(lambda: rename(self.ingredient))
+        self.assertETagChanges(self.ingredient.delete)
+
+    def test_links_changed(self):
+        other = Tag.objects.create(name="Ужин", slug="dinner")
+        self.assertETagChanges(lambda: self.recipe.tags.add(other))
+        self.assertETagChanges(lambda: self.recipe.tags.remove(self.tag))
+        self.assertETagChanges(self.link.delete)
+
+
+class CacheMetricsTests(SimpleTestCase):
+    """Метрики кеша в общей памяти попадают в экспозицию Prometheus."""
+
+    def test_oversize_exported(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        cache = SharedMemoryCache(
+            os.path.join(directory.name, "cache"),
+            {"OPTIONS": {"SLOTS": 8, "WAYS": 8, "MAX_PARTS": 2}},
+        )
+        self.assertFalse(cache.set("key", os.urandom(64 * 1024)))
+        series = metrics.registry.counters["foodgram_cache_oversize_total"]
+        self.assertEqual(series[(("cache", cache.path),)], 1)
+        text = metrics.render_prometheus(metrics.registry.counters, {})
+        self.assertIn("# TYPE foodgram_cache_oversize_total counter", text)
+
+
+class MetricsFilesTests(SimpleTestCase):
+    """Файлы завершившихся воркеров и размер потоковых ответов."""
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = Path(directory.name)
+        settings = override_settings(METRICS_DIR=directory.name)
+        settings.enable()
+        self.addCleanup(settings.disable)
+
+    def test_dead_worker_archived(self):
+        process = subprocess.Popen([sys.executable, "-c", ""])
+        process.wait()
+        path = self.directory / f"{process.pid}.json"
+        path.write_text(
+            json.dumps(
+                {
+                    "counters": {"dead_total": [[[["route", "a"]], 3]]},
+                    "gauges": {"dead_gauge": [[[], 1]]},
+                }
+            )
+        )
+        for _ in range(2):
+            counters, _histograms = metrics.collect()
+            self.assertEqual(counters["dead_total"], {(("route", "a"),): 3})
+            self.assertNotIn("dead_gauge", counters)
+        self.assertFalse(path.exists())
+
+    def test_streamed_size(self):
+        name = "foodgram_http_response_size_bytes_total"
+        labels = (("method", "GET"), ("route", "unmatched"))
+        middleware = MetricsMiddleware(
+            lambda request: StreamingHttpResponse(iter([b"ab", b"cde"]))
+        )
+        response = middleware(RequestFactory().get("/"))
+        before = metrics.registry.counters.get(name, {}).get(labels, 0)
+        self.assertEqual(b"".join(response.streaming_content), b"abcde")
+        response.close()
+        self.assertEqual(metrics.registry.counters[name][labels], before + 5)
+
+
+class LoadReplayTests(SimpleTestCase):
+    """Перцентили нагрузочного прогона."""
+
+    def test_nearest_rank_percentile(self):
+        values = list(range(1, 11))
+        for fraction, expected in ((0.1, 1), (0.5, 5), (0.95, 10), (1, 10)):
+            with self.subTest(fraction=fraction):
+                self.assertEqual(percentile(values, fraction), expected)
+        self.assertIsNone(percentile([], 0.5))
+
+
+@override_settings(QUERY_CACHE_ENABLED=True)
+class QueryCacheTests(TransactionTestCase):
+    """Каскадное удаление меняет версии связанных таблиц."""
+
+    def setUp(self):
+        query_cache.connect_model_signals()
+        self.addCleanup(self.disconnect_signals)
+        query_cache.get_cache().clear()
+        author = User.objects.create_user(
+            username="author", email="author@example.com", password="x"
+        )
+        self.tag = Tag.objects.create(name="Завтрак", slug="breakfast")
+        self.recipe = Recipe.objects.create(
+            author=author, name="Рецепт", text="-", cooking_time=1
+        )
+        self.recipe.tags.add(self.tag)
+
+    @staticmethod
+    def disconnect_signals():
+        for model in apps.get_models():
+            post_delete.disconnect(
+                query_cache._invalidate_on_delete, sender=model
+            )
+        m2m_changed.disconnect(query_cache._invalidate_on_m2m_change)
+
+    def used_tags(self):
+        return list(
+            Tag.objects.filter(recipes__isnull=False)
+            .distinct()
+            .cached()
+            .values_list("id", flat=True)
+        )
+
+    def test_recipe_deleted(self):
+        self.assertEqual(self.used_tags(), [self.tag.id])
+        self.recipe.delete()
+        self.assertEqual(self.used_tags(), [])
+
+    def test_links_cleared(self):
+        self.assertEqual(self.used_tags(), [self.tag.id])
+        self.tag.recipes.clear()
+        self.assertEqual(self.used_tags(), [])
+
+
+VIEWSETS = (RecipeViewSet, UserViewSet)
+PASSWORD = "budget-check-password"
+SMALL, LARGE = 1, 20
+
+
+def viewset_actions(view_class):
+    """Действия вьюсета, доступные через роутер."""
+    actions = set()
+    for route in SimpleRouter().get_routes(view_class):
+        for method, action in route.mapping.items():
+            if (
+                method in view_class.http_method_names
+                and hasattr(view_class, action)
+            ):
+                actions.add(action)
+    return actions
+
+
+def png_data_url():
+    buffer = io.BytesIO()
+    Image.new("RGB", (8, 8), (255, 0, 0)).save(buffer, "PNG")
+    return "data:image/png;base64," + base64.b64encode(
+        buffer.getvalue()
+    ).decode()
+
+
+class Fixture:
+    """Данные, на которых прогоняются сценарии."""
+
+    def __init__(self):
+        self.tags = [
+            Tag.objects.get_or_create(
+                slug=f"budget-{index}", defaults={"name": f"budget-{index}"}
+            )[0]
+            for index in range(3)
+        ]
+        self.ingredients = Ingredient.objects.bulk_create(
+            [
+                Ingredient(name=f"budget-{index}", measurement_unit="г")
+                for index in range(LARGE)
+            ]
+        )
+        self.viewer = self._user("viewer")
+        self.other = self._user("other")
+        self.authors = [self._user(f"author{i}") for i in range(LARGE)]
+        self.recipes = []
+        for author in self.authors:
+            for _ in range(2):
+                self.recipes.append(self._recipe(author, LARGE))
+        self.small_recipe = self._recipe(self.other, SMALL)
+        Follow.objects.bulk_create(
+            Follow(user=self.viewer, author=author) for author in self.authors
+        )
+        # Лента подписок: первый автор читается при запросе, рецепты
+        # остальных разосланы в ленту.
+        User.objects.filter(pk=self.authors[0].pk).update(feed_pull=True)
+        for author in self.authors[1:]:
+            timeline.backfill([self.viewer.id], author.id)
+        for model in (Favorite, ShoppingCart):
+            model.objects.bulk_create(
+                model(user=self.viewer, recipe=recipe)
+                for recipe in self.recipes[:LARGE]
+            )
+        ShoppingCart.objects.create(user=self.other, recipe=self.small_recipe)
+        for kind, user in (
+            (Tombstone.RECIPE, None),
+            (Tombstone.FAVORITE, self.viewer),
+            (Tombstone.SHOPPING_CART, self.viewer),
+        ):
+            Tombstone.objects.bulk_create(
+                Tombstone(kind=kind, user=user, object_id=10 ** 12 + index)
+                for index in range(LARGE)
+            )
+        if documents.is_enabled():
+            # Документы собраны заранее, как на работающем сервере.
+            documents.build_documents(
+                Recipe.objects.values_list("id", flat=True)
+            )
+
+    def _user(self, name):
+        user = User.objects.create_user(
+            username=f"budget-{name}",
+            email=f"budget-{name}@example.com",
+            first_name=name,
+            last_name=name,
+            password=PASSWORD,
+        )
+        user.token = Token.objects.create(user=user).key
+        return user
+
+    def _recipe(self, author, ingredients):
+        recipe = Recipe.objects.create(
+            author=author, name="budget", text="budget", cooking_time=5
+        )
+        recipe.tags.set(self.tags[: 1 + ingredients % len(self.tags)])
+        IngredientInRecipe.objects.bulk_create(
+            IngredientInRecipe(recipe=recipe, ingredient=ingredient, amount=1)
+            for ingredient in self.ingredients[:ingredients]
+        )
+        return recipe
+
+    def token(self, kind, user=None):
+        """Токен ленты изменений за последние сутки."""
+        return make_token(
+            kind,
+            user.id if user else None,
+            timezone.now() - timedelta(days=1),
+        )
+
+    def recipe_payload(self, ingredients):
+        return {
+            "tags": [tag.id for tag in self.tags[:ingredients]],
+            "ingredients": [
+                {"id": ingredient.id, "amount": 10}
+                for ingredient in self.ingredients[:ingredients]
+            ],
+            "name": "budget",
+            "text": "budget",
+            "cooking_time": 10,
+            "image": png_data_url(),
+        }
+
+
+def list_variants(user, path, method="get", **params):
+    return [
+        (user, method, path, {**params, "limit": limit})
+        for limit in (SMALL, LARGE)
+    ]
+
+
+def scenarios(fixture):
+    """
+    Сценарии: (вьюсет, действие, варианты).
+
+    Варианты одного сценария различаются только объёмом данных, поэтому
+    число запросов у них должно совпадать.
+    """
+    viewer, other = fixture.viewer, fixture.other
+    favorite_free = fixture.recipes[-1]
+    author = fixture.authors[-1]
+    small, large = fixture.small_recipe, fixture.recipes[1]
+    return [
+        (RecipeViewSet, "list", list_variants(viewer, "/api/recipes/")),
+        (
+            RecipeViewSet,
+            "list",
+            list_variants(
+                viewer,
+                "/api/recipes/",
+                tags=[tag.slug for tag in fixture.tags],
+                is_favorited=1,
+                is_in_shopping_cart=1,
+            ),
+        ),
+        (
+            RecipeViewSet,
+            "list",
+            list_variants(
+                viewer, "/api/recipes/", fields="id,name,image,cooking_time"
+            ),
+        ),
+        *(
+            (
+                RecipeViewSet,
+                "list",
+                list_variants(
+                    viewer,
+                    "/api/recipes/",
+                    tags=[tag.slug for tag in fixture.tags],
+                    ordering=ordering,
+                ),
+            )
+            for ordering in ("popular", "trending")
+        ),
+        (
+            RecipeViewSet,
+            "retrieve",
+            [
+                (viewer, "get", f"/api/recipes/{item.id}/", None)
+                for item in (small, large)
+            ],
+        ),
+        (
+            RecipeViewSet,
+            "retrieve",
+            [
+                (
+                    viewer,
+                    "get",
+                    f"/api/recipes/{item.id}/",
+                    {"omit": "ingredients,author"},
+                )
+                for item in (small, large)
+            ],
+        ),
+        (
+            RecipeViewSet,
+            "list",
+            list_variants(None, "/api/recipes/", method="revalidate"),
+        ),
+        (
+            RecipeViewSet,
+            "list",
+            list_variants(viewer, "/api/recipes/", method="revalidate"),
+        ),
+        (
+            RecipeViewSet,
+            "retrieve",
+            [
+                (None, "revalidate", f"/api/recipes/{item.id}/", None)
+                for item in (small, large)
+            ],
+        ),
+        (
+            RecipeViewSet,
+            "retrieve",
+            [
+                (viewer, "revalidate", f"/api/recipes/{item.id}/", None)
+                for item in (small, large)
+            ],
+        ),
+        (
+            RecipeViewSet,
+            "batch",
+            [
+                (
+                    viewer,
+                    "get",
+                    "/api/recipes/batch/",
+                    {"ids": ",".join(str(item.id) for item in items)},
+                )
+                for items in ([small], fixture.recipes[:LARGE])
+            ]
+            + [
+                (viewer, "post", "/api/recipes/batch/",
+                 {"ids": [item.id for item in fixture.recipes[:LARGE]]}),
+            ],
+        ),
+        (
+            RecipeViewSet,
+            "changes",
+            list_variants(None, "/api/recipes/changes/"),
+        ),
+        (
+            RecipeViewSet,
+            "changes",
+            list_variants(
+                viewer,
+                "/api/recipes/changes/",
+                since=fixture.token(Tombstone.RECIPE),
+            ),
+        ),
+        (
+            RecipeViewSet,
+            "favorite_changes",
+            list_variants(viewer, "/api/recipes/favorite/changes/")
+            + list_variants(
+                viewer,
+                "/api/recipes/favorite/changes/",
+                since=fixture.token(Tombstone.FAVORITE, viewer),
+            ),
+        ),
+        (
+            RecipeViewSet,
+            "shopping_cart_changes",
+            list_variants(viewer, "/api/recipes/shopping_cart/changes/")
+            + list_variants(
+                viewer,
+                "/api/recipes/shopping_cart/changes/",
+                since=fixture.token(Tombstone.SHOPPING_CART, viewer),
+            ),
+        ),
+        (
+            RecipeViewSet,
+            "feed",
+            list_variants(viewer, "/api/recipes/feed/")
+            + list_variants(
+                viewer,
+                "/api/recipes/feed/",
+                cursor=timeline.encode_cursor(timezone.now(), 0),
+            ),
+        ),
+        (
+            RecipeViewSet,
+            "create",
+            [
+                (viewer, "post", "/api/recipes/", fixture.recipe_payload(n))
+                for n in (SMALL, 3)
+            ],
+        ),
+        (
+            RecipeViewSet,
+            "partial_update",
+            [
+                (
+                    other,
+                    "patch",
+                    f"/api/recipes/{small.id}/",
+                    fixture.recipe_payload(n),
+                )
+                for n in (SMALL, 3)
+            ],
+        ),
+        (
+            RecipeViewSet,
+            "favorite",
+            [
+                (viewer, "post", f"/api/recipes/{favorite_free.id}/"
+                 "favorite/", None),
+                (viewer, "delete", f"/api/recipes/{favorite_free.id}/"
+                 "favorite/", None),
+            ],
+        ),
+        (
+            RecipeViewSet,
+            "shopping_cart",
+            [
+                (viewer, "post", f"/api/recipes/{favorite_free.id}/"
+                 "shopping_cart/", None),
+                (viewer, "delete", f"/api/recipes/{favorite_free.id}/"
+                 "shopping_cart/", None),
+            ],
+        ),
+        (
+            RecipeViewSet,
+            "download_shopping_cart",
+            [
+                (user, "get", "/api/recipes/download_shopping_cart/", None)
+                for user in (other, viewer)
+            ],
+        ),
+        (
+            RecipeViewSet,
+            "get_link",
+            [
+                (viewer, "get", f"/api/recipes/{item.id}/get-link/", None)
+                for item in (small, large)
+            ],
+        ),
+        (
+            RecipeViewSet,
+            "destroy",
+            [
+                (other, "delete", f"/api/recipes/{small.id}/", None),
+                (
+                    large.author,
+                    "delete",
+                    f"/api/recipes/{large.id}/",
+                    None,
+                ),
+            ],
+        ),
+        (UserViewSet, "list", list_variants(viewer, "/api/users/")),
+        (
+            UserViewSet,
+            "list",
+            list_variants(viewer, "/api/users/", fields="id,username"),
+        ),
+        (
+            UserViewSet,
+            "retrieve",
+            [
+                (viewer, "get", f"/api/users/{user.id}/", None)
+                for user in (fixture.other, author)
+            ],
+        ),
+        (
+            UserViewSet,
+            "list",
+            list_variants(None, "/api/users/", method="revalidate"),
+        ),
+        (
+            UserViewSet,
+            "list",
+            list_variants(viewer, "/api/users/", method="revalidate"),
+        ),
+        (
+            UserViewSet,
+            "retrieve",
+            [
+                (None, "revalidate", f"/api/users/{item.id}/", None)
+                for item in (fixture.other, author)
+            ],
+        ),
+        (
+            UserViewSet,
+            "retrieve",
+            [
+                (viewer, "revalidate", f"/api/users/{item.id}/", None)
+                for item in (fixture.other, author)
+            ],
+        ),
+        (
+            UserViewSet,
+            "create",
+            [
+                (
+                    None,
+                    "post",
+                    "/api/users/",
+                    {
+                        "email": f"budget-new{n}@example.com",
+                        "username": f"budget-new{n}",
+                        "first_name": "new",
+                        "last_name": "new",
+                        "password": PASSWORD,
+                    },
+                )
+                for n in (SMALL, LARGE)
+            ],
+        ),
+        (UserViewSet, "me", [(viewer, "get", "/api/users/me/", None)]),
+        (
+            UserViewSet,
+            "subscriptions",
+            list_variants(viewer, "/api/users/subscriptions/")
+            + list_variants(
+                viewer, "/api/users/subscriptions/", recipes_limit=SMALL
+            ),
+        ),
+        (
+            UserViewSet,
+            "subscribe",
+            [
+                (other, "post", f"/api/users/{author.id}/subscribe/", None),
+                (
+                    other,
+                    "delete",
+                    f"/api/users/{author.id}/subscribe/",
+                    None,
+                ),
+            ],
+        ),
+        (
+            UserViewSet,
+            "update",
+            [
+                (
+                    other,
+                    "put",
+                    f"/api/users/{fixture.other.id}/",
+                    {
+                        "email": fixture.other.email,
+                        "username": fixture.other.username,
+                        "first_name": "changed",
+                        "last_name": "changed",
+                    },
+                )
+            ],
+        ),
+        (
+            UserViewSet,
+            "partial_update",
+            [
+                (
+                    other,
+                    "patch",
+                    f"/api/users/{fixture.other.id}/",
+                    {"first_name": "patched"},
+                )
+            ],
+        ),
+        (
+            UserViewSet,
+            "avatar",
+            [
+                (other, "put", "/api/users/me/avatar/",
+                 {"avatar": png_data_url()}),
+                (other, "delete", "/api/users/me/avatar/", None),
+            ],
+        ),
+        (
+            UserViewSet,
+            "set_password",
+            [
+                (
+                    other,
+                    "post",
+                    "/api/users/set_password/",
+                    {
+                        "current_password": PASSWORD,
+                        "new_password": PASSWORD,
+                    },
+                )
+            ],
+        ),
+        (
+            UserViewSet,
+            "destroy",
+            [(other, "delete", f"/api/users/{author.id}/", None)],
+        ),
+    ]
+
+
+@override_settings(SYNC_LAG=0, VIEW_COUNTER_ENABLED=False)
+class QueryBudgetTests(TestCase):
+    """
+    Бюджеты SQL-запросов всех действий RecipeViewSet и UserViewSet.
+
+    Число запросов действия не превышает query_budgets вьюсета, а у
+    вариантов одного сценария, различающихся только объёмом данных,
+    совпадает (assertNumQueries): запросы не растут вместе со строками.
+    """
+
+    def setUp(self):
+        media_root = tempfile.TemporaryDirectory()
+        self.addCleanup(media_root.cleanup)
+        settings_override = self.settings(MEDIA_ROOT=media_root.name)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        self.fixture = Fixture()
+        # Карта id коротких ссылок читается один раз на процесс.
+        short_links.recipe_ids.load()
+
+    def test_every_action_has_budget_and_scenario(self):
+        covered = {
+            (view_class, action)
+            for view_class, action, _ in scenarios(self.fixture)
+        }
+        for view_class in VIEWSETS:
+            for action in viewset_actions(view_class):
+                with self.subTest(view=view_class.__name__, action=action):
+                    self.assertIsNotNone(
+                        get_query_budget(view_class, action)
+                    )
+                    self.assertIn((view_class, action), covered)
+
+    def test_scenarios(self):
+        for view_class, action, variants in scenarios(self.fixture):
+            budget = get_query_budget(view_class, action)
+            name = f"{view_class.__name__}.{action}"
+            same_method = len({variant[1] for variant in variants}) == 1
+            expected = None
+            for variant in variants:
+                with self.subTest(name, method=variant[1], path=variant[2]):
+                    if expected is None or not same_method:
+                        queries = CaptureQueriesContext(connection)
+                        self.request(*variant, queries)
+                        self.assertLessEqual(len(queries), budget)
+                        expected = len(queries)
+                    else:
+                        self.request(
+                            *variant, self.assertNumQueries(expected)
+                        )
+
+    def request(self, user, method, path, data, queries):
+        """Запрос сценария; в queries считаются только его запросы."""
+        client = APIClient()
+        if user:
+            client.credentials(HTTP_AUTHORIZATION=f"Token {user.token}")
+            # Токен обычно уже в кеше аутентификации.
+            CachedTokenAuthentication().authenticate_credentials(user.token)
+        headers = {}
+        expected_status = None
+        if method == "revalidate":
+            # Повторный GET с ETag первого ответа должен получить 304.
+            headers["HTTP_IF_NONE_MATCH"] = client.get(path, data)["ETag"]
+            expected_status = 304
+        send = getattr(client, "get" if headers else method)
+        # Обработчики on_commit выполняются сразу, чтобы их запросы вошли
+        # в подсчёт.
+        with queries, self.captureOnCommitCallbacks(execute=True):
+            if method in ("get", "revalidate"):
+                response = send(path, data, **headers)
+            else:
+                response = send(path, data, format="json")
+            if response.streaming:
+                # Потоковый ответ читает базу при отправке.
+                b"".join(response)
+        if expected_status:
+            self.assertEqual(response.status_code, expected_status)
+        else:
+            self.assertLess(response.status_code, 400, path)
+        return response
@@ -0,0 +1,154 @@
+import hashlib
+import json
+import logging
+import re
+import sys
+
+from django.conf import settings
+from django_filters import FilterSet
+from rest_framework.fields import Field
+from rest_framework.serializers import BaseSerializer, ListSerializer
+from rest_framework.views import APIView
+
+logger = logging.getLogger("api.sql")
+
+MAX_STACK_DEPTH = 80
+
+_STRING = re.compile(r"'(?:[^']|'')*'")
+_NUMBER = re.compile(r"\b\d+(?:\.\d+)?\b")
+_IN_LIST = re.compile(r"\bIN\s*\((?:\s*(?:%s|\?)\s*,?)+\)", re.IGNORECASE)
+_SAVEPOINT = re.compile(r'"s\d+_x\d+"')
+_SPACES = re.compile(r"\s+")
+
+
+def normalize_sql(sql):
+    """SQL без литералов и с свёрнутыми списками IN (...)."""
+    sql = _SAVEPOINT.sub('"?"', sql)
+    sql = _STRING.sub("?", sql)
+    sql = _NUMBER.sub("?", sql)
+    sql = _IN_LIST.sub("IN (...)", sql)
+    return _SPACES.sub(" ", sql).strip()
+
+
+def fingerprint(normalized_sql):
+    return hashlib.md5(normalized_sql.encode()).hexdigest()[:12]
+
+
+def _frame_label(frame):
+    """Подпись кадра стека или None, если кадр неинтересен."""
+    name = frame.f_code.co_name
+    if name == "prefetch_one_level":
+        lookup = frame.f_locals.get("lookup")
+        return f"prefetch:{getattr(lookup, 'prefetch_to', lookup)}"
+    owner = frame.f_locals.get("self")
+    if owner is None:
+        return None
+    if isinstance(owner, APIView):
+        action = getattr(owner, "action", None) or name
+        return f"{type(owner).__name__}.{action}"
+    if isinstance(owner, ListSerializer):
+        return None
+    if isinstance(owner, BaseSerializer):
+        if name.startswith(("get_", "validate")):
+            return f"{type(owner).__name__}.{name}"
+        if owner.field_name:
+            return f"{type(owner).__name__}({owner.field_name})"
+        return type(owner).__name__
+    if isinstance(owner, Field):
+        return f".{owner.field_name}" if owner.field_name else None
+    if isinstance(owner, FilterSet):
+        return f"{type(owner).__name__}.{name}"
+    return None
+
+
+def attribution():
+    """
+    Компактный стек «действие → сериализатор → поле» для текущего кадра.
+
+    Например: RecipeViewSet.list > RecipeGetSerializer >
+    UserSerializer(author) > UserSerializer.get_is_subscribed.
+    """
+    labels = []
+    frame = sys._getframe(1)
+    depth = 0
+    while frame is not None and depth < MAX_STACK_DEPTH:
+        label = _frame_label(frame)
+        if label and (not labels or labels[-1] != label):
+            labels.append(label)
+        frame = frame.f_back
+        depth += 1
+    return " > ".join(reversed(labels))
+
+
+class QueryTracer:
+    """
+    Журнал SQL одного HTTP-запроса.
+
+    Медленные запросы пишутся в лог сразу, повторяющиеся (N+1) —
+    одной агрегированной записью по отпечатку в конце запроса.
+    """
+
+    def __init__(self, request, slow_ms=None, repeat_threshold=None):
+        self.request = request
+        self.slow_ms = (
+            slow_ms if slow_ms is not None else settings.SQL_TRACE_SLOW_MS
+        )
+        self.repeat_threshold = (
+            repeat_threshold
+            if repeat_threshold is not None
+            else settings.SQL_TRACE_REPEAT_THRESHOLD
+        )
+        self.statements = {}
+
+    def on_query(self, sql, params, many, duration):
+        normalized = normalize_sql(sql)
+        key = fingerprint(normalized)
+        source = attribution()
+        duration_ms = duration * 1000
+        entry = self.statements.get(key)
+        if entry is None:
+            entry = self.statements[key] = {
+                "fingerprint": key,
+                "sql": normalized,
+                "count": 0,
+                "total_ms": 0.0,
+                "max_ms": 0.0,
+                "sources": {},
+            }
+        entry["count"] += 1
+        entry["total_ms"] += duration_ms
+        entry["max_ms"] = max(entry["max_ms"], duration_ms)
+        entry["sources"][source] = entry["sources"].get(source, 0) + 1
+        if duration_ms >= self.slow_ms:
+            self._log(
+                "slow_query",
+                fingerprint=key,
+                sql=normalized,
+                duration_ms=round(duration_ms, 3),
+                source=source,
+            )
+
+    def finish(self):
+        for entry in self.statements.values():
+            if entry["count"] >= self.repeat_threshold:
+                self._log(
+                    "repeated_query",
+                    fingerprint=entry["fingerprint"],
+                    sql=entry["sql"],
+                    count=entry["count"],
+                    total_ms=round(entry["total_ms"], 3),
+                    max_ms=round(entry["max_ms"], 3),
+                    sources=entry["sources"],
+                )
+
+    def _log(self, event, **fields):
+        record = {
+            "event": event,
+            "method": self.request.method,
+            "path": self.request.path,
+            **fields,
+        }
+        logger.warning(
+            json.dumps(record, ensure_ascii=False),
+            extra={"sql_trace": record},
+        )
@@ -1,8 +1,15 @@
-from django.urls import include, path
+from django.urls import include, path, re_path
+
+from api.metrics import metrics_view
+from api.users.views import TokenCreateView
 
 urlpatterns = [
+    path("metrics", metrics_view, name="metrics"),
     path("users/", include("api.users.urls")),
     path("", include("api.recipes.urls")),
     path("", include("djoser.urls")),
+    re_path(
+        r"^auth/token/login/?$", TokenCreateView.as_view(), name="login"
+    ),
     path("auth/", include("djoser.urls.authtoken")),
 ]
@@ -2,7 +2,8 @@ from django.contrib.auth import get_user_model
 from rest_framework import serializers
 from rest_framework.validators import UniqueTogetherValidator
 
-from api.utils import Base64ImageField
+from api.sparse_fields import SparseFieldsSerializerMixin
+from api.utils import Base64ImageField, is_subscribed
 from users.models import Follow
 
 User = get_user_model()
@@ -28,7 +29,9 @@ class UserRegistrationSerializer(serializers.ModelSerializer):
         return User.objects.create_user(**validated_data)
 
 
-class UserSerializer(serializers.ModelSerializer):
+class UserSerializer(
+    SparseFieldsSerializerMixin, serializers.ModelSerializer
+):
     """Информация о пользователе"""
 
     is_subscribed = serializers.SerializerMethodField()
@@ -46,10 +49,11 @@ class UserSerializer(serializers.ModelSerializer):
         )
 
     def get_is_subscribed(self, obj):
-        request = self.context.get("request")
-        if not request or not request.user.is_authenticated:
-            return False
-        return Follow.objects.filter(user=request.user, author=obj).exists()
+        # Списки аннотируют флаг подзапросом (api.utils.subscribed_to).
+        subscribed = getattr(obj, "is_subscribed", None)
+        if subscribed is None:
+            subscribed = is_subscribed(self.context.get("request"), obj.id)
+        return subscribed
 
 
 class UserSubscribeRepresentSerializer(UserSerializer):
@@ -86,7 +90,9 @@ class UserSubscribeRepresentSerializer(UserSerializer):
     def get_recipes(self, obj):
         request = self.context.get("request")
         limit = request.query_params.get("recipes_limit") if request else None
-        queryset = obj.recipes.all()
+        queryset = getattr(obj, "prefetched_recipes", None)
+        if queryset is None:
+            queryset = obj.recipes.all()
         if limit:
             queryset = queryset[: int(limit)]
         return [
@@ -100,7 +106,10 @@ class UserSubscribeRepresentSerializer(UserSerializer):
         ]
 
     def get_recipes_count(self, obj):
-        return obj.recipes.count()
+        recipes_count = getattr(obj, "recipes_count", None)
+        if recipes_count is None:
+            return obj.recipes.count()
+        return recipes_count
 
 
 class SubscribeSerializer(serializers.ModelSerializer):
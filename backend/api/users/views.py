@@ -1,8 +1,23 @@
 from django.contrib.auth import get_user_model
+from django.db.models import (
+    BooleanField,
+    Count,
+    Exists,
+    Max,
+    OuterRef,
+    Prefetch,
+    Value,
+)
+from djoser import views as djoser_views
 from rest_framework import permissions, status, viewsets
 from rest_framework.decorators import action
 from rest_framework.response import Response
 
+from api.authentication import delete_expired_token
+from api.conditional import ConditionalGetMixin, make_etag, viewer_state
+from api.fast_serializers import FastListMixin
+from api.replicas import ReplicaReadMixin
+from api.sparse_fields import SparseFieldsMixin, model_columns
 from api.users.serializers import (
     AvatarSerializer,
     SubscribeSerializer,
@@ -10,15 +25,91 @@ from api.users.serializers import (
     UserSerializer,
     UserSubscribeRepresentSerializer,
 )
+from api.utils import subscribed_to
+from recipes.models import Recipe
 from users.models import Follow
 
 User = get_user_model()
 
 
-class UserViewSet(viewsets.ModelViewSet):
+class UserViewSet(
+    ConditionalGetMixin,
+    ReplicaReadMixin,
+    FastListMixin,
+    SparseFieldsMixin,
+    viewsets.ModelViewSet,
+):
     """Вьюсет для работы с пользователями и подписками."""
 
-    queryset = User.objects.all()
+    queryset = User.objects.cached()
+    # Допустимое число SQL-запросов на действие: наибольшее измеренное
+    # плюс 2 запроса запаса, как у RecipeViewSet.query_budgets.
+    query_budgets = {
+        "list": 5,
+        "retrieve": 4,
+        "create": 5,
+        "update": 7,
+        "partial_update": 5,
+        "destroy": 28,
+        "me": 4,
+        "subscribe": 13,
+        "subscriptions": 5,
+        "set_password": 5,
+        "avatar": 5,
+    }
+
+    def get_queryset(self):
+        """
+        При ?fields= / ?omit= загружаются только нужные колонки; флаг
+        подписки вычисляется подзапросом в том же запросе.
+        """
+        queryset = super().get_queryset()
+        fields = self.get_requested_fields()
+        if fields is not None:
+            queryset = queryset.only(*model_columns(User, fields))
+        if fields is None or "is_subscribed" in fields:
+            queryset = queryset.annotate(
+                is_subscribed=subscribed_to(self.request)
+            )
+        return queryset
+
+    def get_validators(self):
+        """
+        ETag профиля — время его изменения и подписка пользователя;
+        ETag списка — число и наибольшее время изменения профилей и
+        отпечаток подписок пользователя.
+        """
+        viewer = self.get_viewer()
+        url = self.request.build_absolute_uri()
+        if self.action == "retrieve":
+            return self._detail_validators(viewer, url)
+        state = self.filter_queryset(User.objects.all()).aggregate(
+            count=Count("id"),
+            updated_at=Max("updated_at"),
+            **viewer_state(viewer, Follow),
+        )
+        etag = make_etag(url, viewer and viewer.id, *state.values())
+        return etag, None
+
+    def _detail_validators(self, viewer, url):
+        lookup = self.kwargs[self.lookup_url_kwarg or self.lookup_field]
+        columns = ["updated_at"]
+        try:
+            queryset = User.objects.filter(pk=lookup)
+        except ValueError:
+            return None
+        if viewer is not None:
+            queryset = queryset.annotate(
+                is_subscribed=Exists(
+                    Follow.objects.filter(user=viewer, author=OuterRef("pk"))
+                )
+            )
+            columns.append("is_subscribed")
+        row = queryset.values_list(*columns).first()
+        if row is None:
+            return None
+        etag = make_etag(url, viewer and viewer.id, *row)
+        return etag, row[0] if viewer is None else None
 
     def get_serializer_class(self):
         """Выбор сериализатора в зависимости от действия."""
@@ -80,6 +171,27 @@ class UserViewSet(viewsets.ModelViewSet):
             follow.delete()
             return Response(status=status.HTTP_204_NO_CONTENT)
 
+    def _get_subscriptions_queryset(self, request):
+        """Авторы с числом рецептов и первыми recipes_limit рецептами."""
+        recipes = Recipe.objects.all()
+        limit = request.query_params.get("recipes_limit")
+        if limit:
+            recipes = recipes[: int(limit)]
+        return (
+            User.objects.filter(following__user=request.user)
+            .annotate(
+                recipes_count=Count("recipes", distinct=True),
+                # Выборка состоит из подписок пользователя.
+                is_subscribed=Value(True, output_field=BooleanField()),
+            )
+            .order_by("id")
+            .prefetch_related(
+                Prefetch(
+                    "recipes", queryset=recipes, to_attr="prefetched_recipes"
+                )
+            )
+        )
+
     @action(
         detail=False,
         methods=["get"],
@@ -87,7 +199,7 @@ class UserViewSet(viewsets.ModelViewSet):
     )
     def subscriptions(self, request):
         """Список пользователей, на которых подписан текущий."""
-        authors = User.objects.filter(following__user=request.user)
+        authors = self._get_subscriptions_queryset(request)
         page = self.paginate_queryset(authors)
         serializer = UserSubscribeRepresentSerializer(
             page, many=True, context={"request": request}
@@ -144,3 +256,11 @@ class UserViewSet(viewsets.ModelViewSet):
         elif request.method == "DELETE":
             user.avatar.delete(save=True)
             return Response(status=status.HTTP_204_NO_CONTENT)
+
+
+class TokenCreateView(djoser_views.TokenCreateView):
+    """Вход: вместо истёкшего токена выдаётся новый."""
+
+    def _action(self, serializer):
+        delete_expired_token(serializer.user)
+        return super()._action(serializer)
@@ -2,10 +2,17 @@ import base64
 import imghdr
 import uuid
 
+from django.core.exceptions import ValidationError as DjangoValidationError
 from django.core.files.base import ContentFile
+from django.db.models import BooleanField, Exists, OuterRef, Value
 from rest_framework import serializers, status
+from rest_framework.relations import MANY_RELATION_KWARGS
 from rest_framework.response import Response
 
+from api.recipes import ranking
+from api.recipes.sync import MODEL_KINDS, record_deletions
+from users.models import Follow
+
 
 class Base64ImageField(serializers.ImageField):
     """
@@ -51,6 +58,40 @@ class Base64ImageField(serializers.ImageField):
         )
 
 
+class BulkManyRelatedField(serializers.ManyRelatedField):
+    """Список первичных ключей, проверяемый одним запросом к базе."""
+
+    def to_internal_value(self, data):
+        if isinstance(data, str) or not hasattr(data, "__iter__"):
+            self.fail("not_a_list", input_type=type(data).__name__)
+        if not self.allow_empty and len(data) == 0:
+            self.fail("empty")
+
+        child = self.child_relation
+        pk_field = child.get_queryset().model._meta.pk
+        try:
+            pks = [pk_field.to_python(pk) for pk in data]
+        except (TypeError, ValueError, DjangoValidationError):
+            child.fail("incorrect_type", data_type=type(data).__name__)
+        objects = child.get_queryset().in_bulk(set(pks))
+        for pk in pks:
+            if pk not in objects:
+                child.fail("does_not_exist", pk_value=pk)
+        return [objects[pk] for pk in pks]
+
+
+class BulkPrimaryKeyRelatedField(serializers.PrimaryKeyRelatedField):
+    """PrimaryKeyRelatedField, который при many=True не делает N+1."""
+
+    @classmethod
+    def many_init(cls, *args, **kwargs):
+        list_kwargs = {"child_relation": cls(*args, **kwargs)}
+        for key in kwargs:
+            if key in MANY_RELATION_KWARGS:
+                list_kwargs[key] = kwargs[key]
+        return BulkManyRelatedField(**list_kwargs)
+
+
 def create_model_instance(request, recipe, serializer_class):
     """Добавление в favorite или shopping_cart"""
     serializer = serializer_class(
@@ -64,12 +105,37 @@ def create_model_instance(request, recipe, serializer_class):
 
 def delete_model_instance(request, model_class, recipe, error_message):
     """Удаление из favorite или shopping_cart."""
-    deleted_count, _ = model_class.objects.filter(
-        user=request.user, recipe=recipe
-    ).delete()
-    if deleted_count == 0:
+    queryset = model_class.objects.filter(user=request.user, recipe=recipe)
+    added_at = queryset.values_list("created_at", flat=True).first()
+    if added_at is None:
         return Response(
             {"detail": error_message},
             status=status.HTTP_400_BAD_REQUEST,
         )
+    queryset.delete()
+    ranking.record_removal(model_class, recipe.id, added_at)
+    record_deletions(
+        MODEL_KINDS[model_class], [recipe.id], user_id=request.user.id
+    )
     return Response(status=status.HTTP_204_NO_CONTENT)
+
+
+def subscribed_to(request, author="pk"):
+    """
+    Подзапрос Exists: подписан ли текущий пользователь на автора.
+
+    author — путь к id автора от строк queryset; флаг вычисляется в том
+    же запросе, что и строки, а не выборкой всех подписок пользователя.
+    """
+    user = getattr(request, "user", None)
+    if user is None or not user.is_authenticated:
+        return Value(False, output_field=BooleanField())
+    return Exists(Follow.objects.filter(user=user, author=OuterRef(author)))
+
+
+def is_subscribed(request, author_id):
+    """Подписка на одного автора, если строка без аннотации subscribed_to."""
+    user = getattr(request, "user", None)
+    if user is None or not user.is_authenticated:
+        return False
+    return Follow.objects.filter(user=user, author_id=author_id).exists()
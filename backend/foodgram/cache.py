@@ -0,0 +1,423 @@
+import fcntl
+import hashlib
+import logging
+import mmap
+import os
+import pickle
+import struct
+import threading
+import time
+import zlib
+
+from django.core.cache.backends.base import DEFAULT_TIMEOUT, BaseCache
+
+from foodgram import stats
+
+logger = logging.getLogger("foodgram.cache")
+
+MAGIC = b"FGSHMC02"
+# magic, число слотов, размер слота, ассоциативность.
+FILE_HEADER = struct.Struct("<8sIII")
+# seq, занят, бит обращения, длина ключа, хеш ключа, срок жизни,
+# длина значения, crc32 ключа и значения.
+SLOT_HEADER = struct.Struct("<IBBHQdII")
+SEQ = struct.Struct("<I")
+REF_OFFSET = 5
+PAGE_SIZE = mmap.PAGESIZE
+READ_RETRIES = 8
+# Первый байт значения: pickle, pickle в zlib или список частей.
+INLINE = b"\x00"
+COMPRESSED = b"\x01"
+CHUNKED = b"\x02"
+# Случайный токен записи, число частей, crc32 склеенных частей.
+PARTS = struct.Struct("<8sII")
+MISSING = object()
+
+
+class SharedMemoryCache(BaseCache):
+    """
+    Кеш в файле, отображённом в память всеми воркерами одного хоста.
+
+    Файл LOCATION разбит на слоты фиксированного размера, сгруппированные
+    в наборы по WAYS слотов (множественно-ассоциативный кеш): ключ
+    попадает в набор по хешу, внутри набора вытесняется запись по
+    алгоритму CLOCK. Запись идёт под блокировкой полосы (fcntl + поток),
+    чтение — без блокировок: seqlock в заголовке слота и crc32 отсекают
+    данные, прочитанные во время записи.
+
+    OPTIONS: SLOTS (число слотов), SLOT_SIZE (байт на слот, включая
+    заголовок и ключ), WAYS, LOCK_STRIPES. Значения длиннее
+    COMPRESS_MIN_SIZE байт сжимаются; не поместившиеся в слот делятся на
+    части до MAX_PARTS слотов под отдельными ключами с общим случайным
+    токеном, а в слоте ключа хранится их список. Потеря любой части —
+    промах. Значения больше MAX_PARTS слотов не кешируются и считаются в
+    метрике foodgram_cache_oversize_total.
+    """
+
+    pickle_protocol = pickle.HIGHEST_PROTOCOL
+
+    def __init__(self, location, params):
+        super().__init__(params)
+        options = params.get("OPTIONS", {})
+        self.path = location
+        self.slots = int(options.get("SLOTS", 4096))
+        self.slot_size = int(options.get("SLOT_SIZE", 8192))
+        self.ways = int(options.get("WAYS", 8))
+        self.stripes = int(options.get("LOCK_STRIPES", 64))
+        self.compress_min_size = int(options.get("COMPRESS_MIN_SIZE", 1024))
+        self.max_parts = int(options.get("MAX_PARTS", 64))
+        if self.slots % self.ways:
+            raise ValueError("SLOTS должно делиться на WAYS.")
+        if not 0 < self.ways < 256:
+            raise ValueError("WAYS должно быть от 1 до 255.")
+        self.sets = self.slots // self.ways
+        self.max_payload = self.slot_size - SLOT_HEADER.size
+        self.hands_offset = PAGE_SIZE
+        self.data_offset = PAGE_SIZE * (
+            1 + (self.sets + PAGE_SIZE - 1) // PAGE_SIZE
+        )
+        self.size = self.data_offset + self.slots * self.slot_size
+        self._pid = None
+
+    # Открытие файла и блокировки.
+
+    def _open(self):
+        """Отображает файл в память (заново в каждом процессе)."""
+        if self._pid == os.getpid():
+            return
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o600)
+        fcntl.lockf(fd, fcntl.LOCK_EX, 1, 0)
+        try:
+            if not self._valid_file(fd):
+                os.ftruncate(fd, 0)
+                os.ftruncate(fd, self.size)
+                os.pwrite(
+                    fd,
+                    FILE_HEADER.pack(
+                        MAGIC, self.slots, self.slot_size, self.ways
+                    ),
+                    0,
+                )
+        finally:
+            fcntl.lockf(fd, fcntl.LOCK_UN, 1, 0)
+        self._fd = fd
+        self._mm = mmap.mmap(fd, self.size)
+        self._locks = [threading.Lock() for _ in range(self.stripes)]
+        self._pid = os.getpid()
+
+    def _valid_file(self, fd):
+        if os.fstat(fd).st_size != self.size:
+            return False
+        header = os.pread(fd, FILE_HEADER.size, 0)
+        return header == FILE_HEADER.pack(
+            MAGIC, self.slots, self.slot_size, self.ways
+        )
+
+    def _lock(self, set_index):
+        stripe = set_index % self.stripes
+        lock = self._locks[stripe]
+        lock.acquire()
+        try:
+            fcntl.lockf(self._fd, fcntl.LOCK_EX, 1, 1 + stripe)
+        except BaseException:
+            lock.release()
+            raise
+        return stripe
+
+    def _unlock(self, stripe):
+        fcntl.lockf(self._fd, fcntl.LOCK_UN, 1, 1 + stripe)
+        self._locks[stripe].release()
+
+    # Слоты.
+
+    def _hash(self, key):
+        return int.from_bytes(
+            hashlib.blake2b(key, digest_size=8).digest(), "little"
+        )
+
+    def _slot_offset(self, set_index, way):
+        return self.data_offset + (
+            set_index * self.ways + way
+        ) * self.slot_size
+
+    def _read_slot(self, offset):
+        """
+        Заголовок и данные слота без блокировки или None.
+
+        Повторяет чтение, пока значение seq до и после копирования не
+        совпадёт и не будет чётным (запись не шла).
+        """
+        mm = self._mm
+        for _ in range(READ_RETRIES):
+            header = SLOT_HEADER.unpack_from(mm, offset)
+            seq, used, _, key_len, _, _, value_len, crc = header
+            if seq & 1:
+                continue
+            if not used:
+                return None
+            if key_len + value_len > self.max_payload:
+                continue
+            start = offset + SLOT_HEADER.size
+            payload = mm[start:start + key_len + value_len]
+            if SEQ.unpack_from(mm, offset)[0] != seq:
+                continue
+            if zlib.crc32(payload) != crc:
+                continue
+            return header, payload
+        return None
+
+    def _find(self, key, key_hash, set_index):
+        """Смещение слота с ключом, его срок жизни и значение."""
+        for way in range(self.ways):
+            offset = self._slot_offset(set_index, way)
+            result = self._read_slot(offset)
+            if result is None:
+                continue
+            header, payload = result
+            key_len, slot_hash, expires = header[3], header[4], header[5]
+            if slot_hash == key_hash and payload[:key_len] == key:
+                return offset, expires, payload[key_len:]
+        return None
+
+    def _write_slot(self, offset, key, key_hash, expires, value):
+        mm = self._mm
+        seq = SEQ.unpack_from(mm, offset)[0]
+        SEQ.pack_into(mm, offset, (seq + 1) & 0xFFFFFFFF)
+        payload = key + value
+        start = offset + SLOT_HEADER.size
+        mm[start:start + len(payload)] = payload
+        SLOT_HEADER.pack_into(
+            mm,
+            offset,
+            (seq + 1) & 0xFFFFFFFF,
+            1,
+            1,
+            len(key),
+            key_hash,
+            expires,
+            len(value),
+            zlib.crc32(payload),
+        )
+        SEQ.pack_into(mm, offset, (seq + 2) & 0xFFFFFFFF)
+
+    def _clear_slot(self, offset):
+        mm = self._mm
+        seq = SEQ.unpack_from(mm, offset)[0]
+        SEQ.pack_into(mm, offset, (seq + 1) & 0xFFFFFFFF)
+        mm[offset + 4] = 0
+        SEQ.pack_into(mm, offset, (seq + 2) & 0xFFFFFFFF)
+
+    def _victim(self, set_index, now):
+        """Свободный или просроченный слот, иначе жертва CLOCK."""
+        mm = self._mm
+        for way in range(self.ways):
+            offset = self._slot_offset(set_index, way)
+            header = SLOT_HEADER.unpack_from(mm, offset)
+            if not header[1] or (header[5] and header[5] <= now):
+                return offset
+        hand_offset = self.hands_offset + set_index
+        hand = mm[hand_offset] % self.ways
+        while True:
+            offset = self._slot_offset(set_index, hand)
+            hand = (hand + 1) % self.ways
+            if mm[offset + REF_OFFSET]:
+                mm[offset + REF_OFFSET] = 0
+                continue
+            mm[hand_offset] = hand
+            return offset
+
+    def _store(self, key, value, timeout, mode):
+        """
+        Запись под блокировкой набора.
+
+        mode: "set" — всегда, "add" — только если ключа нет,
+        "touch" — только обновить срок жизни существующего ключа.
+        """
+        self._open()
+        key = key.encode()
+        key_hash = self._hash(key)
+        set_index = key_hash % self.sets
+        expires = self.get_backend_timeout(timeout) or 0.0
+        if value is not None and len(key) + len(value) > self.max_payload:
+            return False
+        now = time.time()
+        stripe = self._lock(set_index)
+        try:
+            found = self._find(key, key_hash, set_index)
+            alive = found is not None and not (found[1] and found[1] <= now)
+            if mode == "add" and alive:
+                return False
+            if mode == "touch":
+                if not alive:
+                    return False
+                value = found[2]
+            offset = found[0] if found else self._victim(set_index, now)
+            self._write_slot(offset, key, key_hash, expires, value)
+            return True
+        finally:
+            self._unlock(stripe)
+
+    # Формат значений.
+
+    def _pack(self, value):
+        data = pickle.dumps(value, self.pickle_protocol)
+        if len(data) < self.compress_min_size:
+            return INLINE + data
+        return COMPRESSED + zlib.compress(data)
+
+    def _part_key(self, key, token, index):
+        return f"{key}:part:{token.hex()}:{index}"
+
+    def _put(self, key, value, timeout, mode):
+        """Запись значения: в слот ключа или частями."""
+        data = self._pack(value)
+        if len(key.encode()) + len(data) <= self.max_payload:
+            return self._store(key, data, timeout, mode)
+        token = os.urandom(8)
+        part_size = self.max_payload - len(
+            self._part_key(key, token, self.max_parts).encode()
+        )
+        count = -(-len(data) // part_size)
+        if count > self.max_parts:
+            stats.inc(
+                self, "foodgram_cache_oversize_total", {"cache": self.path}
+            )
+            logger.debug(
+                "Значение %s (%d байт) не помещается в кеш", key, len(data)
+            )
+            return False
+        # Части до списка: читатель не увидит список без частей.
+        for index in range(count):
+            chunk = data[index * part_size:(index + 1) * part_size]
+            part_key = self._part_key(key, token, index)
+            if not self._store(part_key, chunk, timeout, "set"):
+                return False
+        header = CHUNKED + PARTS.pack(token, count, zlib.crc32(data))
+        return self._store(key, header, timeout, mode)
+
+    def _get_raw(self, key):
+        """Байты живого значения ключа или None."""
+        self._open()
+        key = key.encode()
+        key_hash = self._hash(key)
+        found = self._find(key, key_hash, key_hash % self.sets)
+        if found is None:
+            return None
+        offset, expires, value = found
+        if expires and expires <= time.time():
+            return None
+        self._mm[offset + REF_OFFSET] = 1
+        return value
+
+    def _part_keys(self, key, header):
+        token, count, _ = PARTS.unpack(header)
+        return [self._part_key(key, token, index) for index in range(count)]
+
+    def _load(self, key, value):
+        """Значение из байтов слота или MISSING, если часть вытеснена."""
+        kind, data = value[:1], value[1:]
+        if kind == CHUNKED:
+            parts = []
+            for part_key in self._part_keys(key, data):
+                part = self._get_raw(part_key)
+                if part is None:
+                    return MISSING
+                parts.append(part)
+            joined = b"".join(parts)
+            if zlib.crc32(joined) != PARTS.unpack(data)[2]:
+                return MISSING
+            kind, data = joined[:1], joined[1:]
+        if kind == COMPRESSED:
+            data = zlib.decompress(data)
+        return pickle.loads(data)
+
+    # API кеша Django.
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self.make_and_validate_key(key, version=version)
+        return self._put(key, value, timeout, "add")
+
+    def get(self, key, default=None, version=None):
+        key = self.make_and_validate_key(key, version=version)
+        value = self._get_raw(key)
+        if value is None:
+            return default
+        value = self._load(key, value)
+        return default if value is MISSING else value
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self.make_and_validate_key(key, version=version)
+        if not self._put(key, value, timeout, "set"):
+            # Не поместилось: старое значение не должно остаться.
+            self._delete(key)
+
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self.make_and_validate_key(key, version=version)
+        if not self._store(key, None, timeout, "touch"):
+            return False
+        value = self._get_raw(key)
+        if value is not None and value[:1] == CHUNKED:
+            for part_key in self._part_keys(key, value[1:]):
+                self._store(part_key, None, timeout, "touch")
+        return True
+
+    def delete(self, key, version=None):
+        # Части без списка не читаются и вытесняются как обычные записи.
+        return self._delete(self.make_and_validate_key(key, version=version))
+
+    def _delete(self, key):
+        self._open()
+        key = key.encode()
+        key_hash = self._hash(key)
+        set_index = key_hash % self.sets
+        stripe = self._lock(set_index)
+        try:
+            found = self._find(key, key_hash, set_index)
+            if found is None:
+                return False
+            self._clear_slot(found[0])
+            return not (found[1] and found[1] <= time.time())
+        finally:
+            self._unlock(stripe)
+
+    def incr(self, key, delta=1, version=None):
+        key = self.make_and_validate_key(key, version=version)
+        self._open()
+        encoded = key.encode()
+        key_hash = self._hash(encoded)
+        set_index = key_hash % self.sets
+        stripe = self._lock(set_index)
+        try:
+            found = self._find(encoded, key_hash, set_index)
+            if found is None or (found[1] and found[1] <= time.time()):
+                raise ValueError("Key '%s' not found" % key)
+            value = self._load(key, found[2])
+            if value is MISSING:
+                raise ValueError("Key '%s' not found" % key)
+            value += delta
+            self._write_slot(
+                found[0], encoded, key_hash, found[1], self._pack(value)
+            )
+            return value
+        finally:
+            self._unlock(stripe)
+
+    def has_key(self, key, version=None):
+        sentinel = object()
+        return self.get(key, sentinel, version=version) is not sentinel
+
+    def clear(self):
+        self._open()
+        for set_index in range(self.sets):
+            stripe = self._lock(set_index)
+            try:
+                for way in range(self.ways):
+                    self._clear_slot(self._slot_offset(set_index, way))
+            finally:
+                self._unlock(stripe)
+
+    def close(self, **kwargs):
+        """Отображение живёт всё время процесса, закрывать нечего."""
@@ -0,0 +1,305 @@
+import atexit
+import logging
+import os
+import threading
+import time
+
+from foodgram import stats
+
+logger = logging.getLogger("foodgram.db_pool")
+
+DEFAULTS = {
+    "MIN_SIZE": 1,
+    "MAX_SIZE": 10,
+    "TIMEOUT": 5.0,
+    "MAX_IDLE": 300.0,
+    "MAX_LIFETIME": 3600.0,
+    "CHECK_AFTER": 30.0,
+}
+
+
+class PoolTimeout(Exception):
+    """Все MAX_SIZE соединений заняты дольше TIMEOUT секунд."""
+
+
+class ConnectionPool:
+    """
+    Пул соединений одной базы в процессе.
+
+    Соединения выдаются потокам (checkout) и возвращаются при закрытии
+    соединения Django (checkin); занятых не больше MAX_SIZE, остальные
+    потоки ждут до TIMEOUT секунд. Соединение, простоявшее дольше
+    CHECK_AFTER секунд, перед выдачей проверяется ping; старше
+    MAX_LIFETIME — закрывается. Фоновый поток закрывает простаивающие
+    дольше MAX_IDLE секунд сверх MIN_SIZE и открывает недостающие до
+    MIN_SIZE.
+
+    connect(), ping(conn), reset(conn) и close(conn) зависят от драйвера
+    и передаются бэкендом базы.
+    """
+
+    def __init__(self, alias, options, ping, reset, close):
+        self.alias = alias
+        self.options = {**DEFAULTS, **options}
+        self.ping = ping
+        self.reset = reset
+        self.close = close
+        self.connect = None
+        self.cond = threading.Condition()
+        self.pid = None
+        self._reset_after_fork()
+
+    @property
+    def labels(self):
+        return {"alias": self.alias}
+
+    def _reset_after_fork(self):
+        """
+        В новом процессе соединения родителя забываются, а не
+        закрываются: закрытие оборвало бы их и у родителя.
+        """
+        if self.pid == os.getpid():
+            return
+        self.pid = os.getpid()
+        # Свободные соединения: [(соединение, время возврата)], новые в
+        # конце — выдаются первыми, старые закрываются при простое.
+        self.idle = []
+        self.created = {}
+        self.size = 0
+        self.in_use = 0
+        threading.Thread(target=self._maintain, daemon=True).start()
+
+    def _publish(self):
+        states = {"idle": len(self.idle), "in_use": self.in_use}
+        for state, value in states.items():
+            stats.gauge(
+                self,
+                "foodgram_db_pool_connections",
+                {**self.labels, "state": state},
+                value,
+            )
+
+    def _expired(self, conn, now):
+        lifetime = self.options["MAX_LIFETIME"]
+        return bool(lifetime) and now - self.created[conn] > lifetime
+
+    def _discard(self, conn, reason):
+        """Закрывает соединение, уже убранное из учёта пула."""
+        stats.inc(
+            self,
+            "foodgram_db_pool_closed_total",
+            {**self.labels, "reason": reason},
+        )
+        try:
+            self.close(conn)
+        except Exception:
+            logger.debug("Ошибка закрытия соединения", exc_info=True)
+
+    def _forget(self, conn):
+        """Убирает соединение из учёта; вызывается под self.cond."""
+        self.size -= 1
+        self.created.pop(conn, None)
+        self.cond.notify()
+
+    def _validate(self, conn, returned_at):
+        now = time.monotonic()
+        if self._expired(conn, now):
+            return "lifetime"
+        if now - returned_at > self.options["CHECK_AFTER"]:
+            try:
+                self.ping(conn)
+            except Exception:
+                logger.warning(
+                    "Соединение пула %s не отвечает", self.alias, exc_info=True
+                )
+                return "broken"
+        return None
+
+    def checkout(self, connect):
+        """Соединение из пула или новое, если пул не заполнен."""
+        self.connect = connect
+        started = time.monotonic()
+        deadline = started + self.options["TIMEOUT"]
+        while True:
+            with self.cond:
+                self._reset_after_fork()
+                if self.idle:
+                    conn, returned_at = self.idle.pop()
+                elif self.size < self.options["MAX_SIZE"]:
+                    conn = returned_at = None
+                    self.size += 1
+                else:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        stats.inc(
+                            self, "foodgram_db_pool_timeouts_total",
+                            self.labels,
+                        )
+                        raise PoolTimeout(
+                            f"Пул соединений {self.alias} исчерпан: "
+                            f"{self.options['MAX_SIZE']} заняты."
+                        )
+                    self.cond.wait(remaining)
+                    continue
+                self.in_use += 1
+                self._publish()
+            if conn is None:
+                conn = self._open(connect, checked_out=True)
+                break
+            reason = self._validate(conn, returned_at)
+            if reason is None:
+                break
+            with self.cond:
+                self.in_use -= 1
+                self._forget(conn)
+                self._publish()
+            self._discard(conn, reason)
+        stats.inc(self, "foodgram_db_pool_checkouts_total", self.labels)
+        stats.inc(
+            self,
+            "foodgram_db_pool_wait_seconds_total",
+            self.labels,
+            time.monotonic() - started,
+        )
+        return conn
+
+    def _open(self, connect, checked_out):
+        """Новое соединение на место, уже зарезервированное в self.size."""
+        try:
+            conn = connect()
+        except Exception:
+            with self.cond:
+                self.size -= 1
+                if checked_out:
+                    self.in_use -= 1
+                self.cond.notify()
+                self._publish()
+            raise
+        with self.cond:
+            self.created[conn] = time.monotonic()
+        stats.inc(self, "foodgram_db_pool_opened_total", self.labels)
+        return conn
+
+    def checkin(self, conn):
+        """Возврат соединения; сломанное или устаревшее закрывается."""
+        with self.cond:
+            if self.pid != os.getpid() or conn not in self.created:
+                # Соединение родительского процесса или чужого пула.
+                return
+        reason = None
+        try:
+            if not self.reset(conn):
+                reason = "broken"
+        except Exception:
+            reason = "broken"
+        if reason is None and self._expired(conn, time.monotonic()):
+            reason = "lifetime"
+        with self.cond:
+            self.in_use -= 1
+            if reason is None:
+                self.idle.append((conn, time.monotonic()))
+                self.cond.notify()
+            else:
+                self._forget(conn)
+            self._publish()
+        if reason is not None:
+            self._discard(conn, reason)
+
+    def reap(self):
+        """Закрывает лишние простаивающие соединения и дополняет MIN_SIZE."""
+        now = time.monotonic()
+        expired = []
+        with self.cond:
+            keep = []
+            # Сначала самые давно возвращённые.
+            for conn, returned_at in self.idle:
+                spare = (
+                    len(self.idle) - len(expired)
+                    > self.options["MIN_SIZE"]
+                )
+                if self._expired(conn, now):
+                    expired.append((conn, "lifetime"))
+                elif spare and now - returned_at > self.options["MAX_IDLE"]:
+                    expired.append((conn, "idle"))
+                else:
+                    keep.append((conn, returned_at))
+            self.idle = keep
+            for conn, _ in expired:
+                self._forget(conn)
+            missing = 0
+            if self.connect is not None:
+                missing = max(0, self.options["MIN_SIZE"] - self.size)
+                self.size += missing
+            self._publish()
+        for conn, reason in expired:
+            self._discard(conn, reason)
+        for _ in range(missing):
+            try:
+                conn = self._open(self.connect, checked_out=False)
+            except Exception:
+                logger.warning(
+                    "Не удалось открыть соединение пула %s",
+                    self.alias,
+                    exc_info=True,
+                )
+                continue
+            with self.cond:
+                self.idle.insert(0, (conn, time.monotonic()))
+                self.cond.notify()
+                self._publish()
+
+    def _maintain(self):
+        pid = os.getpid()
+        interval = max(1.0, self.options["MAX_IDLE"] / 2)
+        while self.pid == pid:
+            time.sleep(interval)
+            try:
+                self.reap()
+            except Exception:
+                logger.exception("Ошибка обслуживания пула %s", self.alias)
+
+    def close_all(self):
+        """Закрывает свободные соединения (завершение воркера)."""
+        with self.cond:
+            if self.pid != os.getpid():
+                return
+            idle, self.idle = self.idle, []
+            for conn, _ in idle:
+                self._forget(conn)
+            self._publish()
+        for conn, _ in idle:
+            self._discard(conn, "shutdown")
+
+    def stats(self):
+        with self.cond:
+            return {
+                "size": self.size,
+                "idle": len(self.idle),
+                "in_use": self.in_use,
+            }
+
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def get_pool(alias, options, **callbacks):
+    pool = _pools.get(alias)
+    if pool is None:
+        with _pools_lock:
+            pool = _pools.get(alias)
+            if pool is None:
+                pool = _pools[alias] = ConnectionPool(
+                    alias, options, **callbacks
+                )
+    return pool
+
+
+def pools():
+    return dict(_pools)
+
+
+@atexit.register
+def close_all():
+    for pool in list(_pools.values()):
+        pool.close_all()
@@ -0,0 +1,164 @@
+import contextvars
+import logging
+import random
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import DEFAULT_DB_ALIAS, DatabaseError, connections
+from django.db.migrations.recorder import MigrationRecorder
+
+logger = logging.getLogger("foodgram.db_router")
+
+STICKY_PREFIX = "db:sticky:"
+# Отставание реплики PostgreSQL в секундах; 0, если всё применено.
+POSTGRES_LAG_SQL = (
+    "SELECT CASE WHEN NOT pg_is_in_recovery() "
+    "OR pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0 "
+    "ELSE EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()) END"
+)
+
+_replica = contextvars.ContextVar("replica", default=None)
+
+
+def replica_aliases():
+    return getattr(settings, "REPLICA_DATABASES", [])
+
+
+def is_replica(alias):
+    return alias in replica_aliases()
+
+
+def read_from(alias):
+    """Чтение запросов текущего контекста из alias; вернёт токен для reset."""
+    return _replica.set(alias)
+
+
+def reset(token):
+    _replica.reset(token)
+
+
+def clear():
+    """
+    Возврат к основной базе без токена: read_from, вызванный через
+    sync_to_async, выдаёт токен чужого контекста.
+    """
+    _replica.set(None)
+
+
+def _sticky_key(user_id):
+    return f"{STICKY_PREFIX}{user_id}"
+
+
+def pin(user):
+    """После записи пользователь REPLICA_STICKY_SECONDS читает основную."""
+    if replica_aliases() and user.is_authenticated:
+        caches[settings.REPLICA_STICKY_CACHE_ALIAS].set(
+            _sticky_key(user.pk), True, settings.REPLICA_STICKY_SECONDS
+        )
+
+
+def is_pinned(user):
+    return user.is_authenticated and bool(
+        caches[settings.REPLICA_STICKY_CACHE_ALIAS].get(_sticky_key(user.pk))
+    )
+
+
+def measure_lag(alias):
+    """Отставание реплики в секундах; ошибка, если она недоступна."""
+    connection = connections[alias]
+    with connection.cursor() as cursor:
+        if connection.vendor == "postgresql":
+            cursor.execute(POSTGRES_LAG_SQL)
+            return float(cursor.fetchone()[0] or 0)
+        # Без встроенной репликации проверяется только наличие схемы.
+        table = connection.ops.quote_name(
+            MigrationRecorder.Migration._meta.db_table
+        )
+        cursor.execute(f"SELECT 1 FROM {table} LIMIT 1")
+        cursor.fetchone()
+        return 0.0
+
+
+class ReplicaPool:
+    """
+    Исправные реплики процесса.
+
+    Раз в REPLICA_HEALTH_INTERVAL секунд каждая реплика проверяется
+    запросом; недоступная или отставшая больше REPLICA_MAX_LAG секунд
+    исключается до следующей проверки.
+    """
+
+    def __init__(self):
+        self.healthy = []
+        self.checked_at = None
+        self.lock = threading.Lock()
+
+    def _is_stale(self):
+        return (
+            self.checked_at is None
+            or time.monotonic() - self.checked_at
+            > settings.REPLICA_HEALTH_INTERVAL
+        )
+
+    def _check(self, alias):
+        try:
+            lag = measure_lag(alias)
+        except DatabaseError:
+            logger.warning("Реплика %s недоступна", alias, exc_info=True)
+            connections[alias].close()
+            return False
+        if lag > settings.REPLICA_MAX_LAG:
+            logger.warning("Реплика %s отстаёт на %.1f с", alias, lag)
+            return False
+        return True
+
+    def refresh(self):
+        self.healthy = [
+            alias for alias in replica_aliases() if self._check(alias)
+        ]
+        self.checked_at = time.monotonic()
+
+    def mark_down(self, alias):
+        """Исключает реплику до следующей проверки."""
+        self.healthy = [item for item in self.healthy if item != alias]
+
+    def choose(self):
+        """Случайная исправная реплика или None."""
+        if not replica_aliases():
+            return None
+        if self._is_stale():
+            with self.lock:
+                if self._is_stale():
+                    self.refresh()
+        healthy = self.healthy
+        return random.choice(healthy) if healthy else None
+
+
+replicas = ReplicaPool()
+
+
+class ReplicaRouter:
+    """
+    Чтение — из реплики, выбранной для текущего запроса (read_from),
+    запись и чтение внутри транзакции — из основной базы. Миграции
+    применяются только к основной базе.
+    """
+
+    def db_for_read(self, model, **hints):
+        alias = _replica.get()
+        if alias is None or connections[DEFAULT_DB_ALIAS].in_atomic_block:
+            return DEFAULT_DB_ALIAS
+        return alias
+
+    def db_for_write(self, model, **hints):
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        if is_replica(db):
+            return False
+        return None
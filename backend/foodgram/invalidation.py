@@ -0,0 +1,288 @@
+import json
+import logging
+import os
+import select
+import socket
+import sqlite3
+import threading
+import time
+
+from django.apps import apps
+from django.conf import settings
+from django.core.signals import request_started
+from django.db import connections, transaction
+from django.db.models.signals import post_delete, post_save
+
+logger = logging.getLogger("foodgram.invalidation")
+
+# Модели, изменения которых рассылаются по шине.
+MODELS = (
+    "recipes.Recipe",
+    "recipes.IngredientInRecipe",
+    "recipes.Tag",
+    "recipes.Ingredient",
+    "recipes.Favorite",
+    "recipes.ShoppingCart",
+    "users.Follow",
+)
+# Ограничение PostgreSQL на размер полезной нагрузки NOTIFY — 8000 байт.
+MAX_PAYLOAD = 7900
+RETRY_DELAY = 1.0
+LOG_RETENTION = 300
+
+_subscribers = []
+_pending = threading.local()
+
+
+def is_enabled():
+    return getattr(settings, "INVALIDATION_BUS_ENABLED", False)
+
+
+def origin():
+    """Отправитель сообщения: хост и pid воркера."""
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+def is_local_host(message_origin):
+    return message_origin.rsplit(":", 1)[0] == socket.gethostname()
+
+
+def subscribe(callback):
+    """
+    Подписка на инвалидацию: callback(tags, message_origin).
+
+    Вызывается и для изменений в этом процессе (сразу после фиксации
+    транзакции), и для сообщений других воркеров и узлов.
+    """
+    _subscribers.append(callback)
+    return callback
+
+
+def _dispatch(tags, message_origin):
+    for callback in list(_subscribers):
+        try:
+            callback(tags, message_origin)
+        except Exception:
+            logger.exception("Ошибка подписчика шины инвалидации")
+
+
+def instance_tags(instance):
+    """
+    Теги изменённого объекта: модель, сам объект и объекты, на которые
+    он ссылается (рецепт избранного, автор подписки и т.д.).
+    """
+    opts = instance._meta
+    tags = {f"model:{opts.label_lower}", f"{opts.label_lower}:{instance.pk}"}
+    for field in opts.concrete_fields:
+        if field.is_relation and field.many_to_one:
+            value = getattr(instance, field.attname)
+            if value is not None:
+                tags.add(f"{field.related_model._meta.label_lower}:{value}")
+    return tags
+
+
+def publish(tags, using="default"):
+    """
+    Рассылает теги после фиксации текущей транзакции.
+
+    Теги одной транзакции собираются и отправляются одним сообщением.
+    """
+    if not is_enabled():
+        return
+    _pending.__dict__.setdefault("tags", set()).update(tags)
+    # Первый из обработчиков транзакции отправит всё накопленное, теги
+    # откатившейся транзакции уйдут со следующей (лишняя инвалидация
+    # безопасна).
+    transaction.on_commit(lambda: _flush(using), using=using)
+
+
+def _flush(using):
+    tags = sorted(_pending.__dict__.get("tags", ()))
+    _pending.tags = set()
+    if not tags:
+        return
+    message_origin = origin()
+    _dispatch(tags, message_origin)
+    try:
+        get_transport(using).send(tags, message_origin)
+    except Exception:
+        logger.exception("Не удалось отправить сообщение инвалидации")
+
+
+def _chunks(tags, message_origin):
+    """JSON-сообщения не длиннее MAX_PAYLOAD байт."""
+    chunk = []
+    for tag in tags:
+        candidate = json.dumps({"o": message_origin, "t": chunk + [tag]})
+        if chunk and len(candidate.encode()) > MAX_PAYLOAD:
+            yield json.dumps({"o": message_origin, "t": chunk})
+            chunk = []
+        chunk.append(tag)
+    if chunk:
+        yield json.dumps({"o": message_origin, "t": chunk})
+
+
+def _receive(payload):
+    try:
+        message = json.loads(payload)
+        tags, message_origin = message["t"], message["o"]
+    except (ValueError, KeyError, TypeError):
+        logger.warning("Некорректное сообщение инвалидации: %r", payload)
+        return
+    if message_origin != origin():
+        _dispatch(tags, message_origin)
+
+
+class PostgresTransport:
+    """NOTIFY при отправке, LISTEN на отдельном соединении в потоке."""
+
+    def __init__(self, using):
+        self.using = using
+        self.channel = settings.INVALIDATION_CHANNEL
+
+    def send(self, tags, message_origin):
+        with connections[self.using].cursor() as cursor:
+            for payload in _chunks(tags, message_origin):
+                cursor.execute(
+                    "SELECT pg_notify(%s, %s)", [self.channel, payload]
+                )
+
+    def listen(self, stopped):
+        # Соединение драйвера в обход пула: LISTEN держит его всё время
+        # работы процесса, и оно не должно достаться коду запросов.
+        wrapper = connections[self.using]
+        raw = wrapper.Database.connect(**wrapper.get_connection_params())
+        try:
+            raw.autocommit = True
+            with raw.cursor() as cursor:
+                cursor.execute(f'LISTEN "{self.channel}"')
+            while not stopped.is_set():
+                if select.select([raw], [], [], RETRY_DELAY)[0]:
+                    raw.poll()
+                    while raw.notifies:
+                        _receive(raw.notifies.pop(0).payload)
+        finally:
+            raw.close()
+
+
+class SqliteLogTransport:
+    """
+    Журнал сообщений в файле SQLite для одного хоста без PostgreSQL.
+
+    Воркеры опрашивают журнал раз в INVALIDATION_POLL_INTERVAL секунд;
+    записи старше LOG_RETENTION секунд удаляются.
+    """
+
+    def __init__(self, using):
+        self.path = settings.INVALIDATION_LOG
+        self.interval = settings.INVALIDATION_POLL_INTERVAL
+
+    def _connect(self):
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        db = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+        db.execute("PRAGMA journal_mode=WAL")
+        db.execute(
+            "CREATE TABLE IF NOT EXISTS invalidation_log ("
+            "id INTEGER PRIMARY KEY AUTOINCREMENT, "
+            "created REAL NOT NULL, payload TEXT NOT NULL)"
+        )
+        return db
+
+    def send(self, tags, message_origin):
+        db = self._connect()
+        try:
+            db.executemany(
+                "INSERT INTO invalidation_log (created, payload) "
+                "VALUES (?, ?)",
+                [
+                    (time.time(), payload)
+                    for payload in _chunks(tags, message_origin)
+                ],
+            )
+        finally:
+            db.close()
+
+    def listen(self, stopped):
+        db = self._connect()
+        try:
+            last_id = db.execute(
+                "SELECT COALESCE(MAX(id), 0) FROM invalidation_log"
+            ).fetchone()[0]
+            pruned = time.monotonic()
+            while not stopped.wait(self.interval):
+                rows = db.execute(
+                    "SELECT id, payload FROM invalidation_log "
+                    "WHERE id > ? ORDER BY id",
+                    [last_id],
+                ).fetchall()
+                for last_id, payload in rows:
+                    _receive(payload)
+                if time.monotonic() - pruned > LOG_RETENTION:
+                    db.execute(
+                        "DELETE FROM invalidation_log WHERE created < ?",
+                        [time.time() - LOG_RETENTION],
+                    )
+                    pruned = time.monotonic()
+        finally:
+            db.close()
+
+
+def get_transport(using="default"):
+    if connections[using].vendor == "postgresql":
+        return PostgresTransport(using)
+    return SqliteLogTransport(using)
+
+
+class Listener:
+    """Фоновый поток подписки; свой в каждом процессе-воркере."""
+
+    def __init__(self):
+        self.pid = None
+        self.lock = threading.Lock()
+        self.stopped = threading.Event()
+
+    def ensure_started(self, **kwargs):
+        if self.pid == os.getpid() or not is_enabled():
+            return
+        with self.lock:
+            if self.pid == os.getpid():
+                return
+            self.pid = os.getpid()
+            self.stopped = threading.Event()
+            threading.Thread(
+                target=self._run, name="invalidation-listener", daemon=True
+            ).start()
+
+    def _run(self):
+        transport = get_transport()
+        while not self.stopped.is_set():
+            try:
+                transport.listen(self.stopped)
+            except Exception:
+                logger.exception("Подписка на шину инвалидации прервана")
+                self.stopped.wait(RETRY_DELAY)
+
+
+listener = Listener()
+request_started.connect(listener.ensure_started)
+
+
+def _publish_instance(sender, instance, using="default", **kwargs):
+    publish(instance_tags(instance), using=using)
+
+
+def connect_model_signals():
+    """
+    Подключает рассылку к сохранению и удалению моделей MODELS.
+
+    Только при включённой шине: обработчик post_delete отключает быстрое
+    каскадное удаление этих моделей.
+    """
+    if not is_enabled():
+        return
+    for label in MODELS:
+        model = apps.get_model(label)
+        post_save.connect(_publish_instance, sender=model)
+        post_delete.connect(_publish_instance, sender=model)
@@ -0,0 +1,124 @@
+from django.apps import apps
+from django.core.management.color import no_style
+from django.db import connections, transaction
+
+# Таблицы связей пользователя, которые разбиваются по user_id.
+PARTITIONED_MODELS = (
+    "recipes.Favorite",
+    "recipes.ShoppingCart",
+    "users.Follow",
+)
+PARTITION_KEY = "user_id"
+
+
+def partitioned_models():
+    return [apps.get_model(label) for label in PARTITIONED_MODELS]
+
+
+def partition_count(model, using="default"):
+    """Число секций таблицы модели; 0, если таблица не разбита."""
+    connection = connections[using]
+    if connection.vendor != "postgresql":
+        return 0
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT count(inhrelid) FROM pg_partitioned_table "
+            "LEFT JOIN pg_inherits ON inhparent = partrelid "
+            "WHERE partrelid = %s::regclass",
+            [model._meta.db_table],
+        )
+        return cursor.fetchone()[0]
+
+
+def _definitions(cursor, table):
+    """
+    Ограничения (кроме первичного ключа) и индексы таблицы — чтобы
+    создать их заново с теми же именами на разбитой таблице.
+    """
+    cursor.execute(
+        "SELECT conname, pg_get_constraintdef(oid) FROM pg_constraint "
+        "WHERE conrelid = %s::regclass AND contype IN ('c', 'f', 'u') "
+        "ORDER BY conname",
+        [table],
+    )
+    constraints = cursor.fetchall()
+    cursor.execute(
+        "SELECT indexdef FROM pg_indexes "
+        "WHERE schemaname = current_schema() AND tablename = %s "
+        "AND indexname NOT IN ("
+        "SELECT conname FROM pg_constraint WHERE conrelid = %s::regclass"
+        ") ORDER BY indexname",
+        [table, table],
+    )
+    # Индекс разбитой таблицы описан как ON ONLY и не создаётся в секциях.
+    indexes = [
+        row[0].replace(" ON ONLY ", " ON ") for row in cursor.fetchall()
+    ]
+    return constraints, indexes
+
+
+def partition(model, partitions, using="default"):
+    """
+    Пересоздаёт таблицу модели как PARTITION BY HASH (user_id) с
+    partitions секциями и переносит строки в одной транзакции.
+
+    Первичный ключ становится (id, user_id): уникальные ограничения
+    разбитой таблицы должны включать ключ разбиения. Ограничения
+    (user, recipe) и (user, author) уже его включают, поэтому запросы
+    с user_id = ... читают и проверяют уникальность в одной секции.
+    """
+    connection = connections[using]
+    quote = connection.ops.quote_name
+    table = model._meta.db_table
+    pk = model._meta.pk.column
+    old = f"{table}_unpartitioned"
+    with transaction.atomic(using=using), connection.cursor() as cursor:
+        cursor.execute(f"LOCK TABLE {quote(table)} IN ACCESS EXCLUSIVE MODE")
+        constraints, indexes = _definitions(cursor, table)
+        cursor.execute(
+            "SELECT attidentity, pg_get_serial_sequence(%s, %s) "
+            "FROM pg_attribute WHERE attrelid = %s::regclass "
+            "AND attname = %s",
+            [table, pk, table, pk],
+        )
+        identity, sequence = cursor.fetchone()
+        cursor.execute(
+            f"ALTER TABLE {quote(table)} RENAME TO {quote(old)}"
+        )
+        cursor.execute(
+            f"CREATE TABLE {quote(table)} (LIKE {quote(old)} "
+            f"INCLUDING DEFAULTS INCLUDING IDENTITY) "
+            f"PARTITION BY HASH ({quote(PARTITION_KEY)})"
+        )
+        for remainder in range(partitions):
+            name = f"{table}_h{partitions}_{remainder}"
+            cursor.execute(
+                f"CREATE TABLE {quote(name)} PARTITION OF {quote(table)} "
+                f"FOR VALUES WITH (MODULUS {partitions}, "
+                f"REMAINDER {remainder})"
+            )
+        cursor.execute(
+            f"INSERT INTO {quote(table)} SELECT * FROM {quote(old)}"
+        )
+        if not identity and sequence:
+            # Последовательность serial принадлежит старой таблице и
+            # удалилась бы вместе с ней.
+            cursor.execute(
+                f"ALTER SEQUENCE {sequence} OWNED BY "
+                f"{quote(table)}.{quote(pk)}"
+            )
+        cursor.execute(f"DROP TABLE {quote(old)}")
+        cursor.execute(
+            f"ALTER TABLE {quote(table)} ADD CONSTRAINT "
+            f"{quote(table + '_pkey')} PRIMARY KEY "
+            f"({quote(pk)}, {quote(PARTITION_KEY)})"
+        )
+        for name, definition in constraints:
+            cursor.execute(
+                f"ALTER TABLE {quote(table)} ADD CONSTRAINT {quote(name)} "
+                f"{definition}"
+            )
+        for definition in indexes:
+            cursor.execute(definition)
+        for sql in connection.ops.sequence_reset_sql(no_style(), [model]):
+            cursor.execute(sql)
@@ -0,0 +1,89 @@
+import functools
+
+from django.db.backends.postgresql import base
+from django.db.backends.postgresql.psycopg_any import IsolationLevel
+
+from foodgram import db_pool
+
+# Состояния транзакции libpq (PQTRANS_*), одинаковые в psycopg2 и psycopg.
+TRANSACTION_STATUS_IDLE = 0
+TRANSACTION_STATUS_UNKNOWN = 4
+
+
+def _ping(conn):
+    with conn.cursor() as cursor:
+        cursor.execute("SELECT 1")
+    if not conn.autocommit:
+        conn.rollback()
+
+
+def _reset(conn):
+    """
+    Откат незавершённой транзакции и сброс состояния сеанса; False —
+    соединение не годится.
+
+    DISCARD ALL закрывает курсоры (WITH HOLD от .iterator()), снимает
+    LISTEN, SET и SET ROLE, удаляет временные таблицы и подготовленные
+    запросы, чтобы следующий получатель не унаследовал их. Часовой пояс
+    и роль Django заново выставляет при выдаче соединения.
+    """
+    if conn.closed:
+        return False
+    status = conn.info.transaction_status
+    if status == TRANSACTION_STATUS_UNKNOWN:
+        return False
+    if status != TRANSACTION_STATUS_IDLE:
+        conn.rollback()
+    # DISCARD ALL не выполняется внутри транзакции.
+    autocommit = conn.autocommit
+    conn.autocommit = True
+    try:
+        with conn.cursor() as cursor:
+            cursor.execute("DISCARD ALL")
+    finally:
+        conn.autocommit = autocommit
+    return True
+
+
+def _close(conn):
+    if not conn.closed:
+        conn.close()
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+    """
+    PostgreSQL с пулом соединений процесса (foodgram.db_pool).
+
+    Соединение берётся из пула при первом запросе к базе и возвращается
+    в него, когда Django закрывает соединение (в конце HTTP-запроса при
+    CONN_MAX_AGE = 0). Параметры пула — в ключе POOL настроек базы.
+    """
+
+    def get_pool(self):
+        return db_pool.get_pool(
+            self.alias,
+            self.settings_dict.get("POOL", {}),
+            ping=_ping,
+            reset=_reset,
+            close=_close,
+        )
+
+    def get_new_connection(self, conn_params):
+        connect = functools.partial(
+            super().get_new_connection, conn_params
+        )
+        try:
+            connection = self.get_pool().checkout(connect)
+        except db_pool.PoolTimeout as error:
+            raise base.Database.OperationalError(str(error)) from error
+        # Для соединения из пула базовый метод не вызывался.
+        level = self.settings_dict["OPTIONS"].get("isolation_level")
+        self.isolation_level = IsolationLevel(
+            IsolationLevel.READ_COMMITTED if level is None else level
+        )
+        return connection
+
+    def _close(self):
+        if self.connection is not None:
+            with self.wrap_database_errors:
+                self.get_pool().checkin(self.connection)
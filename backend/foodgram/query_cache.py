@@ -0,0 +1,311 @@
+import functools
+import hashlib
+import uuid
+
+from django.apps import apps
+from django.conf import settings
+from django.contrib.auth.models import UserManager
+from django.core.cache import caches
+from django.core.exceptions import EmptyResultSet
+from django.db import DEFAULT_DB_ALIAS, connections, models, transaction
+from django.db.models.deletion import get_candidate_relations_to_delete
+from django.db.models.signals import m2m_changed, post_delete, post_save
+from django.dispatch import Signal, receiver
+
+from foodgram import db_router, invalidation
+
+VERSION_PREFIX = "qc:v:"
+RESULT_PREFIX = "qc:r:"
+TABLE_TAG_PREFIX = "table:"
+
+# Строки изменены в обход save(): update() и bulk_update() кешируемых
+# querysets; sender — модель, аргументы pks, fields и using.
+rows_updated = Signal()
+
+
+def is_enabled():
+    return getattr(settings, "QUERY_CACHE_ENABLED", False)
+
+
+def get_cache():
+    return caches[settings.QUERY_CACHE_ALIAS]
+
+
+def _all_tables():
+    return {
+        model._meta.db_table
+        for model in apps.get_models(include_auto_created=True)
+    }
+
+
+def tables_in_sql(sql, using):
+    """Таблицы моделей, упомянутые в SQL (включая подзапросы)."""
+    quote = connections[using].ops.quote_name
+    return sorted(table for table in _all_tables() if quote(table) in sql)
+
+
+def get_versions(tables):
+    """Текущие версии таблиц; отсутствующие создаются."""
+    cache = get_cache()
+    keys = [VERSION_PREFIX + table for table in tables]
+    versions = cache.get_many(keys)
+    for key in keys:
+        if key not in versions:
+            version = uuid.uuid4().hex
+            cache.add(key, version, None)
+            versions[key] = cache.get(key, version)
+    return [versions[key] for key in keys]
+
+
+def bump_tables(tables):
+    """Новая версия таблиц: все кешированные результаты с ними устаревают."""
+    tables = set(tables)
+    if not tables:
+        return
+    get_cache().set_many(
+        {VERSION_PREFIX + table: uuid.uuid4().hex for table in tables},
+        None,
+    )
+
+
+def invalidate_tables(tables, using="default"):
+    """
+    Инвалидирует таблицы сразу и ещё раз после фиксации транзакции.
+
+    Повтор нужен, чтобы результат, прочитанный другим воркером между
+    записью и COMMIT, не остался в кеше.
+    """
+    if not is_enabled():
+        return
+    tables = set(tables)
+    bump_tables(tables)
+    if connections[using].in_atomic_block:
+        transaction.on_commit(lambda: bump_tables(tables), using=using)
+    invalidation.publish(
+        (TABLE_TAG_PREFIX + table for table in tables), using=using
+    )
+
+
+@invalidation.subscribe
+def _on_invalidation(tags, message_origin):
+    """Инвалидация с других узлов: у воркеров одного хоста кеш общий."""
+    if not is_enabled() or invalidation.is_local_host(message_origin):
+        return
+    bump_tables(
+        tag[len(TABLE_TAG_PREFIX):]
+        for tag in tags
+        if tag.startswith(TABLE_TAG_PREFIX)
+    )
+
+
+def invalidate_models(*models_, using="default"):
+    invalidate_tables(
+        (model._meta.db_table for model in models_), using=using
+    )
+
+
+@functools.lru_cache(maxsize=None)
+def delete_tables(model):
+    """
+    Таблицы, которые может изменить удаление строки model.
+
+    Сама таблица и все таблицы, куда доходит каскад (CASCADE, SET_NULL,
+    связи many-to-many): быстрое каскадное удаление не шлёт сигналов.
+    """
+    tables = set()
+    pending = [model]
+    while pending:
+        current = pending.pop()
+        if current._meta.db_table in tables:
+            continue
+        tables.add(current._meta.db_table)
+        pending.extend(
+            relation.related_model
+            for relation in get_candidate_relations_to_delete(current._meta)
+        )
+    return frozenset(tables)
+
+
+class CachedQuerySet(models.QuerySet):
+    """
+    QuerySet с методом cached(): кеш результата с версиями таблиц.
+
+    Ключ кеша строится из SQL, параметров и текущих версий всех таблиц,
+    которые встречаются в запросе. Запись в таблицу (сигналы моделей,
+    update/delete, bulk_create/bulk_update) меняет её версию, и старые
+    результаты перестают находиться. Версии хранятся в кеше
+    QUERY_CACHE_ALIAS, поэтому для нескольких воркеров gunicorn нужен
+    общий бэкенд. Внутри транзакций кеш не используется, чтобы не
+    сохранять незафиксированные данные.
+    """
+
+    _cache_timeout = None
+    _use_cache = False
+
+    def cached(self, timeout=None):
+        clone = self._chain()
+        clone._use_cache = True
+        clone._cache_timeout = timeout
+        return clone
+
+    def _clone(self):
+        clone = super()._clone()
+        clone._use_cache = self._use_cache
+        clone._cache_timeout = self._cache_timeout
+        return clone
+
+    def _cache_key(self):
+        try:
+            sql, params = self.query.get_compiler(using=self.db).as_sql()
+        except EmptyResultSet:
+            return None
+        tables = tables_in_sql(sql, self.db)
+        raw = "\n".join(
+            [
+                self.db,
+                self.model._meta.label,
+                self._iterable_class.__name__,
+                repr(self._fields),
+                sql,
+                repr(params),
+                *tables,
+                *get_versions(tables),
+            ]
+        )
+        return RESULT_PREFIX + hashlib.md5(raw.encode()).hexdigest()
+
+    def _fetch_all(self):
+        if (
+            self._use_cache
+            and is_enabled()
+            and db_router.is_replica(self.db)
+        ):
+            # Результат отстающей реплики остался бы в кеше и после
+            # инвалидации, поэтому кешируемые запросы читают основную базу.
+            self._db = DEFAULT_DB_ALIAS
+        if (
+            self._result_cache is not None
+            or not self._use_cache
+            or not is_enabled()
+            or connections[self.db].in_atomic_block
+        ):
+            return super()._fetch_all()
+        key = self._cache_key()
+        if key is None:
+            return super()._fetch_all()
+        cache = get_cache()
+        results = cache.get(key)
+        if results is None:
+            super()._fetch_all()
+            timeout = self._cache_timeout or settings.QUERY_CACHE_TIMEOUT
+            cache.set(key, self._result_cache, timeout)
+            return None
+        self._result_cache = results
+        if self._prefetch_related_lookups and not self._prefetch_done:
+            self._prefetch_related_objects()
+        return None
+
+    def _invalidate(self, pks=None, fields=()):
+        invalidate_models(self.model, using=self.db)
+        if pks:
+            rows_updated.send(
+                sender=self.model, pks=pks, fields=fields, using=self.db
+            )
+
+    def _updated_pks(self):
+        """Id строк под update(), если на модель подписан rows_updated."""
+        if not rows_updated.has_listeners(self.model):
+            return None
+        queryset = self._chain()
+        # Из основной базы и мимо кеша, как сам UPDATE.
+        queryset._for_write = True
+        queryset._use_cache = False
+        return list(queryset.values_list("pk", flat=True))
+
+    def update(self, **kwargs):
+        pks = self._updated_pks()
+        rows = super().update(**kwargs)
+        self._invalidate(pks, fields=list(kwargs))
+        return rows
+
+    update.alters_data = True
+
+    def delete(self):
+        result = super().delete()
+        invalidate_tables(delete_tables(self.model), using=self.db)
+        return result
+
+    delete.alters_data = True
+    delete.queryset_only = True
+
+    def bulk_create(self, *args, **kwargs):
+        objs = super().bulk_create(*args, **kwargs)
+        self._invalidate()
+        return objs
+
+    def bulk_update(self, objs, fields, *args, **kwargs):
+        objs = tuple(objs)
+        rows = super().bulk_update(objs, fields, *args, **kwargs)
+        self._invalidate([obj.pk for obj in objs], fields=list(fields))
+        return rows
+
+    bulk_update.alters_data = True
+
+
+class CachedManagerMixin:
+    """Признак модели с кешируемыми querysets (см. connect_model_signals)."""
+
+
+class CachedManager(
+    CachedManagerMixin, models.Manager.from_queryset(CachedQuerySet)
+):
+    """Менеджер с методом cached()."""
+
+
+class CachedUserManager(
+    CachedManagerMixin, UserManager.from_queryset(CachedQuerySet)
+):
+    """UserManager с методом cached()."""
+
+
+@receiver(post_save)
+def _invalidate_on_write(sender, using="default", **kwargs):
+    invalidate_models(sender, using=using)
+
+
+def _invalidate_on_delete(sender, using="default", **kwargs):
+    invalidate_tables(delete_tables(sender), using=using)
+
+
+def _invalidate_on_m2m_change(sender, action, using="default", **kwargs):
+    if action.startswith("post_"):
+        invalidate_models(sender, using=using)
+
+
+def connect_model_signals():
+    """
+    Инвалидация при удалении строк и изменении связей many-to-many.
+
+    Кешируемый запрос может соединять таблицу модели с кешируемым
+    менеджером со связанными таблицами, поэтому post_delete подключается
+    и к этим моделям и меняет версии всех таблиц каскада удаления.
+    Глобальный обработчик post_delete отключил бы быстрое каскадное
+    удаление для всех моделей, а m2m_changed лишает related.add()/set()
+    быстрого пути (лишний SELECT), поэтому подписка включается только
+    вместе с кешем.
+    """
+    if not is_enabled():
+        return
+    senders = set()
+    for model in apps.get_models():
+        if not isinstance(model._default_manager, CachedManagerMixin):
+            continue
+        senders.add(model)
+        for field in model._meta.get_fields(include_hidden=True):
+            related = field.related_model
+            if related is None or related._meta.auto_created:
+                continue
+            senders.add(related)
+    for model in senders:
+        post_delete.connect(_invalidate_on_delete, sender=model)
+    m2m_changed.connect(_invalidate_on_m2m_change)
@@ -1,4 +1,5 @@
 import os
+import tempfile
 from pathlib import Path
 
 from dotenv import load_dotenv
@@ -31,6 +32,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    "api.middleware.MetricsMiddleware",
     "django.middleware.security.SecurityMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "django.middleware.common.CommonMiddleware",
@@ -38,6 +40,9 @@ MIDDLEWARE = [
     "django.contrib.auth.middleware.AuthenticationMiddleware",
     "django.contrib.messages.middleware.MessageMiddleware",
     "django.middleware.clickjacking.XFrameOptionsMiddleware",
+    "api.middleware.ProfilingMiddleware",
+    "api.middleware.QueryBudgetMiddleware",
+    "api.middleware.QueryTraceMiddleware",
 ]
 
 ROOT_URLCONF = "foodgram.urls"
@@ -71,6 +76,69 @@ DATABASES = {
     }
 }
 
+# Пул соединений PostgreSQL в процессе (foodgram.db_pool) для основной
+# базы и реплик: размеры, ожидание свободного соединения (с), закрытие
+# простаивающих и старых соединений (с), проверка соединения, простоявшего
+# дольше CHECK_AFTER (с). CONN_MAX_AGE остаётся 0: соединение возвращается
+# в пул в конце каждого запроса.
+DB_POOL_ENABLED = os.getenv("DB_POOL_ENABLED", "True") == "True"
+if (
+    DB_POOL_ENABLED
+    and DATABASES["default"]["ENGINE"] == "django.db.backends.postgresql"
+):
+    DATABASES["default"]["ENGINE"] = "foodgram.pooled_postgresql"
+DATABASES["default"]["POOL"] = {
+    "MIN_SIZE": int(os.getenv("DB_POOL_MIN_SIZE", "1")),
+    "MAX_SIZE": int(os.getenv("DB_POOL_MAX_SIZE", "10")),
+    "TIMEOUT": float(os.getenv("DB_POOL_TIMEOUT", "5")),
+    "MAX_IDLE": float(os.getenv("DB_POOL_MAX_IDLE", "300")),
+    "MAX_LIFETIME": float(os.getenv("DB_POOL_MAX_LIFETIME", "3600")),
+    "CHECK_AFTER": float(os.getenv("DB_POOL_CHECK_AFTER", "30")),
+}
+
+# Реплики для чтения (foodgram.db_router): через запятую хосты PostgreSQL
+# (host или host:port) или, для SQLite, пути к файлам баз.
+REPLICA_DATABASES = []
+for number, replica in enumerate(
+    filter(None, os.getenv("DB_REPLICAS", "").split(",")), start=1
+):
+    alias = f"replica{number}"
+    DATABASES[alias] = {
+        **DATABASES["default"],
+        "TEST": {"MIRROR": "default"},
+    }
+    if DATABASES[alias]["ENGINE"].endswith("sqlite3"):
+        DATABASES[alias]["NAME"] = replica
+    else:
+        host, _, port = replica.partition(":")
+        DATABASES[alias]["HOST"] = host
+        DATABASES[alias]["PORT"] = port or DATABASES["default"]["PORT"]
+    REPLICA_DATABASES.append(alias)
+
+DATABASE_ROUTERS = ["foodgram.db_router.ReplicaRouter"]
+# Проверка реплик раз в REPLICA_HEALTH_INTERVAL с, допустимое отставание
+# (с) и время чтения основной базы после записи пользователя (с).
+REPLICA_HEALTH_INTERVAL = float(os.getenv("REPLICA_HEALTH_INTERVAL", "5"))
+REPLICA_MAX_LAG = float(os.getenv("REPLICA_MAX_LAG", "5"))
+REPLICA_STICKY_SECONDS = int(os.getenv("REPLICA_STICKY_SECONDS", "10"))
+REPLICA_STICKY_CACHE_ALIAS = "query"
+
+CACHES = {
+    "default": {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+    },
+    # Общий для всех воркеров кеш результатов ORM (foodgram.query_cache).
+    "query": {
+        "BACKEND": os.getenv(
+            "QUERY_CACHE_BACKEND", "foodgram.cache.SharedMemoryCache"
+        ),
+        "LOCATION": os.getenv(
+            "QUERY_CACHE_LOCATION",
+            os.path.join(tempfile.gettempdir(), "foodgram-query-cache"),
+        ),
+    },
+}
+
 AUTH_PASSWORD_VALIDATORS = [
     {
         "NAME": "django.contrib.auth.password_validation.UserAttributeSimilarityValidator",
@@ -101,7 +169,7 @@ REST_FRAMEWORK = {
         "rest_framework.permissions.AllowAny",
     ],
     "DEFAULT_AUTHENTICATION_CLASSES": [
-        "rest_framework.authentication.TokenAuthentication",
+        "api.authentication.CachedTokenAuthentication",
     ],
     "DEFAULT_PAGINATION_CLASS": "api.pagination.PageLimitPagination",
     "PAGE_SIZE": 6,
@@ -129,6 +197,94 @@ MEDIA_ROOT = os.path.join(BASE_DIR, "media")
 
 DEFAULT_AUTO_FIELD = "django.db.models.BigAutoField"
 
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "True") == "True"
+METRICS_DIR = os.getenv(
+    "METRICS_DIR", os.path.join(tempfile.gettempdir(), "foodgram-metrics")
+)
+METRICS_TOKEN = os.getenv("METRICS_TOKEN", "")
+
+SQL_TRACE_ENABLED = os.getenv("SQL_TRACE_ENABLED", "False") == "True"
+SQL_TRACE_SLOW_MS = float(os.getenv("SQL_TRACE_SLOW_MS", "100"))
+SQL_TRACE_REPEAT_THRESHOLD = int(os.getenv("SQL_TRACE_REPEAT_THRESHOLD", "5"))
+
+QUERY_CACHE_ENABLED = os.getenv("QUERY_CACHE_ENABLED", "False") == "True"
+QUERY_CACHE_ALIAS = "query"
+QUERY_CACHE_TIMEOUT = int(os.getenv("QUERY_CACHE_TIMEOUT", "300"))
+
+INVALIDATION_BUS_ENABLED = (
+    os.getenv("INVALIDATION_BUS_ENABLED", "False") == "True"
+)
+INVALIDATION_CHANNEL = "foodgram_invalidation"
+INVALIDATION_LOG = os.getenv(
+    "INVALIDATION_LOG",
+    os.path.join(tempfile.gettempdir(), "foodgram-invalidation.sqlite3"),
+)
+INVALIDATION_POLL_INTERVAL = float(
+    os.getenv("INVALIDATION_POLL_INTERVAL", "0.5")
+)
+
+RECIPE_READ_MODEL = os.getenv("RECIPE_READ_MODEL", "False") == "True"
+
+FAST_SERIALIZERS = os.getenv("FAST_SERIALIZERS", "True") == "True"
+
+# Асинхронные версии действий чтения (api.async_views); включается при
+# запуске через foodgram.asgi.
+ASYNC_VIEWS_ENABLED = os.getenv("ASYNC_VIEWS_ENABLED", "False") == "True"
+
+# Лента изменений: отставание от текущего момента (с), срок хранения
+# надгробий (дни) и размер страницы.
+SYNC_LAG = float(os.getenv("SYNC_LAG", "5"))
+SYNC_RETENTION_DAYS = int(os.getenv("SYNC_RETENTION_DAYS", "30"))
+SYNC_PAGE_SIZE = 100
+SYNC_MAX_PAGE_SIZE = 500
+
+# Лента подписок: авторы с большим числом подписчиков читаются при
+# запросе, остальные рассылаются в ленты при публикации.
+FEED_FANOUT_MAX_FOLLOWERS = int(os.getenv("FEED_FANOUT_MAX_FOLLOWERS", "1000"))
+FEED_BACKFILL_SIZE = 50
+FEED_BATCH_SIZE = 1000
+FEED_MAX_PAGE_SIZE = 100
+
+# Период полураспада вклада в популярность за последние дни (ч).
+RANKING_HALF_LIFE_HOURS = float(os.getenv("RANKING_HALF_LIFE_HOURS", "48"))
+
+# Буферы просмотров и оценок популярности рецептов в воркере: интервал
+# сброса в базу (с) и число рецептов в буфере, при котором сброс
+# выполняется сразу.
+VIEW_COUNTER_ENABLED = os.getenv("VIEW_COUNTER_ENABLED", "True") == "True"
+VIEW_COUNTER_FLUSH_INTERVAL = float(
+    os.getenv("VIEW_COUNTER_FLUSH_INTERVAL", "10")
+)
+VIEW_COUNTER_MAX_PENDING = int(os.getenv("VIEW_COUNTER_MAX_PENDING", "1000"))
+
+# Кеш токенов аутентификации: псевдоним общего для воркеров кеша, время
+# жизни записи (с) и срок действия токена (дни, 0 — бессрочно).
+AUTH_TOKEN_CACHE_ALIAS = os.getenv("AUTH_TOKEN_CACHE_ALIAS", "query")
+AUTH_TOKEN_CACHE_TIMEOUT = int(os.getenv("AUTH_TOKEN_CACHE_TIMEOUT", "60"))
+AUTH_TOKEN_TTL_DAYS = int(os.getenv("AUTH_TOKEN_TTL_DAYS", "0"))
+
+# Короткие ссылки: срок кеширования редиректа в браузере и CDN и
+# перечитывания карты id рецептов (с). Переход, отданный из кеша, не
+# попадает в счётчик переходов; просмотр учтёт запрос карточки рецепта.
+SHORT_LINK_MAX_AGE = int(os.getenv("SHORT_LINK_MAX_AGE", "86400"))
+SHORT_LINK_REFRESH = int(os.getenv("SHORT_LINK_REFRESH", "300"))
+
+PROFILING_ENABLED = os.getenv("PROFILING_ENABLED", "True") == "True"
+PROFILE_DIR = os.getenv("PROFILE_DIR", os.path.join(BASE_DIR, "profiles"))
+PROFILE_SAMPLE_INTERVAL = float(os.getenv("PROFILE_SAMPLE_INTERVAL", "0.002"))
+
+LOGGING = {
+    "version": 1,
+    "disable_existing_loggers": False,
+    "handlers": {
+        "console": {"class": "logging.StreamHandler"},
+    },
+    "loggers": {
+        "api": {"handlers": ["console"], "level": "INFO"},
+        "foodgram": {"handlers": ["console"], "level": "INFO"},
+    },
+}
+
 CSRF_TRUSTED_ORIGINS = [
     "https://foodgram.freedynamicdns.net",
     "https://51.250.109.26",
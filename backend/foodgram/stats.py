@@ -0,0 +1,18 @@
+from django.dispatch import Signal
+
+# Метрика слоя foodgram: аргументы kind ("counter" или "gauge"), name,
+# labels и value. Реестр метрик приложения api подписывается на сигнал,
+# поэтому foodgram не импортирует api.
+metric_recorded = Signal()
+
+
+def inc(sender, name, labels, value=1):
+    metric_recorded.send(
+        sender=sender, kind="counter", name=name, labels=labels, value=value
+    )
+
+
+def gauge(sender, name, labels, value):
+    metric_recorded.send(
+        sender=sender, kind="gauge", name=name, labels=labels, value=value
+    )
@@ -3,12 +3,24 @@ from django.conf.urls.static import static
 from django.contrib import admin
 from django.urls import include, path
 
-from api.recipes.short_link_views import short_link_redirect
+from api.async_views import is_enabled as async_views_enabled
+from api.recipes.short_link_views import (
+    async_short_link_redirect,
+    short_link_redirect,
+)
 
 urlpatterns = [
     path("admin/", admin.site.urls),
     path("api/", include("api.urls")),
-    path("s/<int:pk>/", short_link_redirect, name="short_link"),
+    path(
+        "s/<str:code>/",
+        (
+            async_short_link_redirect
+            if async_views_enabled()
+            else short_link_redirect
+        ),
+        name="short_link",
+    ),
 ]
 
 if settings.DEBUG:
@@ -0,0 +1,35 @@
+import os
+import shutil
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+
+def on_starting(server):
+    """Сброс метрик воркеров и общего кеша предыдущего запуска."""
+    from foodgram.settings import CACHES, METRICS_DIR
+
+    shutil.rmtree(METRICS_DIR, ignore_errors=True)
+    query_cache = CACHES["query"]["LOCATION"]
+    if os.path.isfile(query_cache):
+        os.remove(query_cache)
+    else:
+        shutil.rmtree(query_cache, ignore_errors=True)
+
+
+def worker_exit(server, worker):
+    """
+    Сохранение просмотров и оценок рецептов из буферов завершающегося
+    воркера и закрытие соединений пула.
+    """
+    from django.db import connections
+
+    from api.recipes import ranking
+    from api.recipes.view_counts import counter
+    from foodgram import db_pool
+
+    counter.flush()
+    ranking.buffer.flush()
+    connections.close_all()
+    db_pool.close_all()
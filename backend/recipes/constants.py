@@ -4,3 +4,4 @@ INGREDIENT_NAME_MAX_LENGTH = 128
 MEASUREMENT_UNIT_MAX_LENGTH = 64
 RECIPE_NAME_MAX_LENGTH = 256
 RECIPE_IMAGE_UPLOAD_PATH = "recipes/images/"
+TOMBSTONE_KIND_MAX_LENGTH = 16
@@ -0,0 +1,432 @@
+import bisect
+import csv
+import itertools
+import json
+import random
+import time
+from datetime import timedelta
+from pathlib import Path
+
+from django.conf import settings
+from django.contrib.auth.hashers import make_password
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.core.management.color import no_style
+from django.db import connection, reset_queries, transaction
+from django.db.models import Max
+from django.db.models.constants import OnConflict
+from django.utils import timezone
+
+from foodgram.query_cache import invalidate_models
+from recipes.models import (
+    Favorite,
+    Ingredient,
+    IngredientInRecipe,
+    Recipe,
+    ShoppingCart,
+    Tag,
+)
+from users.models import Follow, User
+
+DATASET_PASSWORD = "dataset-password"
+RELATION_MODELS = (Favorite, ShoppingCart, Follow)
+
+
+class ZipfSampler:
+    """Выбор индекса из [0, n) по закону Ципфа с показателем s."""
+
+    def __init__(self, rng, n, s):
+        self.rng = rng
+        self.cum_weights = list(
+            itertools.accumulate(1 / (k ** s) for k in range(1, n + 1))
+        )
+        self.total = self.cum_weights[-1]
+
+    def __call__(self):
+        return bisect.bisect_left(
+            self.cum_weights, self.rng.random() * self.total
+        )
+
+
+class Command(BaseCommand):
+    """Генерация синтетического набора данных для нагрузочных тестов."""
+
+    help = "Generate a reproducible synthetic dataset for load testing"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--users", type=int, default=1000)
+        parser.add_argument("--recipes", type=int, default=10000)
+        parser.add_argument(
+            "--follows", type=int, default=None,
+            help="Число подписок (по умолчанию users * 10).",
+        )
+        parser.add_argument(
+            "--favorites", type=int, default=None,
+            help="Число записей избранного (по умолчанию recipes * 2).",
+        )
+        parser.add_argument(
+            "--carts", type=int, default=None,
+            help="Число записей в корзинах (по умолчанию users * 3).",
+        )
+        parser.add_argument("--ingredients-per-recipe", type=int, default=8)
+        parser.add_argument("--tags-per-recipe", type=int, default=2)
+        parser.add_argument(
+            "--zipf", type=float, default=1.1,
+            help="Показатель распределения Ципфа.",
+        )
+        parser.add_argument("--seed", type=int, default=42)
+        parser.add_argument("--batch-size", type=int, default=5000)
+        parser.add_argument(
+            "--password", default=DATASET_PASSWORD,
+            help="Пароль всех сгенерированных пользователей.",
+        )
+        parser.add_argument(
+            "--skip-derived",
+            action="store_true",
+            help="Не пересобирать ленты, рейтинги и документы рецептов.",
+        )
+
+    def handle(self, *args, **options):
+        if options["users"] < 2:
+            raise CommandError("Нужно хотя бы два пользователя.")
+        self.rng = random.Random(options["seed"])
+        self.batch_size = options["batch_size"]
+        self.now = timezone.now()
+        started = time.monotonic()
+
+        tag_ids = self._load_tags()
+        ingredient_ids = self._load_ingredients()
+        self.words = self._build_vocabulary()
+
+        user_ids = self._create_users(options["users"], options["password"])
+        recipe_ids = self._create_recipes(
+            user_ids, options["recipes"], options["zipf"]
+        )
+        self._create_recipe_links(
+            recipe_ids,
+            tag_ids,
+            ingredient_ids,
+            options["tags_per_recipe"],
+            options["ingredients_per_recipe"],
+        )
+        self._create_follows(
+            user_ids,
+            options["follows"]
+            if options["follows"] is not None
+            else options["users"] * 10,
+            options["zipf"],
+        )
+        for model, total, default in (
+            (Favorite, options["favorites"], len(recipe_ids) * 2),
+            (ShoppingCart, options["carts"], len(user_ids) * 3),
+        ):
+            self._create_user_recipe_relations(
+                model,
+                user_ids,
+                recipe_ids,
+                total if total is not None else default,
+                options["zipf"],
+            )
+
+        self._reset_sequences()
+        if not options["skip_derived"]:
+            self._build_derived()
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"=== Набор данных создан за "
+                f"{time.monotonic() - started:.1f} с ==="
+            )
+        )
+
+    def _log(self, message):
+        self.stdout.write(f"  {message}")
+
+    def _insert(self, model, field_names, rows):
+        """
+        Пакетная вставка строк в таблицу модели в обход создания объектов.
+
+        rows — кортежи значений в порядке field_names; остальные столбцы
+        заполняются значениями по умолчанию из описания полей, поля
+        auto_now/auto_now_add — моментом запуска. Повторы в таблицах
+        связей отбрасываются уникальными ограничениями и не входят в
+        возвращаемое число вставленных строк.
+        """
+        opts = model._meta
+        fields = [opts.get_field(name) for name in field_names]
+        defaults = [
+            (field, field.get_db_prep_save(self._default(field), connection))
+            for field in opts.local_concrete_fields
+            if field not in fields and not field.primary_key
+        ]
+        columns = [field.column for field in fields] + [
+            field.column for field, _ in defaults
+        ]
+        default_values = tuple(value for _, value in defaults)
+        on_conflict = (
+            OnConflict.IGNORE if model in RELATION_MODELS else None
+        )
+        per_statement = connection.ops.bulk_batch_size(
+            columns, range(self.batch_size)
+        )
+        row_sql = "(" + ", ".join(["%s"] * len(columns)) + ")"
+        prefix = "{} {} ({}) VALUES ".format(
+            connection.ops.insert_statement(on_conflict=on_conflict),
+            connection.ops.quote_name(opts.db_table),
+            ", ".join(connection.ops.quote_name(name) for name in columns),
+        )
+        suffix = connection.ops.on_conflict_suffix_sql(
+            fields, on_conflict, None, None
+        ) or ""
+
+        created = 0
+        rows = iter(rows)
+        while True:
+            batch = list(itertools.islice(rows, self.batch_size))
+            if not batch:
+                break
+            with transaction.atomic(), connection.cursor() as cursor:
+                for offset in range(0, len(batch), per_statement):
+                    chunk = batch[offset:offset + per_statement]
+                    params = []
+                    for row in chunk:
+                        params.extend(row)
+                        params.extend(default_values)
+                    cursor.execute(
+                        f"{prefix}{', '.join([row_sql] * len(chunk))} "
+                        f"{suffix}",
+                        params,
+                    )
+                    # Строки, пропущенные из-за конфликта, не считаются.
+                    created += cursor.rowcount
+            reset_queries()
+        invalidate_models(model)
+        return created
+
+    def _default(self, field):
+        if getattr(field, "auto_now", False) or getattr(
+            field, "auto_now_add", False
+        ):
+            return self.now
+        return field.get_default()
+
+    def _timestamp(self, max_age_days=365):
+        """Случайный момент в прошлом в формате, понятном СУБД."""
+        moment = self.now - timedelta(
+            seconds=self.rng.randint(0, max_age_days * 24 * 3600)
+        )
+        return connection.ops.adapt_datetimefield_value(moment)
+
+    def _next_id(self, model):
+        return (model.objects.aggregate(max_id=Max("id"))["max_id"] or 0) + 1
+
+    def _load_tags(self):
+        """Теги из data/tags.json (создаются, если их ещё нет)."""
+        data_file = Path(settings.BASE_DIR) / "data" / "tags.json"
+        with data_file.open("r", encoding="utf-8") as f:
+            tags = json.load(f)
+        existing = set(Tag.objects.values_list("slug", flat=True))
+        Tag.objects.bulk_create(
+            [
+                Tag(name=tag["name"], slug=tag["slug"])
+                for tag in tags
+                if tag["slug"] not in existing
+            ]
+        )
+        return list(Tag.objects.order_by("id").values_list("id", flat=True))
+
+    def _load_ingredients(self):
+        """Ингредиенты из data/ingredients.csv (создаются при отсутствии)."""
+        if not Ingredient.objects.exists():
+            data_file = Path(settings.BASE_DIR) / "data" / "ingredients.csv"
+            with data_file.open("r", encoding="utf-8") as f:
+                rows = [row for row in csv.reader(f) if len(row) == 2]
+            Ingredient.objects.bulk_create(
+                [
+                    Ingredient(
+                        name=name.strip(),
+                        measurement_unit=measurement_unit.strip(),
+                    )
+                    for name, measurement_unit in rows
+                ],
+                batch_size=self.batch_size,
+            )
+        return list(
+            Ingredient.objects.order_by("id").values_list("id", flat=True)
+        )
+
+    def _build_vocabulary(self):
+        words = set()
+        for name in Ingredient.objects.values_list("name", flat=True):
+            words.update(word for word in name.split() if len(word) > 3)
+        return sorted(words)
+
+    def _sentence(self, low, high):
+        return " ".join(
+            self.rng.choices(self.words, k=self.rng.randint(low, high))
+        )
+
+    def _create_users(self, total, password):
+        first_id = self._next_id(User)
+        password_hash = make_password(password)
+        users = (
+            (
+                user_id,
+                f"user{user_id}",
+                f"user{user_id}@example.com",
+                self.rng.choice(self.words).capitalize(),
+                self.rng.choice(self.words).capitalize(),
+                password_hash,
+                self._timestamp(),
+            )
+            for user_id in range(first_id, first_id + total)
+        )
+        self._insert(
+            User,
+            (
+                "id",
+                "username",
+                "email",
+                "first_name",
+                "last_name",
+                "password",
+                "date_joined",
+            ),
+            users,
+        )
+        self._log(f"пользователей: {total}")
+        return list(range(first_id, first_id + total))
+
+    def _create_recipes(self, user_ids, total, zipf):
+        first_id = self._next_id(Recipe)
+        pick_author = ZipfSampler(self.rng, len(user_ids), zipf)
+
+        def recipes():
+            for recipe_id in range(first_id, first_id + total):
+                created_at = self._timestamp()
+                yield (
+                    recipe_id,
+                    user_ids[pick_author()],
+                    self._sentence(2, 5).capitalize()[:256],
+                    self._sentence(20, 80).capitalize(),
+                    self.rng.randint(5, 180),
+                    created_at,
+                    created_at,
+                )
+
+        self._insert(
+            Recipe,
+            (
+                "id",
+                "author",
+                "name",
+                "text",
+                "cooking_time",
+                "created_at",
+                "updated_at",
+            ),
+            recipes(),
+        )
+        self._log(f"рецептов: {total}")
+        return range(first_id, first_id + total)
+
+    def _create_recipe_links(
+        self, recipe_ids, tag_ids, ingredient_ids, tags_per_recipe,
+        ingredients_per_recipe,
+    ):
+        pick_ingredient = ZipfSampler(self.rng, len(ingredient_ids), 0.8)
+        tags_per_recipe = min(tags_per_recipe, len(tag_ids))
+
+        def recipe_tags():
+            for recipe_id in recipe_ids:
+                for tag_id in self.rng.sample(
+                    tag_ids, self.rng.randint(1, tags_per_recipe)
+                ):
+                    yield recipe_id, tag_id
+
+        def recipe_ingredients():
+            for recipe_id in recipe_ids:
+                count = self.rng.randint(1, ingredients_per_recipe * 2 - 1)
+                chosen = {pick_ingredient() for _ in range(count)}
+                for index in chosen:
+                    yield (
+                        recipe_id,
+                        ingredient_ids[index],
+                        self.rng.randint(1, 1000),
+                    )
+
+        created = self._insert(
+            Recipe.tags.through, ("recipe", "tag"), recipe_tags()
+        )
+        self._log(f"тегов в рецептах: {created}")
+        created = self._insert(
+            IngredientInRecipe,
+            ("recipe", "ingredient", "amount"),
+            recipe_ingredients(),
+        )
+        self._log(f"ингредиентов в рецептах: {created}")
+
+    def _pairs(self, total, pick_left, pick_right, allow_equal=True):
+        """
+        Пары (левый, правый) в количестве total.
+
+        Повторы не отсеиваются в памяти: при вставке их отбрасывает
+        уникальное ограничение (ignore_conflicts), поэтому фактическое
+        число строк может оказаться немного меньше.
+        """
+        produced = 0
+        while produced < total:
+            left, right = pick_left(), pick_right()
+            if not allow_equal and left == right:
+                continue
+            produced += 1
+            yield left, right
+
+    def _create_follows(self, user_ids, total, zipf):
+        pick_author = ZipfSampler(self.rng, len(user_ids), zipf)
+        follows = self._pairs(
+            total,
+            lambda: self.rng.choice(user_ids),
+            lambda: user_ids[pick_author()],
+            allow_equal=False,
+        )
+        created = self._insert(Follow, ("user", "author"), follows)
+        self._log(f"подписок: {created}")
+
+    def _create_user_recipe_relations(
+        self, model, user_ids, recipe_ids, total, zipf
+    ):
+        pick_user = ZipfSampler(self.rng, len(user_ids), zipf)
+        pick_recipe = ZipfSampler(self.rng, len(recipe_ids), zipf)
+        pairs = self._pairs(
+            total,
+            lambda: user_ids[pick_user()],
+            lambda: recipe_ids[pick_recipe()],
+        )
+        relations = (
+            (user_id, recipe_id, self._timestamp())
+            for user_id, recipe_id in pairs
+        )
+        created = self._insert(
+            model, ("user", "recipe", "created_at"), relations
+        )
+        self._log(f"{model._meta.verbose_name_plural}: {created}")
+
+    def _build_derived(self):
+        """
+        Ленты подписок, рейтинги и документы рецептов (при
+        RECIPE_READ_MODEL): строки вставлены в обход сигналов, которые их
+        поддерживают.
+        """
+        call_command("rebuild_feed", stdout=self.stdout)
+        call_command("decay_rankings", rebuild=True, stdout=self.stdout)
+        if getattr(settings, "RECIPE_READ_MODEL", False):
+            call_command("rebuild_recipe_documents", stdout=self.stdout)
+
+    def _reset_sequences(self):
+        """Сдвиг последовательностей после вставки с явными id."""
+        statements = connection.ops.sequence_reset_sql(
+            no_style(), [User, Recipe]
+        )
+        with connection.cursor() as cursor:
+            for sql in statements:
+                cursor.execute(sql)
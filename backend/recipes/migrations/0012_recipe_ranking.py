@@ -0,0 +1,36 @@
+# Generated by Django 4.2.24 on 2026-10-19 09:19
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0011_timeline'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recipe',
+            name='popularity',
+            field=models.PositiveIntegerField(default=0, verbose_name='Добавлений в избранное и списки покупок'),
+        ),
+        migrations.AddField(
+            model_name='recipe',
+            name='ranked_at',
+            field=models.DateTimeField(blank=True, null=True, verbose_name='Дата последнего затухания популярности'),
+        ),
+        migrations.AddField(
+            model_name='recipe',
+            name='trending',
+            field=models.FloatField(default=0, verbose_name='Популярность за последние дни'),
+        ),
+        migrations.AddIndex(
+            model_name='recipe',
+            index=models.Index(fields=['-popularity', '-id'], name='recipe_popularity_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='recipe',
+            index=models.Index(fields=['-trending', '-id'], name='recipe_trending_idx'),
+        ),
+    ]
@@ -0,0 +1,25 @@
+# Generated by Django 4.2.24 on 2026-10-19 09:25
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0012_recipe_ranking'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RecipeViewCount',
+            fields=[
+                ('recipe', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='view_count', serialize=False, to='recipes.recipe', verbose_name='Рецепт')),
+                ('views', models.PositiveBigIntegerField(default=0, verbose_name='Просмотры')),
+            ],
+            options={
+                'verbose_name': 'Просмотры рецепта',
+                'verbose_name_plural': 'Просмотры рецептов',
+            },
+        ),
+    ]
@@ -1,6 +1,8 @@
 from django.core.validators import MinValueValidator
 from django.db import models
+from django.utils import timezone
 
+from foodgram.query_cache import CachedManager
 from users.models import User
 from .constants import (
     TAG_NAME_MAX_LENGTH,
@@ -9,6 +11,7 @@ from .constants import (
     MEASUREMENT_UNIT_MAX_LENGTH,
     RECIPE_NAME_MAX_LENGTH,
     RECIPE_IMAGE_UPLOAD_PATH,
+    TOMBSTONE_KIND_MAX_LENGTH,
 )
 
 
@@ -26,6 +29,12 @@ class Tag(models.Model):
         blank=True,
         verbose_name="Slug тега",
     )
+    updated_at = models.DateTimeField(
+        auto_now=True,
+        verbose_name="Дата обновления тега",
+    )
+
+    objects = CachedManager()
 
     class Meta:
         ordering = ["name"]
@@ -48,6 +57,12 @@ class Ingredient(models.Model):
         max_length=MEASUREMENT_UNIT_MAX_LENGTH,
         verbose_name="Единица измерения",
     )
+    updated_at = models.DateTimeField(
+        auto_now=True,
+        verbose_name="Дата обновления ингредиента",
+    )
+
+    objects = CachedManager()
 
     class Meta:
         ordering = ["name"]
@@ -103,9 +118,41 @@ class Recipe(models.Model):
         auto_now=True,
         verbose_name="Дата обновления рецепта",
     )
+    popularity = models.PositiveIntegerField(
+        default=0,
+        verbose_name="Добавлений в избранное и списки покупок",
+    )
+    trending = models.FloatField(
+        default=0,
+        verbose_name="Популярность за последние дни",
+    )
+    ranked_at = models.DateTimeField(
+        null=True,
+        blank=True,
+        verbose_name="Дата последнего затухания популярности",
+    )
 
     class Meta:
         ordering = ["-id"]
+        indexes = [
+            # Лента изменений читает рецепты по (updated_at, id).
+            models.Index(
+                fields=["updated_at", "id"], name="recipe_updated_at_idx"
+            ),
+            # Лента подписок читает рецепты популярных авторов по
+            # (author, created_at, id).
+            models.Index(
+                fields=["author", "created_at", "id"],
+                name="recipe_author_created_idx",
+            ),
+            # Сортировки ?ordering=popular и ?ordering=trending.
+            models.Index(
+                fields=["-popularity", "-id"], name="recipe_popularity_idx"
+            ),
+            models.Index(
+                fields=["-trending", "-id"], name="recipe_trending_idx"
+            ),
+        ]
         verbose_name = "Рецепт"
         verbose_name_plural = "Рецепты"
 
@@ -164,6 +211,10 @@ class UserRecipeRelation(models.Model):
         related_name="in_%(class)ss",
         verbose_name="Рецепт",
     )
+    created_at = models.DateTimeField(
+        auto_now_add=True,
+        verbose_name="Дата добавления",
+    )
 
     class Meta:
         abstract = True
@@ -180,6 +231,12 @@ class Favorite(UserRecipeRelation):
                 name="unique_favorite",
             )
         ]
+        indexes = [
+            models.Index(
+                fields=["user", "created_at", "id"],
+                name="favorite_user_created_idx",
+            ),
+        ]
         verbose_name = "Избранное"
         verbose_name_plural = "Избранное"
 
@@ -198,8 +255,163 @@ class ShoppingCart(UserRecipeRelation):
                 name="unique_shopping_cart",
             )
         ]
+        indexes = [
+            models.Index(
+                fields=["user", "created_at", "id"],
+                name="cart_user_created_idx",
+            ),
+        ]
         verbose_name = "Список покупок"
         verbose_name_plural = "Списки покупок"
 
     def __str__(self):
         return f"{self.recipe.name} в списке покупок у {self.user.username}"
+
+
+class RecipeDocument(models.Model):
+    """
+    Готовое публичное представление рецепта для чтения API.
+
+    Содержит автора, теги, ингредиенты и адрес изображения без полей,
+    зависящих от пользователя (is_favorited, is_in_shopping_cart,
+    is_subscribed).
+    """
+
+    recipe = models.OneToOneField(
+        Recipe,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name="document",
+        verbose_name="Рецепт",
+    )
+    data = models.JSONField(verbose_name="Документ")
+    source_updated_at = models.DateTimeField(
+        verbose_name="Дата обновления рецепта в документе"
+    )
+
+    class Meta:
+        verbose_name = "Документ рецепта"
+        verbose_name_plural = "Документы рецептов"
+
+    def __str__(self):
+        return f"Документ рецепта {self.recipe_id}"
+
+
+class RecipeViewCount(models.Model):
+    """Число просмотров рецепта, сброшенное из буферов воркеров."""
+
+    recipe = models.OneToOneField(
+        Recipe,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name="view_count",
+        verbose_name="Рецепт",
+    )
+    views = models.PositiveBigIntegerField(
+        default=0, verbose_name="Просмотры"
+    )
+
+    class Meta:
+        verbose_name = "Просмотры рецепта"
+        verbose_name_plural = "Просмотры рецептов"
+
+    def __str__(self):
+        return f"Просмотры рецепта {self.recipe_id}: {self.views}"
+
+
+class Tombstone(models.Model):
+    """Удалённый рецепт или запись избранного/корзины для ленты изменений."""
+
+    RECIPE = "recipe"
+    FAVORITE = "favorite"
+    SHOPPING_CART = "shopping_cart"
+    KINDS = (
+        (RECIPE, "Рецепт"),
+        (FAVORITE, "Избранное"),
+        (SHOPPING_CART, "Список покупок"),
+    )
+
+    kind = models.CharField(
+        max_length=TOMBSTONE_KIND_MAX_LENGTH,
+        choices=KINDS,
+        verbose_name="Тип",
+    )
+    object_id = models.BigIntegerField(verbose_name="Id рецепта")
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        null=True,
+        blank=True,
+        related_name="+",
+        verbose_name="Пользователь",
+    )
+    deleted_at = models.DateTimeField(
+        default=timezone.now,
+        verbose_name="Дата удаления",
+    )
+
+    class Meta:
+        ordering = ["deleted_at", "id"]
+        indexes = [
+            models.Index(
+                fields=["kind", "user", "deleted_at", "id"],
+                name="tombstone_feed_idx",
+            ),
+        ]
+        verbose_name = "Удалённая запись"
+        verbose_name_plural = "Удалённые записи"
+
+    def __str__(self):
+        return f"{self.get_kind_display()} {self.object_id}"
+
+
+class TimelineEntry(models.Model):
+    """
+    Рецепт в ленте подписчика.
+
+    Записи создаются при публикации рецепта для каждого подписчика
+    автора; рецепты авторов с feed_pull в ленту не пишутся и
+    добавляются при чтении.
+    """
+
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name="+",
+        verbose_name="Подписчик",
+    )
+    recipe = models.ForeignKey(
+        Recipe,
+        on_delete=models.CASCADE,
+        related_name="+",
+        verbose_name="Рецепт",
+    )
+    author = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name="+",
+        verbose_name="Автор",
+    )
+    created_at = models.DateTimeField(verbose_name="Дата публикации")
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["user", "recipe"],
+                name="unique_timeline_entry",
+            )
+        ]
+        indexes = [
+            models.Index(
+                fields=["user", "created_at", "recipe"],
+                name="timeline_feed_idx",
+            ),
+            models.Index(
+                fields=["user", "author"], name="timeline_author_idx"
+            ),
+        ]
+        verbose_name = "Запись ленты"
+        verbose_name_plural = "Записи ленты"
+
+    def __str__(self):
+        return f"{self.recipe_id} в ленте {self.user_id}"
@@ -0,0 +1,20 @@
+# Generated by Django 4.2.24 on 2026-10-19 08:41
+
+from django.db import migrations
+import foodgram.query_cache
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0003_alter_follow_unique_together_alter_user_avatar_and_more'),
+    ]
+
+    operations = [
+        migrations.AlterModelManagers(
+            name='user',
+            managers=[
+                ('objects', foodgram.query_cache.CachedUserManager()),
+            ],
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 4.2.24 on 2026-10-19 09:15
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0005_user_updated_at'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='user',
+            name='feed_pull',
+            field=models.BooleanField(default=False, verbose_name='Рецепты в ленты подписчиков добавляются при чтении'),
+        ),
+    ]
@@ -3,6 +3,7 @@ from django.contrib.auth.validators import UnicodeUsernameValidator
 from django.core.exceptions import ValidationError
 from django.db import models
 
+from foodgram.query_cache import CachedUserManager
 from .constants import (
     AVATAR_UPLOAD_PATH,
     DEFAULT_AVATAR_PATH,
@@ -43,6 +44,16 @@ class User(AbstractUser):
         default=DEFAULT_AVATAR_PATH,
         verbose_name="Аватар",
     )
+    updated_at = models.DateTimeField(
+        auto_now=True,
+        verbose_name="Дата обновления профиля",
+    )
+    feed_pull = models.BooleanField(
+        default=False,
+        verbose_name="Рецепты в ленты подписчиков добавляются при чтении",
+    )
+
+    objects = CachedUserManager()
 
     USERNAME_FIELD = "email"
     REQUIRED_FIELDS = ["username", "first_name", "last_name"]